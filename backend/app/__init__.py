@@ -3,6 +3,7 @@ Invoice Automation MVP – Flask Application Factory.
 """
 import logging
 import os
+import threading
 
 from flask import Flask, jsonify
 from flask_cors import CORS
@@ -17,7 +18,12 @@ logger = logging.getLogger(__name__)
 
 
 def create_app(config: dict | None = None) -> Flask:
+    from app.json_utils import BACKEND as json_backend, FastJSONProvider
+
     app = Flask(__name__)
+    # JSON rápido (orjson si está instalado): Decimal, date y datetime nativos
+    app.json = FastJSONProvider(app)
+    logger.debug("JSON backend: %s", json_backend)
 
     # ── Configuración ──────────────────────────────────────────────────────
     app.config.from_mapping(
@@ -30,6 +36,8 @@ def create_app(config: dict | None = None) -> Flask:
             "DATABASE_URL", "postgresql://localhost/invoice_automation"
         ),
         SQLALCHEMY_TRACK_MODIFICATIONS=False,
+        # SCHEDULER_ENABLED=0 en procesos que no deben correr tareas periódicas (tests, workers extra)
+        SCHEDULER_ENABLED=os.environ.get("SCHEDULER_ENABLED", "1") != "0",
         # ── Pool settings ──────────────────────────────────────────────────
         # pool_pre_ping: testea la conexión antes de usarla del pool → evita
         # "connection already closed" tras reinicios de Docker o inactividad.
@@ -85,6 +93,8 @@ def create_app(config: dict | None = None) -> Flask:
     from app.routes.falabella_routes import falabella_bp
     from app.routes.mercadolibre_routes import ml_bp
     from app.routes.internal import internal_bp
+    from app.routes.admin import admin_bp
+    from app.routes.documents import documents_bp
 
     app.register_blueprint(auth_bp,      url_prefix="/auth")
     app.register_blueprint(config_bp,    url_prefix="/config")
@@ -93,6 +103,8 @@ def create_app(config: dict | None = None) -> Flask:
     app.register_blueprint(falabella_bp, url_prefix="/falabella")
     app.register_blueprint(ml_bp,        url_prefix="/mercado-libre")
     app.register_blueprint(internal_bp,  url_prefix="/internal")
+    app.register_blueprint(admin_bp,     url_prefix="/admin")
+    app.register_blueprint(documents_bp, url_prefix="/documents")
 
     # ── Health ─────────────────────────────────────────────────────────────
     @app.route("/health")
@@ -105,7 +117,8 @@ def create_app(config: dict | None = None) -> Flask:
             return jsonify({"status": "error", "db": str(e)}), 500
 
     # ── Scheduler (sincronización periódica) ───────────────────────────────
-    _start_scheduler(app)
+    if app.config["SCHEDULER_ENABLED"]:
+        _start_scheduler(app)
 
     return app
 
@@ -131,7 +144,7 @@ def _setup_cors(app: Flask) -> None:
         app,
         origins=origins,
         supports_credentials=True,
-        allow_headers=["Content-Type", "Authorization"],
+        allow_headers=["Content-Type", "Authorization", "Idempotency-Key"],
         methods=["GET", "POST", "PUT", "PATCH", "DELETE", "OPTIONS"],
     )
 
@@ -139,6 +152,9 @@ def _setup_cors(app: Flask) -> None:
 def _start_scheduler(app: Flask) -> None:
     try:
         from apscheduler.schedulers.background import BackgroundScheduler
+        from app.services.ledger import FLUSH_INTERVAL_SECONDS, flush_ledger
+        from app.tasks.jobs import run_pending_jobs, run_worker
+        from app.tasks.uploads import drain_upload_tasks
         from app.tasks.sync_sales import run_sync_sales
 
         scheduler = BackgroundScheduler()
@@ -147,9 +163,34 @@ def _start_scheduler(app: Flask) -> None:
             with app.app_context():
                 run_sync_sales()
 
+        def _flush_ledger():
+            with app.app_context():
+                flush_ledger()
+
+        def _process_jobs():
+            with app.app_context():
+                run_pending_jobs()
+
+        def _drain_uploads():
+            with app.app_context():
+                drain_upload_tasks()
+
+        def _listen_worker():
+            with app.app_context():
+                run_worker()
+
         scheduler.add_job(_job, "interval", minutes=30, id="sync_sales")
+        scheduler.add_job(_flush_ledger, "interval", seconds=FLUSH_INTERVAL_SECONDS, id="flush_ledger")
+        # Worker embebido de la cola de jobs; JOBS_INLINE_WORKER=0 si corre el worker dedicado.
+        # Con PostgreSQL es un thread que despierta con LISTEN/NOTIFY; si no, sondeo por intervalo.
+        if os.environ.get("JOBS_INLINE_WORKER", "1") != "0":
+            if app.config["SQLALCHEMY_DATABASE_URI"].startswith("postgresql"):
+                threading.Thread(target=_listen_worker, name="jobs-worker", daemon=True).start()
+            else:
+                scheduler.add_job(_process_jobs, "interval", seconds=5, id="process_jobs")
+                scheduler.add_job(_drain_uploads, "interval", seconds=30, id="drain_uploads")
         scheduler.start()
-        logger.info("Scheduler iniciado: sync_sales cada 30 min.")
+        logger.info("Scheduler iniciado: sync_sales cada 30 min, ledger cada %ds.", FLUSH_INTERVAL_SECONDS)
     except Exception as e:
         logger.warning(
             "Scheduler no iniciado: %s. "
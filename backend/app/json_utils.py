@@ -0,0 +1,108 @@
+"""
+JSON rápido para la app Flask y los clientes de Falabella, Mercado Libre y Haulmer.
+
+- Usa orjson si está instalado; si no, json de la stdlib con el mismo manejo de tipos.
+- Decimal (Sale.monto) → número; date/datetime → ISO 8601.
+- JSON_BACKEND=stdlib fuerza el fallback (útil para comparar o depurar).
+"""
+from __future__ import annotations
+
+import json
+import os
+from datetime import date, datetime
+from decimal import Decimal
+from typing import Any, Optional
+
+import requests
+from flask.json.provider import DefaultJSONProvider
+
+try:  # dependencia opcional
+    import orjson
+except ImportError:  # pragma: no cover - depende del entorno
+    orjson = None
+
+
+def _backend() -> str:
+    if orjson is None or os.environ.get("JSON_BACKEND", "").lower() == "stdlib":
+        return "stdlib"
+    return "orjson"
+
+
+BACKEND = _backend()
+
+
+def _default(obj: Any) -> Any:
+    """Tipos que ni orjson ni la stdlib serializan solos."""
+    if isinstance(obj, Decimal):
+        return float(obj)
+    if isinstance(obj, (datetime, date)):
+        return obj.isoformat()
+    if isinstance(obj, (set, frozenset)):
+        return list(obj)
+    if isinstance(obj, bytes):
+        return obj.decode("utf-8")
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
+
+def dumps_bytes(obj: Any, sort_keys: bool = False, indent: Optional[int] = None) -> bytes:
+    """Serializa a bytes UTF-8 (listo para enviar como body)."""
+    if BACKEND == "orjson":
+        opts = orjson.OPT_NON_STR_KEYS
+        if sort_keys:
+            opts |= orjson.OPT_SORT_KEYS
+        if indent:
+            opts |= orjson.OPT_INDENT_2
+        return orjson.dumps(obj, default=_default, option=opts)
+    return dumps(obj, sort_keys=sort_keys, indent=indent).encode("utf-8")
+
+
+def dumps(obj: Any, sort_keys: bool = False, indent: Optional[int] = None) -> str:
+    """Serializa a str."""
+    if BACKEND == "orjson":
+        return dumps_bytes(obj, sort_keys=sort_keys, indent=indent).decode("utf-8")
+    separators = None if indent else (",", ":")
+    return json.dumps(
+        obj, default=_default, ensure_ascii=False,
+        sort_keys=sort_keys, indent=indent, separators=separators,
+    )
+
+
+def loads(data: str | bytes | bytearray) -> Any:
+    """Parsea str o bytes. Lanza ValueError si no es JSON válido."""
+    if BACKEND == "orjson":
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+def response_json(resp: requests.Response) -> Any:
+    """
+    Reemplazo de resp.json() para los clientes: decodifica resp.content con el backend rápido.
+    Conserva el contrato de requests: un body inválido lanza requests.JSONDecodeError
+    (subclase de RequestException y de ValueError).
+    """
+    try:
+        return loads(resp.content)
+    except ValueError as e:
+        raise requests.exceptions.JSONDecodeError(str(e), resp.text[:200], 0, response=resp)
+
+
+class FastJSONProvider(DefaultJSONProvider):
+    """
+    Proveedor JSON de Flask basado en dumps_bytes/loads.
+    Mantiene el orden de inserción de las claves (sort_keys=False): los dicts de respuesta
+    ya se arman en el orden que lee el frontend.
+    """
+
+    sort_keys = False
+
+    def dumps(self, obj: Any, **kwargs: Any) -> str:
+        return dumps(obj, sort_keys=kwargs.get("sort_keys", self.sort_keys), indent=kwargs.get("indent"))
+
+    def loads(self, s: str | bytes, **kwargs: Any) -> Any:
+        return loads(s)
+
+    def response(self, *args: Any, **kwargs: Any):
+        obj = self._prepare_response_obj(args, kwargs)
+        indent = 2 if (self.compact is False or (self.compact is None and self._app.debug)) else None
+        body = dumps_bytes(obj, sort_keys=self.sort_keys, indent=indent) + b"\n"
+        return self._app.response_class(body, mimetype=self.mimetype)
@@ -20,6 +20,8 @@ class User(db.Model):
     ml_refresh_token_enc = db.Column(db.LargeBinary, nullable=True)
     ml_user_id = db.Column(db.String(64), nullable=True)  # ML user_id numérico
     is_admin = db.Column(db.Boolean, default=False, nullable=False)
+    # Plan del tenant: peso y tope de jobs en curso en el reparto de la cola (app.services.fair_queue)
+    plan = db.Column(db.String(32), nullable=False, default="basic", server_default="basic")
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
 
     sales = db.relationship("Sale", backref="user", lazy="dynamic")
@@ -33,23 +35,58 @@ class Sale(db.Model):
     # Plataforma fuente (primera columna para la vista usuario): Falabella | Mercado Libre | Manual
     platform = db.Column(db.String(32), nullable=False, default="Manual")
     id_venta = db.Column(db.String(120), nullable=False)  # ID externo (Falabella, ML, etc.)
+    # Pack de Mercado Libre (o el id de la orden si no tiene pack); se guarda al sincronizar
+    pack_id = db.Column(db.String(64), nullable=True)
     monto = db.Column(db.Numeric(12, 2), nullable=False)
     tipo_doc = db.Column(db.String(20), nullable=False)  # 'Boleta' | 'Factura'
     # Estado actual de la venta
-    status = db.Column(db.String(32), nullable=False, default="Pendiente")  # Pendiente | Éxito | Error
+    status = db.Column(db.String(32), nullable=False, default="Pendiente")  # Pendiente | Emitiendo | Éxito | Error
     error_message = db.Column(db.Text, nullable=True)
+    # Reintentos (app.services.errors): transient | credential | validation | permanent.
+    # next_attempt_at solo se fija para errores transitorios; lo recorre un índice parcial.
+    error_kind = db.Column(db.String(16), nullable=True)
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    next_attempt_at = db.Column(db.DateTime, nullable=True)
+    # Intención de emisión: se confirma antes de llamar a Haulmer (status Emitiendo) con el
+    # Idempotency-Key; si el proceso cae, la siguiente pasada reemite con la misma key.
+    emission_key = db.Column(db.String(64), nullable=True)
+    emission_started_at = db.Column(db.DateTime, nullable=True)
     # Fecha del documento (emisión o de la orden)
     document_date = db.Column(db.Date, nullable=True)
     # Validación de carga en marketplace: cuándo se subió correctamente el documento
     document_uploaded_at = db.Column(db.DateTime, nullable=True)
+    # Estado de la subida (outbox upload_tasks), independiente de la emisión: Pendiente | Cargado | Error
+    upload_status = db.Column(db.String(16), nullable=True)
     upload_platform_response = db.Column(db.Text, nullable=True)  # Respuesta de la plataforma (opcional)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
 
     # Constraint único por usuario + id_venta para idempotencia
-    __table_args__ = (db.UniqueConstraint("user_id", "id_venta", name="uq_user_id_venta"),)
+    __table_args__ = (
+        db.UniqueConstraint("user_id", "id_venta", name="uq_user_id_venta"),
+        # Índice parcial: solo las ventas con reintento programado (el resto no ocupa espacio)
+        db.Index(
+            "ix_sales_retry_due", "next_attempt_at",
+            postgresql_where=db.text("status = 'Error' AND next_attempt_at IS NOT NULL"),
+            sqlite_where=db.text("status = 'Error' AND next_attempt_at IS NOT NULL"),
+        ),
+    )
 
     documents = db.relationship("Document", backref="sale", uselist=True, lazy="dynamic")
+    items = db.relationship("SaleItem", backref="sale", lazy="dynamic", cascade="all, delete-orphan")
+
+
+class SaleItem(db.Model):
+    """Ítems de la orden en el marketplace (Falabella OrderItemId), guardados al sincronizar."""
+    __tablename__ = "sale_items"
+    id = db.Column(db.Integer, primary_key=True)
+    sale_id = db.Column(db.Integer, db.ForeignKey("sales.id", ondelete="CASCADE"), nullable=False, index=True)
+    platform = db.Column(db.String(32), nullable=False)
+    item_id = db.Column(db.String(64), nullable=False)
+    sku = db.Column(db.String(120), nullable=True)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+    __table_args__ = (db.UniqueConstraint("sale_id", "item_id", name="uq_sale_items_sale_item"),)
 
 
 class Document(db.Model):
@@ -59,5 +96,100 @@ class Document(db.Model):
     sale_id = db.Column(db.Integer, db.ForeignKey("sales.id"), nullable=False)
     pdf_url = db.Column(db.String(500), nullable=True)
     xml_url = db.Column(db.String(500), nullable=True)
+    # Copia local en el almacén por contenido (app.services.blob_store); null = aún no descargado
+    pdf_sha256 = db.Column(db.String(64), nullable=True)
+    pdf_size = db.Column(db.Integer, nullable=True)
+    xml_sha256 = db.Column(db.String(64), nullable=True)
+    xml_size = db.Column(db.Integer, nullable=True)
     haulmer_response = db.Column(db.Text, nullable=True)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+
+class UpstreamUsage(db.Model):
+    """Llamadas a APIs externas por usuario, operación y hora (ver app.services.ledger)."""
+    __tablename__ = "upstream_usage"
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey("users.id"), nullable=False)
+    service = db.Column(db.String(32), nullable=False)     # falabella | ml | haulmer
+    operation = db.Column(db.String(64), nullable=False)   # GetOrders, get_order, emit_document, ...
+    period_start = db.Column(db.DateTime, nullable=False)  # inicio de la hora (UTC)
+    calls = db.Column(db.BigInteger, nullable=False, default=0)
+    errors = db.Column(db.BigInteger, nullable=False, default=0)
+    latency_ms = db.Column(db.BigInteger, nullable=False, default=0)  # suma de latencias
+    bytes_in = db.Column(db.BigInteger, nullable=False, default=0)
+    bytes_out = db.Column(db.BigInteger, nullable=False, default=0)
+
+    __table_args__ = (
+        db.UniqueConstraint("user_id", "service", "operation", "period_start", name="uq_usage_user_op_period"),
+        db.Index("ix_upstream_usage_period_start", "period_start"),
+    )
+
+
+class ProcessingJob(db.Model):
+    """
+    Job en cola (POST /auto/process). Los workers lo toman con SELECT ... FOR UPDATE SKIP LOCKED
+    (ver app.tasks.jobs). status: queued | running | done | error.
+    """
+    __tablename__ = "processing_jobs"
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey("users.id"), nullable=False, index=True)
+    kind = db.Column(db.String(32), nullable=False, default="process")
+    status = db.Column(db.String(16), nullable=False, default="queued")
+    payload = db.Column(db.JSON, nullable=True)   # body original (orders, retry, since)
+    # Header Idempotency-Key del POST: un reenvío con la misma key devuelve este job
+    idempotency_key = db.Column(db.String(128), nullable=True)
+    result = db.Column(db.JSON, nullable=True)    # resumen al terminar
+    error_message = db.Column(db.Text, nullable=True)
+    # Avance (se actualiza tras cada orden)
+    total = db.Column(db.Integer, nullable=False, default=0)
+    processed = db.Column(db.Integer, nullable=False, default=0)
+    skipped = db.Column(db.Integer, nullable=False, default=0)
+    failed = db.Column(db.Integer, nullable=False, default=0)
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    worker_id = db.Column(db.String(128), nullable=True)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    started_at = db.Column(db.DateTime, nullable=True)
+    heartbeat_at = db.Column(db.DateTime, nullable=True)  # último avance; detecta workers caídos
+    finished_at = db.Column(db.DateTime, nullable=True)
+
+    __table_args__ = (
+        db.Index("ix_processing_jobs_status_created", "status", "created_at"),
+        db.UniqueConstraint("user_id", "idempotency_key", name="uq_processing_jobs_user_idempotency_key"),
+    )
+
+    items = db.relationship("ProcessingJobItem", backref="job", lazy="dynamic", cascade="all, delete-orphan")
+
+
+class ProcessingJobItem(db.Model):
+    """Avance por orden de un ProcessingJob. status: Pendiente | Éxito | Omitida | Error."""
+    __tablename__ = "processing_job_items"
+    id = db.Column(db.Integer, primary_key=True)
+    job_id = db.Column(db.Integer, db.ForeignKey("processing_jobs.id", ondelete="CASCADE"), nullable=False, index=True)
+    id_venta = db.Column(db.String(120), nullable=False)
+    platform = db.Column(db.String(32), nullable=True)
+    status = db.Column(db.String(16), nullable=False, default="Pendiente")
+    error = db.Column(db.Text, nullable=True)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+
+class UploadTask(db.Model):
+    """
+    Outbox de subidas: una tarea por venta emitida que debe cargarse en Falabella/ML.
+    Se crea en la misma transacción que registra la emisión; app.tasks.uploads la drena en
+    lotes con reintentos. status: pending | running | done | error.
+    """
+    __tablename__ = "upload_tasks"
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey("users.id"), nullable=False, index=True)
+    sale_id = db.Column(db.Integer, db.ForeignKey("sales.id"), nullable=False, unique=True)
+    platform = db.Column(db.String(32), nullable=False)
+    pack_id = db.Column(db.String(64), nullable=True)   # Mercado Libre
+    pdf_url = db.Column(db.String(500), nullable=False)
+    status = db.Column(db.String(16), nullable=False, default="pending")
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    next_attempt_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    last_error = db.Column(db.Text, nullable=True)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    __table_args__ = (db.Index("ix_upload_tasks_status_next_attempt", "status", "next_attempt_at"),)
@@ -0,0 +1,151 @@
+"""
+Rutas de administración (solo usuarios con is_admin).
+- GET /admin/usage: ranking de tenants por costo de llamadas a Falabella, ML y Haulmer.
+- GET /admin/queues: profundidad de cola y espera por tenant (jobs y outbox de subidas).
+"""
+import logging
+from datetime import datetime, timedelta
+from typing import Optional, Tuple
+
+from flask import Blueprint, request, jsonify
+from flask_jwt_extended import jwt_required
+from sqlalchemy import desc, func
+
+from app import db
+from app.models import Sale, UpstreamUsage, User
+from app.services.fair_queue import queue_metrics
+from app.services.ledger import flush_ledger
+from app.utils import err, require_user
+
+logger = logging.getLogger(__name__)
+admin_bp = Blueprint("admin", __name__)
+
+_USAGE_SORT = {
+    "latency": "latency_ms",
+    "calls":   "calls",
+    "bytes":   "bytes_in",
+    "errors":  "errors",
+}
+
+
+def _require_admin() -> Tuple[Optional[User], Optional[Tuple]]:
+    user, error = require_user()
+    if error:
+        return None, error
+    if not user.is_admin:
+        return None, err("Solo administradores", 403)
+    return user, None
+
+
+@admin_bp.route("/usage", methods=["GET"])
+@jwt_required()
+def usage():
+    """
+    Tenants ordenados por costo de llamadas externas en los últimos `days` días.
+    Query: days (7), limit (20), sort_by = latency | calls | bytes | errors.
+    Incluye desglose por operación y llamadas por venta (para detectar patrones derrochadores).
+    """
+    _, error = _require_admin()
+    if error:
+        return error
+
+    try:
+        days  = min(90, max(1, int(request.args.get("days", 7))))
+        limit = min(200, max(1, int(request.args.get("limit", 20))))
+    except (ValueError, TypeError):
+        return err("days y limit deben ser enteros")
+    sort_key = _USAGE_SORT.get(request.args.get("sort_by", "latency"), "latency_ms")
+
+    # Incluye lo que aún está en el buffer de este proceso
+    flush_ledger()
+    since = datetime.utcnow() - timedelta(days=days)
+
+    totals = {
+        "calls":      func.sum(UpstreamUsage.calls).label("calls"),
+        "errors":     func.sum(UpstreamUsage.errors).label("errors"),
+        "latency_ms": func.sum(UpstreamUsage.latency_ms).label("latency_ms"),
+        "bytes_in":   func.sum(UpstreamUsage.bytes_in).label("bytes_in"),
+        "bytes_out":  func.sum(UpstreamUsage.bytes_out).label("bytes_out"),
+    }
+    ranking = (
+        db.session.query(UpstreamUsage.user_id, User.email, *totals.values())
+        .join(User, User.id == UpstreamUsage.user_id)
+        .filter(UpstreamUsage.period_start >= since)
+        .group_by(UpstreamUsage.user_id, User.email)
+        .order_by(desc(totals[sort_key]))
+        .limit(limit)
+        .all()
+    )
+    user_ids = [r.user_id for r in ranking]
+    if not user_ids:
+        return jsonify({"days": days, "sort_by": sort_key, "tenants": []})
+
+    per_op = (
+        db.session.query(
+            UpstreamUsage.user_id, UpstreamUsage.service, UpstreamUsage.operation,
+            totals["calls"], totals["errors"], totals["latency_ms"], totals["bytes_in"],
+        )
+        .filter(UpstreamUsage.period_start >= since, UpstreamUsage.user_id.in_(user_ids))
+        .group_by(UpstreamUsage.user_id, UpstreamUsage.service, UpstreamUsage.operation)
+        .all()
+    )
+    sales = dict(
+        db.session.query(Sale.user_id, func.count(Sale.id))
+        .filter(Sale.created_at >= since, Sale.user_id.in_(user_ids))
+        .group_by(Sale.user_id)
+        .all()
+    )
+
+    operations = {uid: [] for uid in user_ids}
+    for r in per_op:
+        operations[r.user_id].append({
+            "operation":  f"{r.service}.{r.operation}",
+            "calls":      int(r.calls or 0),
+            "errors":     int(r.errors or 0),
+            "latency_s":  round((r.latency_ms or 0) / 1000, 1),
+            "bytes_in":   int(r.bytes_in or 0),
+        })
+
+    tenants = []
+    for r in ranking:
+        calls = int(r.calls or 0)
+        n_sales = int(sales.get(r.user_id, 0))
+        tenants.append({
+            "user_id":        r.user_id,
+            "email":          r.email,
+            "calls":          calls,
+            "errors":         int(r.errors or 0),
+            "error_rate":     round((r.errors or 0) / calls, 4) if calls else 0,
+            "latency_s":      round((r.latency_ms or 0) / 1000, 1),
+            "bytes_in":       int(r.bytes_in or 0),
+            "bytes_out":      int(r.bytes_out or 0),
+            "sales":          n_sales,
+            "calls_per_sale": round(calls / n_sales, 1) if n_sales else None,
+            "operations":     sorted(operations[r.user_id], key=lambda o: -o["latency_s"]),
+        })
+
+    return jsonify({"days": days, "sort_by": sort_key, "tenants": tenants})
+
+
+@admin_bp.route("/queues", methods=["GET"])
+@jwt_required()
+def queues():
+    """
+    Por tenant: jobs en cola y en curso, espera del job más antiguo, subidas vencidas, espera
+    de los jobs tomados en las últimas 24 h (p50, máx.) y servicio reciente según su plan.
+    """
+    _, error = _require_admin()
+    if error:
+        return error
+
+    tenants = queue_metrics()
+    emails = dict(
+        db.session.query(User.id, User.email).filter(User.id.in_([t["user_id"] for t in tenants])).all()
+    ) if tenants else {}
+    for t in tenants:
+        t["email"] = emails.get(t["user_id"])
+    return jsonify({
+        "tenants":      tenants,
+        "jobs_queued":  sum(t["jobs_queued"] for t in tenants),
+        "uploads_due":  sum(t["uploads_due"] for t in tenants),
+    })
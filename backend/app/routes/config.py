@@ -8,6 +8,7 @@ from flask_jwt_extended import jwt_required
 
 from app import db
 from app.crypto_utils import encrypt_value
+from app.services.errors import reschedule_credential_errors
 from app.utils import err, require_user
 
 logger = logging.getLogger(__name__)
@@ -31,6 +32,7 @@ def keys():
     try:
         data = request.get_json() or {}
         _apply_keys(user, data)
+        reschedule_credential_errors(user.id)
         db.session.commit()
         return jsonify({"message": "Credenciales actualizadas", **_keys_status(user)})
     except ValueError as e:
@@ -2,13 +2,18 @@
 Dashboard: historial de ventas con paginación, filtros y ordenamiento.
 """
 import logging
+from datetime import datetime
+from typing import Optional
 
 from flask import Blueprint, request, jsonify
 from flask_jwt_extended import jwt_required, get_jwt_identity
-from sqlalchemy import asc, desc
+from sqlalchemy import asc, desc, func
 
-from app.models import Sale
-from app.utils import err
+from app import db
+from app.models import Document, Sale
+from app.services.notify import RETRIES, notify_work
+from app.tasks.jobs import enqueue_job, find_duplicate_job
+from app.utils import SALES_IN_CHUNK, err, require_user
 
 logger = logging.getLogger(__name__)
 dashboard_bp = Blueprint("dashboard", __name__)
@@ -25,6 +30,9 @@ _SORT_COLUMNS = {
     "created_at":    Sale.created_at,
 }
 
+# Ventas por reintento en bloque (un solo job "retry"; el resto queda para otra llamada)
+MAX_BULK_RETRY = 5000
+
 
 def _doc_estado(sale: Sale) -> str:
     if sale.document_uploaded_at:
@@ -34,21 +42,28 @@ def _doc_estado(sale: Sale) -> str:
     return "Por emitir"
 
 
-def _sale_dict(s: Sale) -> dict:
+def _sale_dict(s: Sale, document_id: Optional[int] = None) -> dict:
+    # Decimal y fechas van tal cual: el proveedor JSON (app.json_utils) los serializa
     return {
         "id":                   s.id,
         "platform":             s.platform or "Manual",
         "id_venta":             s.id_venta,
         "id_orden":             s.id_venta,
-        "document_date":        s.document_date.isoformat() if s.document_date else None,
-        "monto":                float(s.monto),
+        "document_date":        s.document_date,
+        "monto":                s.monto,
         "tipo_doc":             s.tipo_doc,
         "status":               s.status,
         "documento":            _doc_estado(s),
         "documento_cargado":    s.document_uploaded_at is not None,
-        "document_uploaded_at": s.document_uploaded_at.isoformat() if s.document_uploaded_at else None,
+        "document_uploaded_at": s.document_uploaded_at,
+        "upload_status":        s.upload_status,
         "error_message":        s.error_message,
-        "created_at":           s.created_at.isoformat() if s.created_at else None,
+        "error_kind":           s.error_kind,
+        "attempts":             s.attempts,
+        "next_attempt_at":      s.next_attempt_at,
+        # Último documento emitido: su PDF se descarga en GET /documents/<document_id>/pdf
+        "document_id":          document_id,
+        "created_at":           s.created_at,
     }
 
 
@@ -96,9 +111,15 @@ def sales():
     total  = q.count()
     offset = (page - 1) * per_page
     items  = q.offset(offset).limit(per_page).all()
+    documents = dict(
+        db.session.query(Document.sale_id, func.max(Document.id))
+        .filter(Document.sale_id.in_([s.id for s in items]))
+        .group_by(Document.sale_id)
+        .all()
+    ) if items else {}
 
     return jsonify({
-        "sales":       [_sale_dict(s) for s in items],
+        "sales":       [_sale_dict(s, documents.get(s.id)) for s in items],
         "total":       total,
         "page":        page,
         "per_page":    per_page,
@@ -109,19 +130,88 @@ def sales():
 @dashboard_bp.route("/sales/<int:sale_id>/retry", methods=["POST"])
 @jwt_required()
 def retry_sale(sale_id):
-    """Indica cómo reintentar una venta en estado Error."""
+    """Programa el reintento inmediato de una venta en estado Error (lo toma el worker de jobs)."""
     user_id = int(get_jwt_identity())
     sale = Sale.query.filter_by(id=sale_id, user_id=user_id).first()
     if not sale:
         return err("Venta no encontrada", 404)
     if sale.status != "Error":
         return err("Solo se puede reintentar ventas en estado Error")
+    sale.next_attempt_at = datetime.utcnow()
+    notify_work(RETRIES)
+    db.session.commit()
     return jsonify({
-        "message": (
-            "Usa POST /auto/process con body: "
-            f'{{\"orders\": [{{\"id_venta\": \"{sale.id_venta}\", '
-            f'\"monto\": {float(sale.monto)}, \"tipo_documento\": \"{sale.tipo_doc}\"}}], '
-            f'\"retry\": true}}'
-        ),
-        "sale_id": sale.id,
+        "message":         "Reintento programado",
+        "sale_id":         sale.id,
+        "next_attempt_at": sale.next_attempt_at,
     })
+
+
+@dashboard_bp.route("/sales/retry", methods=["POST"])
+@jwt_required()
+def retry_sales():
+    """
+    Reintento en bloque de ventas en estado Error. Body: { sale_ids: [...] } o, sin sale_ids,
+    un filtro { platform, error_kind, search } (todas las ventas en Error que coincidan).
+    Encola un único job "retry" que reemite con el monto, tipo_doc y pack_id guardados, sin
+    consultar las plataformas, y responde 202 con el job_id (avance en GET /auto/jobs/<id>).
+    Como máximo MAX_BULK_RETRY ventas por llamada: "remaining" indica cuántas quedaron fuera.
+    Los IN (...) sobre los IDs van en lotes de SALES_IN_CHUNK.
+    """
+    user, error = require_user()
+    if error:
+        return error
+    if not user.haulmer_api_key_enc:
+        return err("Configura tu API key de Haulmer en /config/keys")
+
+    body = request.get_json(silent=True) or {}
+    q = db.session.query(Sale.id).filter(Sale.user_id == user.id, Sale.status == "Error")
+    if "sale_ids" in body:
+        raw = body.get("sale_ids")
+        if not isinstance(raw, list) or not raw:
+            return err("sale_ids debe ser una lista no vacía de IDs")
+        try:
+            sale_ids = sorted({int(v) for v in raw})
+        except (TypeError, ValueError):
+            return err("sale_ids debe contener solo enteros")
+        if len(sale_ids) > MAX_BULK_RETRY:
+            return err(f"Se pueden reintentar hasta {MAX_BULK_RETRY} ventas por llamada")
+        ids = []
+        for start in range(0, len(sale_ids), SALES_IN_CHUNK):
+            chunk = sale_ids[start:start + SALES_IN_CHUNK]
+            ids.extend(sale_id for sale_id, in q.filter(Sale.id.in_(chunk)).order_by(Sale.id))
+        total = len(ids)
+    else:
+        platform   = (body.get("platform") or "").strip()
+        error_kind = (body.get("error_kind") or "").strip()
+        search     = (body.get("search") or "").strip()
+        if platform:
+            q = q.filter(Sale.platform == platform)
+        if error_kind:
+            q = q.filter(Sale.error_kind == error_kind)
+        if search:
+            q = q.filter(Sale.id_venta.ilike(f"%{search}%"))
+        total = q.count()
+        ids   = [sale_id for sale_id, in q.order_by(Sale.id).limit(MAX_BULK_RETRY)]
+    if not ids:
+        return err("No hay ventas en estado Error para reintentar", 404)
+
+    payload = {"sale_ids": ids}
+    job = find_duplicate_job(user.id, "retry", payload)
+    replayed = job is not None
+    if not replayed:
+        # Sin next_attempt_at el reintento programado (enqueue_due_retries) no las vuelve a encolar
+        for start in range(0, len(ids), SALES_IN_CHUNK):
+            Sale.query.filter(Sale.id.in_(ids[start:start + SALES_IN_CHUNK])).update(
+                {"next_attempt_at": None}, synchronize_session=False,
+            )
+        job = enqueue_job(user.id, "retry", payload)
+    return jsonify({
+        "message":    "Reintento en cola",
+        "job_id":     job.id,
+        "status":     job.status,
+        "status_url": f"/auto/jobs/{job.id}",
+        "sales":      len(ids),
+        "remaining":  total - len(ids),
+        "replayed":   replayed,
+    }), 202
@@ -0,0 +1,56 @@
+"""
+Descarga de documentos emitidos desde el almacén local (app.services.blob_store).
+GET /documents/<id>/pdf (o /xml): si el archivo aún no está en disco se descarga de Haulmer
+una vez; la respuesta admite Range y GET condicional (ETag = sha256 del contenido).
+"""
+import logging
+
+import requests as http_requests
+from flask import Blueprint, request, send_file
+from flask_jwt_extended import jwt_required
+
+from app import db
+from app.models import Document
+from app.services.blob_store import blob_store
+from app.services.documents import KINDS, ensure_stored
+from app.utils import err, require_user
+
+logger = logging.getLogger(__name__)
+documents_bp = Blueprint("documents", __name__)
+
+# Contenido inmutable (direccionado por hash): el navegador puede reutilizarlo sin preguntar
+MAX_AGE = 7 * 24 * 3600
+
+
+@documents_bp.route("/<int:document_id>/<kind>", methods=["GET"])
+@jwt_required()
+def download(document_id: int, kind: str):
+    """Archivo del documento (kind: pdf | xml). ?download=1 lo envía como adjunto."""
+    if kind not in KINDS:
+        return err("Recurso no encontrado", 404)
+    user, error = require_user()
+    if error:
+        return error
+
+    doc = Document.query.filter_by(id=document_id, user_id=user.id).first()
+    if not doc:
+        return err("Documento no encontrado", 404)
+    try:
+        digest = ensure_stored(doc, kind)
+        db.session.commit()
+    except http_requests.RequestException as e:
+        db.session.rollback()
+        logger.warning("document %s %s: %s", document_id, kind, e)
+        return err(f"No se pudo obtener el documento de Haulmer: {e}", 502)
+    if not digest:
+        return err(f"El documento no tiene {kind.upper()}", 404)
+
+    return send_file(
+        blob_store().path(digest),
+        mimetype=KINDS[kind][3],
+        as_attachment=request.args.get("download") == "1",
+        download_name=f"{doc.sale.id_venta}.{kind}",
+        conditional=True,
+        etag=digest,
+        max_age=MAX_AGE,
+    )
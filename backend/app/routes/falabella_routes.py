@@ -12,8 +12,9 @@ from flask_jwt_extended import jwt_required, get_jwt_identity
 
 from app import db
 from app.crypto_utils import decrypt_value
-from app.models import User
+from app.models import Sale, User
 from app.services.falabella_client import FalabellaClient, parse_order_items_response
+from app.services.sale_items import item_ids_for
 from app.utils import err, require_user
 
 logger = logging.getLogger(__name__)
@@ -30,7 +31,7 @@ def _get_client(user: User) -> Tuple[Optional[FalabellaClient], Optional[Tuple]]
         api_key = decrypt_value(user.falabella_api_key_enc)
     except ValueError as e:
         return None, err(str(e))
-    return FalabellaClient(user_id=user.falabella_user_id, api_key=api_key), None
+    return FalabellaClient(user_id=user.falabella_user_id, api_key=api_key, tenant_id=user.id), None
 
 
 @falabella_bp.route("/orders", methods=["GET"])
@@ -101,6 +102,8 @@ def get_labels():
     """
     Etiquetas de envío (shipping labels).
     Body: { order_item_ids: [123, 456] }  o  { order_id: 1234 }.
+    Con order_id se usan los ítems guardados al sincronizar (sale_items); si la venta no los
+    tiene, se piden a GetOrderItems.
     Query: download=1 para descarga directa.
     Los ítems deben estar en ReadyToShip antes de llamar.
     """
@@ -115,6 +118,10 @@ def get_labels():
     order_item_ids = data.get("order_item_ids")
     order_id       = data.get("order_id")
 
+    if order_item_ids is None and order_id is not None:
+        sale = Sale.query.filter_by(user_id=user.id, id_venta=str(order_id), platform="Falabella").first()
+        if sale:
+            order_item_ids = item_ids_for([sale.id]).get(sale.id)
     if order_item_ids is None and order_id is not None:
         items_result = client.get_order_items(str(order_id))
         if not items_result.get("success"):
@@ -19,7 +19,7 @@ from flask_jwt_extended import jwt_required, get_jwt_identity
 from app import db
 from app.crypto_utils import decrypt_value, encrypt_value
 from app.models import User
-from app.services.mercadolibre_client import MercadoLibreClient, refresh_ml_token
+from app.services.mercadolibre_client import MercadoLibreClient, api_base, refresh_ml_token
 from app.utils import err, require_user
 
 logger = logging.getLogger(__name__)
@@ -82,7 +82,7 @@ def _get_client(user: User) -> Tuple[Optional[MercadoLibreClient], Optional[Tupl
     except ValueError as e:
         return None, err(str(e))
 
-    return MercadoLibreClient(access_token), None
+    return MercadoLibreClient(access_token, tenant_id=user.id), None
 
 
 def _refresh_token_for_user(user: User) -> Tuple[Optional[MercadoLibreClient], Optional[Tuple]]:
@@ -97,7 +97,7 @@ def _refresh_token_for_user(user: User) -> Tuple[Optional[MercadoLibreClient], O
     except ValueError as e:
         return None, err(str(e))
 
-    result = refresh_ml_token(client_id, client_secret, refresh_token)
+    result = refresh_ml_token(client_id, client_secret, refresh_token, tenant_id=user.id)
     if not result.get("success"):
         return None, err(
             "Token de Mercado Libre expirado. Vuelve a conectar tu cuenta en Configuración."
@@ -108,7 +108,7 @@ def _refresh_token_for_user(user: User) -> Tuple[Optional[MercadoLibreClient], O
     user.ml_access_token_enc  = encrypt_value(new_access)
     user.ml_refresh_token_enc = encrypt_value(new_refresh)
     db.session.commit()
-    return MercadoLibreClient(new_access), None
+    return MercadoLibreClient(new_access, tenant_id=user.id), None
 
 
 # ── OAuth ──────────────────────────────────────────────────────────────────
@@ -158,7 +158,7 @@ def oauth_callback():
 
     try:
         resp = http_requests.post(
-            "https://api.mercadolibre.com/oauth/token",
+            f"{api_base()}/oauth/token",
             data={
                 "grant_type":    "authorization_code",
                 "client_id":     client_id,
@@ -14,8 +14,11 @@ from flask_jwt_extended import jwt_required, get_jwt_identity
 from app import db
 from app.crypto_utils import decrypt_value
 from app.models import Document, Sale, User
-from app.services.haulmer_client import HaulmerClient
-from app.utils import err, require_user
+from app.services.blob_store import blob_store
+from app.services.documents import ensure_stored
+from app.services.errors import clear_failure, record_failure
+from app.services.haulmer_client import HaulmerClient, emit_documents, emission_key
+from app.utils import err, load_sales_map, require_user
 
 logger = logging.getLogger(__name__)
 semi_bp = Blueprint("semi", __name__)
@@ -101,7 +104,8 @@ def upload():
 @jwt_required()
 def process_batch():
     """
-    Emite en lote los documentos de la lista validada.
+    Emite en lote los documentos de la lista validada, en paralelo
+    (hasta HAULMER_MAX_CONCURRENCY por API key) y con Idempotency-Key por venta.
     Query param: format=zip → devuelve ZIP de PDFs en lugar de JSON.
     """
     user, error = require_user()
@@ -115,53 +119,55 @@ def process_batch():
     if not rows:
         return err("No hay filas para procesar")
 
-    haulmer    = HaulmerClient(decrypt_value(user.haulmer_api_key_enc))
+    haulmer    = HaulmerClient(decrypt_value(user.haulmer_api_key_enc), tenant_id=user.id)
     results    = []
     zip_buffer = io.BytesIO()
 
-    with zipfile.ZipFile(zip_buffer, "w", zipfile.ZIP_DEFLATED) as zf:
-        for row in rows:
-            id_venta = str(row.get("id_venta", "")).strip()
-            tipo_doc = (row.get("tipo_documento") or "Boleta").strip()
-            monto    = float(row.get("monto", 0))
-
-            sale = Sale.query.filter_by(user_id=user.id, id_venta=id_venta).first()
-            if sale and sale.status == "Éxito":
-                results.append({"id_venta": id_venta, "status": "Éxito", "skipped": True})
-                continue
-
-            if not sale:
-                sale = Sale(
-                    user_id=user.id,
-                    id_venta=id_venta,
-                    monto=monto,
-                    tipo_doc=tipo_doc,
-                    status="Pendiente",
-                    platform="Manual",
-                    document_date=datetime.utcnow().date(),
-                )
-                db.session.add(sale)
-                db.session.flush()
-
-            result = haulmer.emit_document(tipo_doc=tipo_doc, id_venta=id_venta, monto=monto)
-
-            if result.get("success"):
-                sale.status = "Éxito"
-                sale.document_date = sale.document_date or datetime.utcnow().date()
-                db.session.add(Document(
-                    user_id=user.id,
-                    sale_id=sale.id,
-                    pdf_url=result.get("pdf_url"),
-                    xml_url=result.get("xml_url"),
-                    haulmer_response=str(result.get("raw", ""))[:4000],
-                ))
-                zf.writestr(f"{id_venta}.pdf", b"")  # placeholder; reemplazar con PDF real
-                results.append({"id_venta": id_venta, "status": "Éxito"})
-            else:
-                sale.status        = "Error"
-                sale.error_message = result.get("error")
-                results.append({"id_venta": id_venta, "status": "Error", "error": result.get("error")})
-
+    # Sales existentes en consultas IN por lote; las nuevas se insertan juntas
+    sales = load_sales_map(user.id, (str(r.get("id_venta", "")).strip() for r in rows))
+    new   = {}
+    for row in rows:
+        id_venta = str(row.get("id_venta", "")).strip()
+        if id_venta and id_venta not in sales and id_venta not in new:
+            new[id_venta] = Sale(
+                user_id=user.id,
+                id_venta=id_venta,
+                monto=float(row.get("monto", 0)),
+                tipo_doc=(row.get("tipo_documento") or "Boleta").strip(),
+                status="Pendiente",
+                platform="Manual",
+                document_date=datetime.utcnow().date(),
+            )
+    if new:
+        db.session.add_all(new.values())
+        db.session.flush()
+    sales.update(new)
+
+    # Intención de emisión (status Emitiendo + Idempotency-Key) confirmada antes de llamar a
+    # Haulmer; cada resultado se guarda luego en su propia transacción corta.
+    user_id  = user.id
+    sale_ids = {id_venta: sale.id for id_venta, sale in sales.items()}
+    docs     = []
+    seen     = set()
+    for row in rows:
+        id_venta = str(row.get("id_venta", "")).strip()
+        sale     = sales.get(id_venta)
+        if not sale:
+            results.append({"id_venta": id_venta, "status": "Error", "error": "id_venta vacío"})
+            continue
+        if sale.status == "Éxito" or id_venta in seen:
+            results.append({"id_venta": id_venta, "status": "Éxito", "skipped": True})
+            continue
+        seen.add(id_venta)
+        tipo_doc = (row.get("tipo_documento") or "Boleta").strip()
+        key      = emission_key(user_id, id_venta, tipo_doc)
+        sale.status, sale.emission_key, sale.emission_started_at = "Emitiendo", key, datetime.utcnow()
+        docs.append({
+            "tipo_doc":        tipo_doc,
+            "id_venta":        id_venta,
+            "monto":           float(row.get("monto", 0)),
+            "idempotency_key": key,
+        })
     try:
         db.session.commit()
     except Exception as e:
@@ -169,6 +175,48 @@ def process_batch():
         logger.exception("process_batch commit: %s", e)
         return err(f"Error al guardar: {e}", 500)
 
+    with zipfile.ZipFile(zip_buffer, "w", zipfile.ZIP_DEFLATED) as zf:
+        for doc, result in emit_documents(haulmer, docs):
+            id_venta = doc["id_venta"]
+            document = None
+            try:
+                sale = db.session.get(Sale, sale_ids[id_venta])
+                if result.get("success"):
+                    sale.status = "Éxito"
+                    clear_failure(sale)
+                    sale.document_date = sale.document_date or datetime.utcnow().date()
+                    document = Document(
+                        user_id=user_id,
+                        sale_id=sale.id,
+                        pdf_url=result.get("pdf_url"),
+                        xml_url=result.get("xml_url"),
+                        haulmer_response=str(result.get("raw", ""))[:4000],
+                    )
+                    db.session.add(document)
+                else:
+                    record_failure(sale, result.get("error"), result.get("error_kind"))
+                db.session.commit()
+            except Exception as e:
+                db.session.rollback()
+                logger.exception("process_batch commit %s: %s", id_venta, e)
+                results.append({"id_venta": id_venta, "status": "Error", "error": f"Error al guardar: {e}"})
+                continue
+
+            if result.get("success"):
+                # El PDF queda en el almacén local: el ZIP y las subidas posteriores lo leen de disco
+                try:
+                    digest = ensure_stored(document)
+                    db.session.commit()
+                except Exception as e:
+                    db.session.rollback()
+                    logger.warning("process_batch PDF %s: %s", id_venta, e)
+                    digest = None
+                if digest:
+                    zf.write(blob_store().path(digest), f"{id_venta}.pdf")
+                results.append({"id_venta": id_venta, "status": "Éxito", "pdf": bool(digest)})
+            else:
+                results.append({"id_venta": id_venta, "status": "Error", "error": result.get("error")})
+
     zip_buffer.seek(0)
 
     if request.args.get("format") == "zip":
@@ -0,0 +1,74 @@
+"""
+Almacén local de documentos emitidos (PDF/XML) direccionado por contenido.
+
+- Cada archivo se guarda una sola vez en BLOB_STORE_DIR/<sha[:2]>/<sha[2:4]>/<sha256>:
+  dos documentos con el mismo contenido comparten el archivo.
+- La escritura va a un temporal en el mismo directorio y se publica con os.replace, de modo
+  que un lector nunca ve un archivo a medias y dos escritores del mismo contenido no chocan.
+- El web y el worker deben ver el mismo directorio (volumen compartido en docker-compose).
+Thread-safe: no guarda estado en memoria aparte de la ruta raíz.
+"""
+from __future__ import annotations
+
+import hashlib
+import os
+import re
+import tempfile
+from typing import BinaryIO, Iterable, Tuple
+
+DEFAULT_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(__file__))), "blobs")
+
+_DIGEST = re.compile(r"^[0-9a-f]{64}$")
+
+
+class BlobStore:
+    def __init__(self, root: str):
+        self.root = root
+
+    def path(self, digest: str) -> str:
+        if not _DIGEST.match(digest or ""):
+            raise ValueError(f"Digest inválido: {digest!r}")
+        return os.path.join(self.root, digest[:2], digest[2:4], digest)
+
+    def exists(self, digest: str) -> bool:
+        return bool(digest) and os.path.isfile(self.path(digest))
+
+    def put(self, data: bytes) -> Tuple[str, int]:
+        """Guarda el contenido (si no estaba) y devuelve (sha256, tamaño)."""
+        return self.put_stream([data])
+
+    def put_stream(self, chunks: Iterable[bytes]) -> Tuple[str, int]:
+        """Como put, pero leyendo por partes: nunca tiene el archivo entero en memoria."""
+        os.makedirs(self.root, exist_ok=True)
+        digest, size = hashlib.sha256(), 0
+        fd, tmp = tempfile.mkstemp(prefix=".tmp-", dir=self.root)
+        try:
+            with os.fdopen(fd, "wb") as f:
+                for chunk in chunks:
+                    if chunk:
+                        digest.update(chunk)
+                        f.write(chunk)
+                        size += len(chunk)
+            final = self.path(digest.hexdigest())
+            if os.path.isfile(final):
+                os.unlink(tmp)
+            else:
+                os.makedirs(os.path.dirname(final), exist_ok=True)
+                os.replace(tmp, final)
+        except BaseException:
+            if os.path.exists(tmp):
+                os.unlink(tmp)
+            raise
+        return digest.hexdigest(), size
+
+    def open(self, digest: str) -> BinaryIO:
+        return open(self.path(digest), "rb")
+
+    def read(self, digest: str) -> bytes:
+        with self.open(digest) as f:
+            return f.read()
+
+
+def blob_store() -> BlobStore:
+    """Almacén en BLOB_STORE_DIR (por defecto backend/blobs), leído en cada llamada."""
+    return BlobStore(os.environ.get("BLOB_STORE_DIR") or DEFAULT_DIR)
@@ -0,0 +1,51 @@
+"""
+Archivos de los documentos emitidos (PDF/XML de Haulmer) en el almacén local
+(app.services.blob_store): se descargan una vez y después se leen de disco en las subidas,
+sus reintentos, el ZIP del flujo semi-automático y GET /documents/<id>/pdf.
+"""
+from typing import Dict, Optional, Tuple
+
+import requests as http_requests
+
+from app.models import Document
+from app.services.blob_store import blob_store
+from app.services.latency import upstream_call
+
+CHUNK_SIZE = 64 * 1024
+
+# tipo → (columna url, columna sha256, columna tamaño, mimetype, operación del tracker)
+KINDS: Dict[str, Tuple[str, str, str, str, str]] = {
+    "pdf": ("pdf_url", "pdf_sha256", "pdf_size", "application/pdf", "haulmer.pdf"),
+    "xml": ("xml_url", "xml_sha256", "xml_size", "application/xml", "haulmer.xml"),
+}
+
+
+def download_to_store(url: str, tenant_id: Optional[int], op: str = "haulmer.pdf") -> Tuple[str, int]:
+    """
+    Descarga url por partes directo al almacén y devuelve (sha256, tamaño). Solo red y disco:
+    se puede llamar desde los threads del pipeline.
+    """
+    resp = upstream_call(
+        op, lambda t: http_requests.get(url, timeout=t, stream=True), ceiling=30, tenant=tenant_id,
+    )
+    with resp:
+        resp.raise_for_status()
+        return blob_store().put_stream(resp.iter_content(CHUNK_SIZE))
+
+
+def ensure_stored(doc: Document, kind: str = "pdf") -> Optional[str]:
+    """
+    sha256 del archivo del documento en el almacén, descargándolo si aún no está (o si el
+    archivo se perdió). Anota sha256/tamaño en doc sin confirmar. None si no tiene URL.
+    """
+    url_attr, sha_attr, size_attr, _, op = KINDS[kind]
+    digest = getattr(doc, sha_attr)
+    if digest and blob_store().exists(digest):
+        return digest
+    url = getattr(doc, url_attr)
+    if not url:
+        return None
+    digest, size = download_to_store(url, doc.user_id, op)
+    setattr(doc, sha_attr, digest)
+    setattr(doc, size_attr, size)
+    return digest
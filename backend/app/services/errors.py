@@ -0,0 +1,94 @@
+"""
+Clasificación de errores de emisión y programación de reintentos.
+
+- transient:  red, timeouts, 408/425/429 y 5xx. Se reintenta sola con backoff exponencial
+              (next_attempt_at) hasta MAX_ATTEMPTS.
+- credential: 401/403 o credenciales faltantes. Espera a que el usuario actualice sus keys
+              (PUT /config/keys reprograma estas ventas).
+- validation: 400/404/409/422: los datos de la venta no sirven tal cual; requiere corrección.
+- permanent:  cualquier otro error. Solo se reintenta a mano.
+
+Solo las ventas con next_attempt_at no nulo entran al índice parcial ix_sales_retry_due, que
+es lo que recorre app.tasks.jobs.enqueue_due_retries.
+"""
+import os
+from datetime import datetime, timedelta
+from typing import Optional
+
+import requests
+
+from app.models import Sale
+from app.services.notify import RETRIES, notify_work
+
+TRANSIENT = "transient"
+CREDENTIAL = "credential"
+VALIDATION = "validation"
+PERMANENT = "permanent"
+ERROR_KINDS = (TRANSIENT, CREDENTIAL, VALIDATION, PERMANENT)
+
+MAX_ATTEMPTS = int(os.environ.get("RETRY_MAX_ATTEMPTS", "6"))
+BACKOFF_BASE = timedelta(minutes=2)
+BACKOFF_MAX = timedelta(hours=12)
+
+_TRANSIENT_STATUS = {408, 425, 429}
+_CREDENTIAL_STATUS = {401, 403}
+_VALIDATION_STATUS = {400, 404, 409, 422}
+
+
+def classify_status(status_code: Optional[int]) -> str:
+    """Tipo de error según el código HTTP de la respuesta."""
+    if status_code is None:
+        return PERMANENT
+    if status_code in _TRANSIENT_STATUS or status_code >= 500:
+        return TRANSIENT
+    if status_code in _CREDENTIAL_STATUS:
+        return CREDENTIAL
+    if status_code in _VALIDATION_STATUS:
+        return VALIDATION
+    return PERMANENT
+
+
+def classify_exception(exc: BaseException) -> str:
+    """Tipo de error de una excepción (requests o interna)."""
+    if isinstance(exc, requests.HTTPError) and exc.response is not None:
+        return classify_status(exc.response.status_code)
+    if isinstance(exc, (requests.ConnectionError, requests.Timeout)):
+        return TRANSIENT
+    return PERMANENT
+
+
+def backoff(attempts: int) -> timedelta:
+    return min(BACKOFF_MAX, BACKOFF_BASE * (2 ** max(0, attempts - 1)))
+
+
+def record_failure(sale: Sale, message: Optional[str], kind: Optional[str], now: Optional[datetime] = None) -> None:
+    """Marca la venta en Error y, si el error es transitorio, programa el siguiente intento."""
+    now  = now or datetime.utcnow()
+    kind = kind if kind in ERROR_KINDS else PERMANENT
+    sale.status        = "Error"
+    sale.error_message = message or "Unknown"
+    sale.error_kind    = kind
+    sale.attempts      = (sale.attempts or 0) + 1
+    if kind == TRANSIENT and sale.attempts < MAX_ATTEMPTS:
+        sale.next_attempt_at = now + backoff(sale.attempts)
+    else:
+        sale.next_attempt_at = None
+
+
+def clear_failure(sale: Sale) -> None:
+    """La venta se emitió: sale del índice de reintentos."""
+    sale.error_kind      = None
+    sale.attempts        = 0
+    sale.next_attempt_at = None
+
+
+def reschedule_credential_errors(user_id: int, now: Optional[datetime] = None) -> int:
+    """Tras actualizar credenciales: las ventas con error de credenciales vuelven a la cola."""
+    n = (
+        Sale.query
+        .filter(Sale.user_id == user_id, Sale.status == "Error", Sale.error_kind == CREDENTIAL)
+        .update({"next_attempt_at": now or datetime.utcnow()}, synchronize_session=False)
+    )
+    if n:
+        notify_work(RETRIES)
+    return n
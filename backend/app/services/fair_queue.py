@@ -0,0 +1,230 @@
+"""
+Reparto justo de la cola entre tenants: jobs (processing_jobs) y outbox de subidas (upload_tasks).
+
+- Cada tenant tiene un plan (User.plan) con un peso (TENANT_PLAN_WEIGHTS, p. ej.
+  "basic:1,pro:2,enterprise:4") y un tope de jobs en curso (TENANT_PLAN_MAX_JOBS, por defecto 1).
+- Jobs: fair queuing ponderado por servicio recibido. El tiempo virtual de un tenant es el tiempo
+  de worker que usaron sus jobs en la última FAIR_WINDOW dividido por su peso; se atiende primero
+  al de menor tiempo virtual y, a igualdad, al de job más antiguo. Un vendedor que recién encola
+  parte en 0 y pasa delante de cualquier backlog. No hay estado propio: todo se calcula de
+  processing_jobs, así que vale igual con varios workers.
+- Subidas: cada lote se reparte entre los tenants con tareas vencidas en proporción a su peso
+  (fair_shares), empezando por el que más espera; lo que un tenant no usa pasa al resto.
+- queue_metrics: profundidad de cola y espera por tenant (GET /admin/queues).
+"""
+from __future__ import annotations
+
+import os
+from collections import defaultdict
+from datetime import datetime, timedelta
+from typing import Collection, Dict, Iterable, List, Optional, Tuple
+
+from sqlalchemy import func, or_
+
+from app import db
+from app.models import ProcessingJob, UploadTask, User
+
+DEFAULT_PLAN = "basic"
+FAIR_WINDOW = timedelta(minutes=int(os.environ.get("FAIR_WINDOW_MINUTES", "60")))
+# Esperas recientes que entran en las métricas (jobs tomados en la ventana)
+METRICS_WINDOW = timedelta(hours=24)
+
+
+def _plan_map(value: str, cast) -> Dict[str, float]:
+    """"basic:1,pro:2" → {"basic": 1, "pro": 2}; se ignoran las entradas mal formadas."""
+    result = {}
+    for part in (value or "").split(","):
+        name, _, raw = part.partition(":")
+        try:
+            result[name.strip()] = cast(raw)
+        except ValueError:
+            continue
+    return result
+
+
+PLAN_WEIGHTS: Dict[str, float] = _plan_map(
+    os.environ.get("TENANT_PLAN_WEIGHTS", "basic:1,pro:2,enterprise:4"), float,
+)
+PLAN_MAX_JOBS: Dict[str, int] = _plan_map(os.environ.get("TENANT_PLAN_MAX_JOBS", ""), int)
+
+
+def weight_for(plan: Optional[str]) -> float:
+    return max(0.01, PLAN_WEIGHTS.get(plan or DEFAULT_PLAN, 1.0))
+
+
+def max_jobs_for(plan: Optional[str]) -> int:
+    return max(1, PLAN_MAX_JOBS.get(plan or DEFAULT_PLAN, 1))
+
+
+def plans_for(user_ids: Iterable[int]) -> Dict[int, str]:
+    ids = list(set(user_ids))
+    if not ids:
+        return {}
+    rows = db.session.query(User.id, User.plan).filter(User.id.in_(ids)).all()
+    return {user_id: plan or DEFAULT_PLAN for user_id, plan in rows}
+
+
+def _service_seconds(now: datetime, user_ids: Collection[int]) -> Dict[int, float]:
+    """Segundos de worker usados por cada tenant en FAIR_WINDOW (jobs terminados y en curso)."""
+    since = now - FAIR_WINDOW
+    rows = (
+        db.session.query(ProcessingJob.user_id, ProcessingJob.started_at, ProcessingJob.finished_at)
+        .filter(
+            ProcessingJob.user_id.in_(list(user_ids)),
+            ProcessingJob.started_at.isnot(None),
+            or_(ProcessingJob.status == "running", ProcessingJob.finished_at >= since),
+        )
+        .all()
+    )
+    service: Dict[int, float] = defaultdict(float)
+    for user_id, started, finished in rows:
+        start = max(started, since)
+        end = finished or now
+        if end > start:
+            service[user_id] += (end - start).total_seconds()
+    return service
+
+
+def job_tenant_order(exclude_users: Collection[int] = (), now: Optional[datetime] = None) -> List[int]:
+    """
+    Tenants con jobs en cola y por debajo de su tope de jobs en curso, en el orden en que
+    corresponde atenderlos (menor servicio reciente por peso; a igualdad, job más antiguo).
+    """
+    now = now or datetime.utcnow()
+    queued = dict(
+        db.session.query(ProcessingJob.user_id, func.min(ProcessingJob.created_at))
+        .filter(ProcessingJob.status == "queued")
+        .group_by(ProcessingJob.user_id)
+        .all()
+    )
+    for user_id in exclude_users:
+        queued.pop(user_id, None)
+    if not queued:
+        return []
+    running = dict(
+        db.session.query(ProcessingJob.user_id, func.count(ProcessingJob.id))
+        .filter(ProcessingJob.status == "running", ProcessingJob.user_id.in_(list(queued)))
+        .group_by(ProcessingJob.user_id)
+        .all()
+    )
+    plans = plans_for(queued)
+    service = _service_seconds(now, queued)
+    eligible = [
+        user_id for user_id in queued
+        if running.get(user_id, 0) < max_jobs_for(plans.get(user_id))
+    ]
+    return sorted(
+        eligible,
+        key=lambda user_id: (service.get(user_id, 0.0) / weight_for(plans.get(user_id)), queued[user_id], user_id),
+    )
+
+
+def fair_shares(demand: List[Tuple[int, int, float]], limit: int) -> Dict[int, int]:
+    """
+    Reparte `limit` unidades entre tenants (user_id, pendientes, peso) en proporción al peso,
+    sin dar a nadie más de lo que tiene pendiente; el sobrante pasa al resto. demand viene
+    ordenado por prioridad: si hay más tenants que unidades, reciben los primeros.
+    """
+    shares = {user_id: 0 for user_id, _, _ in demand}
+    pending = {user_id: n for user_id, n, _ in demand}
+    active = [(user_id, weight) for user_id, n, weight in demand if n > 0]
+    left = limit
+    while left > 0 and active:
+        total_weight = sum(weight for _, weight in active)
+        budget = left
+        still = []
+        for user_id, weight in active:
+            give = min(pending[user_id] - shares[user_id], max(1, int(budget * weight / total_weight)), left)
+            shares[user_id] += give
+            left -= give
+            if shares[user_id] < pending[user_id]:
+                still.append((user_id, weight))
+            if not left:
+                break
+        active = still
+    return {user_id: n for user_id, n in shares.items() if n}
+
+
+def upload_shares(limit: int, now: datetime) -> Dict[int, int]:
+    """Cuántas tareas vencidas del outbox toma cada tenant en un lote de `limit`."""
+    due = (
+        db.session.query(UploadTask.user_id, func.count(UploadTask.id), func.min(UploadTask.next_attempt_at))
+        .filter(UploadTask.status == "pending", UploadTask.next_attempt_at <= now)
+        .group_by(UploadTask.user_id)
+        .order_by(func.min(UploadTask.next_attempt_at), UploadTask.user_id)
+        .all()
+    )
+    plans = plans_for(user_id for user_id, _, _ in due)
+    return fair_shares([(user_id, n, weight_for(plans.get(user_id))) for user_id, n, _ in due], limit)
+
+
+def queue_metrics(now: Optional[datetime] = None) -> List[dict]:
+    """Por tenant con trabajo pendiente o reciente: profundidad de cola, esperas y servicio."""
+    now = now or datetime.utcnow()
+    jobs = (
+        db.session.query(
+            ProcessingJob.user_id,
+            func.count(ProcessingJob.id).filter(ProcessingJob.status == "queued"),
+            func.count(ProcessingJob.id).filter(ProcessingJob.status == "running"),
+            func.min(ProcessingJob.created_at).filter(ProcessingJob.status == "queued"),
+        )
+        .filter(ProcessingJob.status.in_(("queued", "running")))
+        .group_by(ProcessingJob.user_id)
+        .all()
+    )
+    uploads = (
+        db.session.query(
+            UploadTask.user_id,
+            func.count(UploadTask.id),
+            func.min(UploadTask.next_attempt_at),
+        )
+        .filter(UploadTask.status == "pending", UploadTask.next_attempt_at <= now)
+        .group_by(UploadTask.user_id)
+        .all()
+    )
+    waits: Dict[int, List[float]] = defaultdict(list)
+    for user_id, created, started in (
+        db.session.query(ProcessingJob.user_id, ProcessingJob.created_at, ProcessingJob.started_at)
+        .filter(ProcessingJob.started_at >= now - METRICS_WINDOW)
+        .all()
+    ):
+        waits[user_id].append(max(0.0, (started - created).total_seconds()))
+
+    tenants: Dict[int, dict] = defaultdict(dict)
+    for user_id, queued, running, oldest in jobs:
+        tenants[user_id].update({
+            "jobs_queued":          queued,
+            "jobs_running":         running,
+            "oldest_job_wait_s":    round((now - oldest).total_seconds(), 1) if oldest else None,
+        })
+    for user_id, due, oldest in uploads:
+        tenants[user_id].update({
+            "uploads_due":          due,
+            "oldest_upload_wait_s": round((now - oldest).total_seconds(), 1) if oldest else None,
+        })
+    for user_id in waits:
+        tenants.setdefault(user_id, {})
+    plans = plans_for(tenants)
+    service = _service_seconds(now, list(tenants)) if tenants else {}
+
+    result = []
+    for user_id, data in tenants.items():
+        recent = sorted(waits.get(user_id, []))
+        plan = plans.get(user_id, DEFAULT_PLAN)
+        result.append({
+            "user_id":              user_id,
+            "plan":                 plan,
+            "weight":               weight_for(plan),
+            "max_jobs":             max_jobs_for(plan),
+            "jobs_queued":          data.get("jobs_queued", 0),
+            "jobs_running":         data.get("jobs_running", 0),
+            "oldest_job_wait_s":    data.get("oldest_job_wait_s"),
+            "uploads_due":          data.get("uploads_due", 0),
+            "oldest_upload_wait_s": data.get("oldest_upload_wait_s"),
+            "jobs_started_24h":     len(recent),
+            "job_wait_p50_s":       round(recent[len(recent) // 2], 1) if recent else None,
+            "job_wait_max_s":       round(recent[-1], 1) if recent else None,
+            "service_s":            round(service.get(user_id, 0.0), 1),
+            "virtual_time":         round(service.get(user_id, 0.0) / weight_for(plan), 1),
+        })
+    return sorted(result, key=lambda t: (-(t["oldest_job_wait_s"] or 0), t["user_id"]))
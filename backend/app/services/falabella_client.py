@@ -7,18 +7,40 @@ Cliente para Falabella Seller Center API (sellercenter-api.falabella.com).
 - Documentos tributarios: SetInvoicePDF (POST /v1/marketplace-sellers/invoice/pdf) para subir
   boleta/factura en PDF; equivalente a https://sellercenter.falabella.com/order/invoice#/upload-documents
 """
+import codecs
+import json
 import logging
+import os
+import re
 import requests
 import hmac
 import hashlib
 from datetime import datetime, timezone
-from typing import Optional, List, Dict, Any
+from typing import Optional, List, Dict, Any, Iterable, Iterator
 from urllib.parse import quote, urlencode
 
+from app.json_utils import dumps_bytes, response_json
+from app.services.stream_bodies import Base64JSONBody
+from app.services.latency import upstream_call
+
 logger = logging.getLogger(__name__)
 
-# URL oficial Falabella Seller Center
+# URL oficial Falabella Seller Center (FALABELLA_BASE_URL_OVERRIDE la sobrescribe, p. ej. fake_upstreams)
 DEFAULT_BASE_URL = "https://sellercenter-api.falabella.com"
+# Variable antigua: nunca se leyó y los .env copiados del ejemplo viejo la traen con hosts que no
+# existen (https://api.falabella.com/seller). Se ignora con un aviso.
+LEGACY_BASE_URL_ENV = "FALABELLA_API_BASE"
+_legacy_warned = False
+
+# Tamaño de lectura en modo streaming (GetOrders grandes)
+STREAM_CHUNK_SIZE = 64 * 1024
+
+# Órdenes por llamada a GetMultipleOrderItems
+MAX_ORDERS_PER_ITEMS_CALL = 50
+
+
+class FalabellaStreamError(Exception):
+    """La respuesta en streaming se cortó a mitad: el listado entregado hasta ahí está incompleto."""
 
 
 def _rfc3986_encode(s: str) -> str:
@@ -47,6 +69,19 @@ def _iso8601_timestamp() -> str:
     return datetime.now(timezone.utc).strftime("%Y-%m-%dT%H:%M:%S+00:00")
 
 
+def _env_base_url() -> Optional[str]:
+    """FALABELLA_BASE_URL_OVERRIDE; avisa una vez si solo está la variable antigua con otro host."""
+    global _legacy_warned
+    legacy = (os.environ.get(LEGACY_BASE_URL_ENV) or "").rstrip("/")
+    if legacy and legacy != DEFAULT_BASE_URL and not _legacy_warned:
+        _legacy_warned = True
+        logger.warning(
+            "%s=%s se ignora (se usa %s); para otro host define FALABELLA_BASE_URL_OVERRIDE",
+            LEGACY_BASE_URL_ENV, legacy, DEFAULT_BASE_URL,
+        )
+    return os.environ.get("FALABELLA_BASE_URL_OVERRIDE")
+
+
 class FalabellaClient:
     """
     Cliente para la API de Falabella Seller Center.
@@ -59,10 +94,12 @@ class FalabellaClient:
         api_key: str,
         base_url: Optional[str] = None,
         user_agent: Optional[str] = None,
+        tenant_id: Optional[int] = None,
     ):
         self.user_id = user_id.strip()
+        self.tenant_id = tenant_id  # user_id de la app, para el ledger de llamadas
         self.api_key = api_key
-        self.base_url = (base_url or DEFAULT_BASE_URL).rstrip("/")
+        self.base_url = (base_url or _env_base_url() or DEFAULT_BASE_URL).rstrip("/")
         # User-Agent recomendado: SELLER_ID/TECHNOLOGY/VERSION/INTEGRATION_TYPE/BUSINESS_UNIT (Chile: FACL)
         self.user_agent = user_agent or "SELLER/Python/3/INVOICE_MVP/FACL"
 
@@ -76,9 +113,16 @@ class FalabellaClient:
             "Version": "1.0",
         }
 
-    def _request(self, params: Dict[str, Any], method: str = "GET") -> Dict[str, Any]:
+    def _request(
+        self,
+        params: Dict[str, Any],
+        method: str = "GET",
+        stream_key: Optional[str] = None,
+    ) -> Dict[str, Any]:
         """
         Ejecuta la petición firmada. Convierte listas en múltiples valores para la query string.
+        stream_key: si se indica (p. ej. "Order"), no se parsea la respuesta completa; se devuelve
+        {"success": True, "items": iterador} que entrega los elementos de esa clave uno a uno.
         """
         # Valores para firma: todo en string; las listas se unen en comma para la firma
         str_params = {}
@@ -109,14 +153,36 @@ class FalabellaClient:
 
         url = f"{self.base_url}/?{query_string}"
         headers = {"User-Agent": self.user_agent}
+        op = f"falabella.{params.get('Action', 'request')}"
+        stream = bool(stream_key)
 
+        resp = None
         try:
             if method.upper() == "GET":
-                resp = requests.get(url, headers=headers, timeout=60)
+                resp = upstream_call(
+                    op,
+                    lambda t: requests.get(url, headers=headers, timeout=t, stream=stream),
+                    ceiling=60,
+                    hedge=not stream,
+                    tenant=self.tenant_id,
+                )
             else:
-                resp = requests.post(url, headers=headers, timeout=60)
+                resp = upstream_call(
+                    op,
+                    lambda t: requests.post(url, headers=headers, timeout=t, stream=stream),
+                    ceiling=60,
+                    tenant=self.tenant_id,
+                )
             resp.raise_for_status()
-            data = resp.json()
+            if stream_key:
+                stream = _JsonItemStream(resp.iter_content(STREAM_CHUNK_SIZE), stream_key)
+                if stream.found():
+                    return {"success": True, "items": _closing(stream, resp)}
+                resp.close()
+                # La clave no apareció: respuesta chica (error u orden vacía) ya en memoria
+                data = json.loads(stream.buffer) if stream.buffer.strip() else {}
+            else:
+                data = response_json(resp)
         except requests.RequestException as e:
             logger.exception("Falabella API request error: %s", e)
             try:
@@ -129,8 +195,6 @@ class FalabellaClient:
             return {"success": False, "error": f"Invalid response: {e}"}
 
         # Respuesta éxito viene en SuccessResponse; error en ErrorResponse
-        if "SuccessResponse" in data:
-            return {"success": True, "data": data.get("SuccessResponse", data)}
         if "ErrorResponse" in data:
             head = data["ErrorResponse"].get("Head", {})
             return {
@@ -139,7 +203,10 @@ class FalabellaClient:
                 "error_code": head.get("ErrorCode"),
                 "response": data,
             }
-        return {"success": True, "data": data}
+        result = {"success": True, "data": data.get("SuccessResponse", data)}
+        if stream_key:
+            result["items"] = iter(_as_list(_find_key(result["data"], stream_key)))
+        return result
 
     def get_orders(
         self,
@@ -149,11 +216,16 @@ class FalabellaClient:
         limit: int = 100,
         offset: int = 0,
         shipping_type: Optional[str] = None,
+        stream: bool = False,
     ) -> Dict[str, Any]:
         """
         GetOrders. Obtiene órdenes. Obligatorio CreatedAfter o UpdatedAfter (ISO 8601).
         status: pending, canceled, ready_to_ship, shipped, delivered, returned, failed_delivery, etc.
         shipping_type: dropshipping | own_warehouse | cross_docking
+        stream: True → {"success": True, "orders": iterador}; cada Order se parsea a medida que
+        llega del socket, sin cargar la respuesta completa en memoria. Si la conexión se corta o
+        el JSON llega roto a mitad, el iterador lanza FalabellaStreamError en vez de terminar
+        como si el listado estuviera completo.
         """
         if not created_after and not updated_after:
             return {"success": False, "error": "CreatedAfter o UpdatedAfter es obligatorio"}
@@ -168,7 +240,12 @@ class FalabellaClient:
         params["Offset"] = offset
         if shipping_type:
             params["ShippingType"] = shipping_type
-        return self._request(params)
+        if not stream:
+            return self._request(params)
+        result = self._request(params, stream_key="Order")
+        if result.get("success"):
+            result["orders"] = result.pop("items")
+        return result
 
     def get_order_items(self, order_id: str) -> Dict[str, Any]:
         """
@@ -179,6 +256,15 @@ class FalabellaClient:
         params["OrderId"] = str(order_id)
         return self._request(params)
 
+    def get_multiple_order_items(self, order_ids: List[str]) -> Dict[str, Any]:
+        """
+        GetMultipleOrderItems. Ítems de varias órdenes en una llamada (hasta
+        MAX_ORDERS_PER_ITEMS_CALL); ver parse_multiple_order_items_response.
+        """
+        params = self._base_params("GetMultipleOrderItems")
+        params["OrderIdList"] = "[" + ",".join(str(o) for o in order_ids[:MAX_ORDERS_PER_ITEMS_CALL]) + "]"
+        return self._request(params)
+
     def get_document(
         self,
         order_item_ids: List[int],
@@ -223,11 +309,14 @@ class FalabellaClient:
         invoice_date: str,
         invoice_type: str,
         operator_code: str,
-        pdf_base64: str,
+        pdf_base64: Optional[str] = None,
+        pdf_path: Optional[str] = None,
     ) -> Dict[str, Any]:
         """
         SetInvoicePDF. Sube el documento tributario (boleta/factura) en PDF a Falabella.
         Equivalente a la carga manual en: Seller Center > Order/Invoice > Upload documents.
+        Con pdf_path el body JSON se arma mientras se envía (base64 por partes desde el
+        archivo, app.services.stream_bodies) en vez de recibir el PDF ya codificado.
 
         Requisitos:
         - La orden debe estar al menos en estado ready_to_ship.
@@ -267,11 +356,19 @@ class FalabellaClient:
             "invoiceType": invoice_type.strip().upper(),
             "operatorCode": operator_code.strip().upper(),
             "invoiceDocumentFormat": "pdf",
-            "invoiceDocument": pdf_base64,
         }
         try:
-            resp = requests.post(url, headers=headers, json=body, timeout=60)
-            data = resp.json() if resp.content else {}
+            if pdf_path:
+                payload = Base64JSONBody(body, "invoiceDocument", pdf_path)
+            else:
+                payload = dumps_bytes({**body, "invoiceDocument": pdf_base64})
+            resp = upstream_call(
+                "falabella.SetInvoicePDF",
+                lambda t: requests.post(url, headers=headers, data=payload, timeout=t),
+                ceiling=60,
+                tenant=self.tenant_id,
+            )
+            data = response_json(resp) if resp.content else {}
             if not resp.ok:
                 return {
                     "success": False,
@@ -290,8 +387,11 @@ class FalabellaClient:
         Comprueba si en Falabella ya existe un documento tributario cargado para esta orden.
         Primera comprobación obligatoria antes de volver a emitir/subir.
         - True: ya hay documento en Falabella → no reemitir.
-        - False: no hay documento en Falabella.
+        - False: no hay documento en Falabella (respuesta exitosa sin documento o E035).
         - None: no se pudo comprobar (API no disponible o error).
+        Un error cuyo texto dice "not found" sin el código E035 es None: puede referirse a la
+        orden, al seller o a la acción, no prueba que falte el documento (y la reconciliación
+        degradaría ventas cargadas).
         """
         try:
             # Intentar API principal: GetInvoice (si Falabella lo expone)
@@ -303,9 +403,7 @@ class FalabellaClient:
                 if body and (body.get("InvoiceNumber") or body.get("Document") or body.get("File")):
                     return True
                 return False
-            err = result.get("error", "")
-            code = result.get("error_code")
-            if code == "E035" or "not found" in (err or "").lower():
+            if result.get("error_code") == "E035":  # Invoice not found
                 return False
             return None
         except Exception as e:
@@ -328,3 +426,136 @@ def parse_order_items_response(result: Dict[str, Any]) -> List[Dict[str, Any]]:
         if isinstance(items, list):
             return items
     return []
+
+
+def parse_multiple_order_items_response(result: Dict[str, Any]) -> Dict[str, List[Dict[str, Any]]]:
+    """{OrderId: [OrderItem, ...]} desde la respuesta de GetMultipleOrderItems."""
+    if not result.get("success"):
+        return {}
+    body = result.get("data", {}).get("Body") or result.get("data", {})
+    orders = _as_list(_find_key(body, "Order"))
+    items_by_order: Dict[str, List[Dict[str, Any]]] = {}
+    for order in orders:
+        if not isinstance(order, dict) or "OrderId" not in order:
+            continue
+        items = order.get("OrderItems") or {}
+        if isinstance(items, dict):
+            items = items.get("OrderItem") or []
+        items_by_order[str(order["OrderId"])] = [it for it in _as_list(items) if isinstance(it, dict)]
+    return items_by_order
+
+
+# ── Parseo incremental (modo streaming) ────────────────────────────────────
+
+def _find_key(node: Any, key: str) -> Any:
+    """Busca recursivamente la primera aparición de key en un árbol JSON ya parseado."""
+    if isinstance(node, dict):
+        if key in node:
+            return node[key]
+        for v in node.values():
+            found = _find_key(v, key)
+            if found is not None:
+                return found
+    return None
+
+
+def _as_list(value: Any) -> List[Any]:
+    """Falabella devuelve un objeto suelto cuando hay un solo elemento; normaliza a lista."""
+    if isinstance(value, list):
+        return value
+    return [value] if isinstance(value, dict) else []
+
+
+class _JsonItemStream:
+    """
+    Lee un documento JSON por trozos y entrega, uno a uno, los elementos del primer
+    valor asociado a `key` (un array de objetos o un objeto suelto).
+    Solo mantiene en memoria el elemento en curso, no la respuesta completa.
+    """
+
+    def __init__(self, chunks: Iterable[bytes], key: str):
+        self._chunks = iter(chunks)
+        self._decoder = codecs.getincrementaldecoder("utf-8")()
+        self._json = json.JSONDecoder()
+        self._key_re = re.compile(r'"%s"\s*:\s*' % re.escape(key))
+        self._eof = False
+        self.buffer = ""
+
+    def _read(self) -> bool:
+        """Agrega el siguiente trozo al buffer. False si ya no quedan datos."""
+        for chunk in self._chunks:
+            if chunk:
+                self.buffer += self._decoder.decode(chunk)
+                return True
+        if not self._eof:
+            self.buffer += self._decoder.decode(b"", final=True)
+            self._eof = True
+        return False
+
+    def found(self) -> bool:
+        """Avanza hasta el valor de la clave. False si el documento termina sin encontrarla."""
+        while True:
+            m = self._key_re.search(self.buffer)
+            if m:
+                self.buffer = self.buffer[m.end():]
+                return True
+            if not self._read():
+                return False
+
+    def _peek(self) -> str:
+        """Primer carácter significativo del buffer (descarta espacios y comas)."""
+        while True:
+            self.buffer = self.buffer.lstrip(" \t\r\n,")
+            if self.buffer or not self._read():
+                return self.buffer[:1]
+
+    def _decode_next(self) -> Any:
+        while True:
+            try:
+                value, end = self._json.raw_decode(self.buffer)
+            except json.JSONDecodeError as e:
+                if not self._read():
+                    raise FalabellaStreamError(f"la respuesta terminó a mitad de un elemento: {e}") from e
+                continue
+            self.buffer = self.buffer[end:]
+            return value
+
+    def __iter__(self) -> Iterator[Dict[str, Any]]:
+        """
+        Lanza FalabellaStreamError si el documento termina antes de cerrar el elemento o la
+        lista: un corte justo entre dos elementos no debe parecer el final del listado.
+        """
+        first = self._peek()
+        if first == "{":
+            yield self._decode_next()
+            return
+        if first != "[":
+            return  # "", null u otro valor vacío
+        self.buffer = self.buffer[1:]
+        while True:
+            nxt = self._peek()
+            if nxt == "]":
+                return
+            if nxt == "":
+                raise FalabellaStreamError("la respuesta terminó antes de cerrar la lista")
+            item = self._decode_next()
+            if isinstance(item, dict):
+                yield item
+
+
+def _closing(stream: _JsonItemStream, resp: requests.Response) -> Iterator[Dict[str, Any]]:
+    """
+    Itera el stream y cierra la conexión al terminar (o si el consumidor corta antes).
+    Un corte a mitad se propaga como FalabellaStreamError: terminar en silencio haría pasar
+    un listado truncado por completo.
+    """
+    try:
+        yield from stream
+    except FalabellaStreamError as e:
+        logger.warning("Falabella stream interrumpido: %s", e)
+        raise
+    except (requests.RequestException, ValueError) as e:
+        logger.warning("Falabella stream interrumpido: %s", e)
+        raise FalabellaStreamError(f"Falabella GetOrders se interrumpió a mitad de la respuesta: {e}") from e
+    finally:
+        resp.close()
@@ -2,18 +2,54 @@
 Cliente para API Haulmer (OpenFactura) - emisión de boletas/facturas.
 Documentación: https://docsapi-openfactura.haulmer.com/
 En MVP se usan endpoints típicos; ajustar según documentación real de Haulmer.
+
+Emisión concurrente: cada emisión lleva un Idempotency-Key estable (emission_key) para que
+un reintento no genere un segundo DTE, y como máximo HAULMER_MAX_CONCURRENCY emisiones
+simultáneas por API key dentro del proceso.
 """
+import hashlib
 import logging
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
 import requests
-from typing import Optional, Dict, Any
+from typing import Optional, Dict, Any, Iterable, Iterator, Tuple
+
+from app.json_utils import dumps_bytes, response_json
+from app.services.errors import classify_exception
+from app.services.latency import upstream_call
 
 logger = logging.getLogger(__name__)
 
+MAX_CONCURRENCY = int(os.environ.get("HAULMER_MAX_CONCURRENCY", "4"))
+
+_slots: Dict[str, threading.BoundedSemaphore] = {}
+_slots_lock = threading.Lock()
+
+
+def emission_key(user_id: int, id_venta: str, tipo_doc: str) -> str:
+    """Idempotency-Key de una emisión: estable por (usuario, id_venta, tipo_doc)."""
+    raw = f"{user_id}:{id_venta}:{(tipo_doc or 'Boleta').lower()}"
+    return hashlib.sha256(raw.encode()).hexdigest()
+
+
+def _emission_slot(api_key: str) -> threading.BoundedSemaphore:
+    """Semáforo compartido por todas las emisiones de una misma API key."""
+    key = hashlib.sha256(api_key.encode()).hexdigest()
+    with _slots_lock:
+        slot = _slots.get(key)
+        if slot is None:
+            slot = _slots[key] = threading.BoundedSemaphore(max(1, MAX_CONCURRENCY))
+        return slot
+
 
 class HaulmerClient:
-    def __init__(self, api_key: str, base_url: Optional[str] = None):
+    def __init__(self, api_key: str, base_url: Optional[str] = None, tenant_id: Optional[int] = None):
         self.api_key = api_key
-        self.base_url = (base_url or "https://docsapi-openfactura.haulmer.com").rstrip("/")
+        self.tenant_id = tenant_id  # user_id de la app, para el ledger de llamadas
+        self.base_url = (
+            base_url or os.environ.get("HAULMER_API_BASE") or "https://docsapi-openfactura.haulmer.com"
+        ).rstrip("/")
 
     def _headers(self) -> dict:
         return {
@@ -21,10 +57,19 @@ class HaulmerClient:
             "Content-Type": "application/json",
         }
 
-    def emit_document(self, tipo_doc: str, id_venta: str, monto: float, **kwargs) -> Dict[str, Any]:
+    def emit_document(
+        self,
+        tipo_doc: str,
+        id_venta: str,
+        monto: float,
+        idempotency_key: Optional[str] = None,
+        **kwargs,
+    ) -> Dict[str, Any]:
         """
         Emite boleta o factura. tipo_doc: 'Boleta' | 'Factura'.
-        Retorna dict con pdf_url, xml_url, o error.
+        idempotency_key: se envía como Idempotency-Key (ver emission_key); con la misma key
+        Haulmer devuelve el documento ya emitido en vez de emitir otro.
+        Retorna dict con pdf_url, xml_url, o error y error_kind (app.services.errors).
         """
         # Payload típico según documentación Haulmer; adaptar a su API real
         payload = {
@@ -37,9 +82,19 @@ class HaulmerClient:
         try:
             # Endpoint de ejemplo; revisar docs Haulmer para el correcto
             url = f"{self.base_url}/v2/dte/document"
-            resp = requests.post(url, json=payload, headers=self._headers(), timeout=30)
+            body = dumps_bytes(payload)
+            headers = self._headers()
+            if idempotency_key:
+                headers["Idempotency-Key"] = idempotency_key
+            with _emission_slot(self.api_key):
+                resp = upstream_call(
+                    "haulmer.emit_document",
+                    lambda t: requests.post(url, data=body, headers=headers, timeout=t),
+                    ceiling=30,
+                    tenant=self.tenant_id,
+                )
             resp.raise_for_status()
-            data = resp.json()
+            data = response_json(resp)
             return {
                 "success": True,
                 "pdf_url": data.get("pdf_url") or data.get("pdf"),
@@ -51,6 +106,27 @@ class HaulmerClient:
             return {
                 "success": False,
                 "error": str(e),
+                "error_kind": classify_exception(e),
                 "pdf_url": None,
                 "xml_url": None,
             }
+
+
+def emit_documents(
+    client: HaulmerClient,
+    docs: Iterable[Dict[str, Any]],
+    max_workers: Optional[int] = None,
+) -> Iterator[Tuple[Dict[str, Any], Dict[str, Any]]]:
+    """
+    Emite varios documentos en paralelo y entrega (doc, resultado) a medida que terminan.
+    Cada doc trae los argumentos de emit_document (tipo_doc, id_venta, monto, idempotency_key).
+    La concurrencia real queda acotada además por el semáforo de la API key.
+    """
+    docs = list(docs)
+    if not docs:
+        return
+    workers = max(1, min(max_workers or MAX_CONCURRENCY, len(docs)))
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="haulmer-emit") as pool:
+        futures = {pool.submit(client.emit_document, **doc): doc for doc in docs}
+        for future in as_completed(futures):
+            yield futures[future], future.result()
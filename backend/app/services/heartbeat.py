@@ -0,0 +1,52 @@
+"""
+Heartbeat de filas en curso (processing_jobs.heartbeat_at, upload_tasks.updated_at).
+
+Los barridos de trabajo caído (requeue_stale_jobs, requeue_stale_uploads) devuelven a la cola
+lo que lleva más de un umbral sin avance. Las fases largas que no escriben en la BD mientras
+esperan red (recolección de órdenes, un lote de subidas) se envuelven en keep_alive: un thread
+renueva la marca cada HEARTBEAT_SECONDS con una conexión propia del engine, fuera de db.session,
+y solo en las filas que siguen "running".
+"""
+import logging
+import os
+import threading
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Iterable, Iterator, Optional
+
+from app import db
+
+logger = logging.getLogger(__name__)
+
+# Muy por debajo de JOBS_STALE_MINUTES y del STALE_AFTER de las subidas
+HEARTBEAT_SECONDS = float(os.environ.get("HEARTBEAT_SECONDS", "30"))
+
+
+@contextmanager
+def keep_alive(model, ids: Iterable[int], column: str, every: Optional[float] = None) -> Iterator[None]:
+    """Mientras dura el bloque, pone `column` = ahora en las filas `ids` de `model` aún running."""
+    ids    = list(ids)
+    every  = every or HEARTBEAT_SECONDS
+    engine = db.engine
+    table  = model.__table__
+    stop   = threading.Event()
+
+    def beat():
+        while not stop.wait(every):
+            try:
+                with engine.begin() as conn:
+                    conn.execute(
+                        table.update()
+                        .where(table.c.id.in_(ids), table.c.status == "running")
+                        .values({column: datetime.utcnow()})
+                    )
+            except Exception as e:
+                logger.warning("%s: no se pudo renovar el heartbeat: %s", table.name, e)
+
+    thread = threading.Thread(target=beat, name=f"{table.name}-heartbeat", daemon=True)
+    thread.start()
+    try:
+        yield
+    finally:
+        stop.set()
+        thread.join()
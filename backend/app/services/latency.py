@@ -0,0 +1,163 @@
+"""
+Timeouts adaptativos y lecturas "hedged" para las llamadas a Falabella, Mercado Libre y Haulmer.
+
+- Se registra la latencia de cada operación (p. ej. "ml.get_order") en una ventana móvil.
+- El timeout de la siguiente llamada es p99 × UPSTREAM_TIMEOUT_FACTOR, acotado entre
+  UPSTREAM_TIMEOUT_FLOOR y el valor fijo que usaba el cliente (ceiling). Sin muestras
+  suficientes se usa el ceiling, igual que antes.
+- Hedging (opcional, UPSTREAM_HEDGING=1): en GETs idempotentes, si la primera petición no
+  respondió al llegar al p95, se lanza una segunda y se usa la que responda primero.
+- Cada intento se anota además en el ledger por tenant (app.services.ledger).
+"""
+from __future__ import annotations
+
+import logging
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from typing import Callable, Deque, Dict, Optional, Tuple
+
+import requests
+
+from app.services.ledger import ledger
+
+logger = logging.getLogger(__name__)
+
+WINDOW_SIZE = int(os.environ.get("UPSTREAM_LATENCY_WINDOW", "200"))
+MIN_SAMPLES = 20
+TIMEOUT_FLOOR = float(os.environ.get("UPSTREAM_TIMEOUT_FLOOR", "2"))
+TIMEOUT_FACTOR = float(os.environ.get("UPSTREAM_TIMEOUT_FACTOR", "2"))
+HEDGING_ENABLED = os.environ.get("UPSTREAM_HEDGING", "").lower() in ("1", "true", "yes")
+
+Send = Callable[[float], requests.Response]
+
+
+class LatencyTracker:
+    """Ventana móvil de latencias (segundos) por operación. Thread-safe."""
+
+    def __init__(self, window: int = WINDOW_SIZE):
+        self._window = window
+        self._samples: Dict[str, Deque[float]] = {}
+        self._lock = threading.Lock()
+
+    def record(self, op: str, seconds: float) -> None:
+        with self._lock:
+            samples = self._samples.get(op)
+            if samples is None:
+                samples = self._samples[op] = deque(maxlen=self._window)
+            samples.append(seconds)
+
+    def percentile(self, op: str, q: float) -> Optional[float]:
+        """Percentil q (0..1) de la operación, o None si hay menos de MIN_SAMPLES muestras."""
+        with self._lock:
+            samples = list(self._samples.get(op) or ())
+        if len(samples) < MIN_SAMPLES:
+            return None
+        samples.sort()
+        return samples[min(len(samples) - 1, int(q * len(samples)))]
+
+    def timeout_for(self, op: str, ceiling: float, floor: float = TIMEOUT_FLOOR) -> float:
+        p99 = self.percentile(op, 0.99)
+        if p99 is None:
+            return ceiling
+        return max(floor, min(ceiling, p99 * TIMEOUT_FACTOR))
+
+    def snapshot(self) -> Dict[str, Dict[str, Optional[float]]]:
+        """{op: {count, p50, p95, p99}} para diagnóstico y estimaciones."""
+        with self._lock:
+            ops = list(self._samples)
+        return {
+            op: {
+                "count": len(self._samples[op]),
+                "p50": self.percentile(op, 0.50),
+                "p95": self.percentile(op, 0.95),
+                "p99": self.percentile(op, 0.99),
+            }
+            for op in ops
+        }
+
+
+tracker = LatencyTracker()
+
+# Pool compartido para las peticiones hedged (la perdedora termina en background)
+_hedge_pool = ThreadPoolExecutor(max_workers=16, thread_name_prefix="hedge")
+
+
+def upstream_call(
+    op: str,
+    send: Send,
+    ceiling: float,
+    hedge: bool = False,
+    tenant: Optional[int] = None,
+) -> requests.Response:
+    """
+    Ejecuta send(timeout) con el timeout adaptativo de la operación y registra su latencia.
+    Un timeout se registra como muestra censurada (el propio timeout) para que el p99 suba.
+    hedge=True solo para GETs idempotentes; requiere UPSTREAM_HEDGING=1.
+    tenant: user_id al que se imputa la llamada en el ledger (None → no se contabiliza).
+    """
+    timeout = tracker.timeout_for(op, ceiling)
+    if hedge and HEDGING_ENABLED:
+        delay = tracker.percentile(op, 0.95)
+        if delay is not None and delay < timeout:
+            return _hedged(op, send, timeout, delay, tenant)
+    return _timed(op, send, timeout, tenant)
+
+
+def _sizes(resp: requests.Response) -> Tuple[int, int]:
+    """(bytes recibidos, bytes enviados) sin forzar la lectura de respuestas en streaming."""
+    if getattr(resp, "_content_consumed", False):
+        bytes_in = len(resp.content or b"")
+    else:
+        bytes_in = int(getattr(resp, "headers", {}).get("Content-Length") or 0)
+    body = getattr(getattr(resp, "request", None), "body", None)
+    # Los bodies en streaming (app.services.stream_bodies) conocen su largo sin leerse
+    bytes_out = len(body) if isinstance(body, (bytes, str)) or hasattr(body, "__len__") else 0
+    return bytes_in, bytes_out
+
+
+def _timed(op: str, send: Send, timeout: float, tenant: Optional[int] = None) -> requests.Response:
+    start = time.monotonic()
+    try:
+        resp = send(timeout)
+    except requests.RequestException as e:
+        elapsed = time.monotonic() - start
+        if isinstance(e, requests.Timeout):
+            tracker.record(op, timeout)
+        ledger.record(tenant, op, elapsed, error=True)
+        raise
+    elapsed = time.monotonic() - start
+    tracker.record(op, elapsed)
+    bytes_in, bytes_out = _sizes(resp)
+    status = getattr(resp, "status_code", 200)
+    ledger.record(tenant, op, elapsed, bytes_in, bytes_out, error=status >= 400)
+    return resp
+
+
+def _discard(future: Future) -> None:
+    """Cierra la respuesta de la petición que perdió la carrera."""
+    if not future.cancelled() and future.exception() is None:
+        future.result().close()
+
+
+def _hedged(op: str, send: Send, timeout: float, delay: float, tenant: Optional[int]) -> requests.Response:
+    first = _hedge_pool.submit(_timed, op, send, timeout, tenant)
+    done, _ = wait([first], timeout=delay)
+    if done:
+        return first.result()
+
+    logger.debug("hedge %s: sin respuesta tras %.2fs, segunda petición", op, delay)
+    second = _hedge_pool.submit(_timed, op, send, timeout, tenant)
+    pending = {first, second}
+    error: Optional[BaseException] = None
+    while pending:
+        done, pending = wait(pending, return_when=FIRST_COMPLETED)
+        winner = next((f for f in done if f.exception() is None), None)
+        if winner is not None:
+            for other in (done - {winner}) | pending:
+                other.add_done_callback(_discard)
+            return winner.result()
+        error = next(iter(done)).exception()
+    raise error
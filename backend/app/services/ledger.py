@@ -0,0 +1,127 @@
+"""
+Contabilidad de llamadas a Falabella, Mercado Libre y Haulmer por usuario (tenant).
+
+- latency.upstream_call registra cada llamada aquí: cantidad, errores, latencia y bytes.
+- Los contadores se agregan en memoria por (user_id, operación) y se vuelcan en lote a la
+  tabla upstream_usage (un registro por hora) con flush_ledger(), que corre en el scheduler.
+- GET /admin/usage ordena los tenants por costo a partir de esa tabla.
+"""
+from __future__ import annotations
+
+import logging
+import threading
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy.dialects import postgresql, sqlite
+
+from app import db
+from app.models import UpstreamUsage
+
+logger = logging.getLogger(__name__)
+
+FLUSH_INTERVAL_SECONDS = 60
+
+_Key = Tuple[int, str, str]  # (user_id, service, operation)
+
+
+class CallLedger:
+    """Buffer en memoria de contadores por tenant y operación. Thread-safe, O(1) por llamada."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counters: Dict[_Key, List[float]] = {}
+
+    def record(
+        self,
+        user_id: Optional[int],
+        op: str,
+        seconds: float,
+        bytes_in: int = 0,
+        bytes_out: int = 0,
+        error: bool = False,
+    ) -> None:
+        if user_id is None:
+            return
+        service, _, operation = op.partition(".")
+        key = (int(user_id), service, operation or service)
+        with self._lock:
+            c = self._counters.get(key)
+            if c is None:
+                c = self._counters[key] = [0, 0, 0.0, 0, 0]
+            c[0] += 1
+            c[1] += 1 if error else 0
+            c[2] += seconds
+            c[3] += bytes_in
+            c[4] += bytes_out
+
+    def drain(self) -> Dict[_Key, List[float]]:
+        """Devuelve y vacía los contadores acumulados."""
+        with self._lock:
+            counters, self._counters = self._counters, {}
+        return counters
+
+    def restore(self, counters: Dict[_Key, List[float]]) -> None:
+        """Reincorpora contadores que no se pudieron volcar (se suman a los nuevos)."""
+        with self._lock:
+            for key, values in counters.items():
+                c = self._counters.setdefault(key, [0, 0, 0.0, 0, 0])
+                for i, v in enumerate(values):
+                    c[i] += v
+
+
+ledger = CallLedger()
+
+
+def _upsert(rows: List[dict]):
+    """INSERT ... ON CONFLICT DO UPDATE sumando contadores (PostgreSQL o SQLite)."""
+    dialect = db.engine.dialect.name
+    insert = postgresql.insert if dialect == "postgresql" else sqlite.insert
+    stmt = insert(UpstreamUsage.__table__).values(rows)
+    excluded = stmt.excluded
+    table = UpstreamUsage.__table__.c
+    return stmt.on_conflict_do_update(
+        index_elements=["user_id", "service", "operation", "period_start"],
+        set_={
+            "calls": table.calls + excluded.calls,
+            "errors": table.errors + excluded.errors,
+            "latency_ms": table.latency_ms + excluded.latency_ms,
+            "bytes_in": table.bytes_in + excluded.bytes_in,
+            "bytes_out": table.bytes_out + excluded.bytes_out,
+        },
+    )
+
+
+def flush_ledger() -> int:
+    """
+    Vuelca el buffer a upstream_usage en una sola sentencia. Requiere app context.
+    Si falla, los contadores vuelven al buffer para el siguiente intento.
+    Devuelve la cantidad de filas (tenant × operación) escritas.
+    """
+    counters = ledger.drain()
+    if not counters:
+        return 0
+    period = datetime.utcnow().replace(minute=0, second=0, microsecond=0)
+    rows = [
+        {
+            "user_id": user_id,
+            "service": service,
+            "operation": operation,
+            "period_start": period,
+            "calls": int(c[0]),
+            "errors": int(c[1]),
+            "latency_ms": int(c[2] * 1000),
+            "bytes_in": int(c[3]),
+            "bytes_out": int(c[4]),
+        }
+        for (user_id, service, operation), c in counters.items()
+    ]
+    try:
+        db.session.execute(_upsert(rows))
+        db.session.commit()
+    except Exception as e:
+        db.session.rollback()
+        ledger.restore(counters)
+        logger.warning("flush_ledger: %s (se reintenta en el próximo ciclo)", e)
+        return 0
+    return len(rows)
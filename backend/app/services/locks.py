@@ -0,0 +1,64 @@
+"""
+Exclusión mutua por usuario entre procesos y workers (advisory locks de PostgreSQL).
+
+El lock es de sesión y vive en una conexión dedicada, no en la de db.session: esa vuelve al
+pool en cada commit y el lock quedaría en una conexión ajena. Si el proceso muere, PostgreSQL
+cierra la conexión y libera el lock. En otros motores (tests con SQLite) el lock es del proceso.
+"""
+import threading
+from contextlib import ExitStack, contextmanager
+from typing import Iterator, Optional, Set, Tuple
+
+from sqlalchemy import text
+
+from app import db
+
+# Primer entero del advisory lock (pg_try_advisory_lock(int, int)): separa usos del mismo user_id
+PROCESSING = 4040
+
+_held: Set[Tuple[int, int]] = set()
+_held_lock = threading.Lock()
+
+
+@contextmanager
+def user_lock(user_id: int, namespace: int = PROCESSING) -> Iterator[bool]:
+    """Intenta tomar el lock sin esperar; entrega True si se obtuvo y lo libera al salir."""
+    if db.engine.dialect.name != "postgresql":
+        key = (namespace, user_id)
+        with _held_lock:
+            acquired = key not in _held
+            _held.add(key)
+        try:
+            yield acquired
+        finally:
+            if acquired:
+                with _held_lock:
+                    _held.discard(key)
+        return
+
+    params = {"ns": namespace, "id": user_id}
+    with db.engine.connect() as conn:
+        acquired = bool(conn.execute(text("SELECT pg_try_advisory_lock(:ns, :id)"), params).scalar())
+        conn.commit()
+        try:
+            yield acquired
+        finally:
+            if acquired:
+                conn.execute(text("SELECT pg_advisory_unlock(:ns, :id)"), params)
+                conn.commit()
+
+
+@contextmanager
+def user_slot(user_id: int, slots: int, namespace: int = PROCESSING) -> Iterator[Optional[int]]:
+    """
+    Hasta `slots` ejecuciones simultáneas por usuario: toma el primer lock libre entre
+    (namespace, user_id) … (namespace + slots - 1, user_id) y entrega su índice, o None.
+    """
+    for slot in range(max(1, slots)):
+        stack = ExitStack()
+        if stack.enter_context(user_lock(user_id, namespace + slot)):
+            with stack:
+                yield slot
+            return
+        stack.close()
+    yield None
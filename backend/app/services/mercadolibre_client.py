@@ -10,17 +10,36 @@ Ref: https://developers.mercadolibre.com.ar/en_us/upload-invoices
 """
 
 import logging
+import os
 import requests
-from typing import Any, Dict, List, Optional
+from typing import Any, Dict, List, Optional, Sequence
+
+from app.json_utils import response_json
+from app.services.latency import upstream_call
+from app.services.stream_bodies import MultipartFileBody
 
 logger = logging.getLogger(__name__)
 
 API_BASE = "https://api.mercadolibre.com"
 
 
+def api_base() -> str:
+    """Base de la API; ML_API_BASE la sobrescribe (p. ej. fake_upstreams en local)."""
+    return (os.environ.get("ML_API_BASE") or API_BASE).rstrip("/")
+
+# Campos de cada orden que usan los flujos de sync y /auto/process.
+# Se piden vía `attributes` para no descargar buyer, shipping, payments ni items.
+ORDER_SUMMARY_FIELDS = ("id", "total", "total_amount", "date_created", "pack_id")
+
+# Tamaño máximo del documento fiscal que acepta POST /packs/{pack_id}/fiscal_documents
+MAX_FISCAL_DOCUMENT_BYTES = 1024 * 1024
+
+
 class MercadoLibreClient:
-    def __init__(self, access_token: str):
+    def __init__(self, access_token: str, base_url: Optional[str] = None, tenant_id: Optional[int] = None):
         self.access_token = access_token
+        self.tenant_id = tenant_id  # user_id de la app, para el ledger de llamadas
+        self.base_url = (base_url or api_base()).rstrip("/")
         self._headers = {"Authorization": f"Bearer {access_token}"}
 
     def get_orders(
@@ -29,19 +48,30 @@ class MercadoLibreClient:
         limit: int = 30,
         offset: int = 0,
         sort: str = "date_desc",
+        attributes: Optional[Sequence[str]] = None,
     ) -> Dict[str, Any]:
         """
         GET /marketplace/orders/search
         Devuelve órdenes recientes. Cada orden puede tener pack_id (o null → usar order id como pack).
+        attributes: subconjunto de campos por orden (p. ej. ORDER_SUMMARY_FIELDS). Se envían como
+        results.<campo> más paging, de modo que la respuesta trae solo eso.
         """
         try:
-            url = f"{API_BASE}/marketplace/orders/search"
+            url = f"{self.base_url}/marketplace/orders/search"
             params = {"limit": limit, "offset": offset, "sort": sort}
             if seller_id:
                 params["seller"] = seller_id
-            resp = requests.get(url, headers=self._headers, params=params, timeout=30)
+            if attributes:
+                params["attributes"] = _projection(attributes)
+            resp = upstream_call(
+                "ml.orders_search",
+                lambda t: requests.get(url, headers=self._headers, params=params, timeout=t),
+                ceiling=30,
+                hedge=True,
+                tenant=self.tenant_id,
+            )
             resp.raise_for_status()
-            return {"success": True, "data": resp.json()}
+            return {"success": True, "data": response_json(resp)}
         except requests.RequestException as e:
             logger.exception("ML get_orders error: %s", e)
             return {"success": False, "error": str(e), "response": getattr(e.response, "json", lambda: {})(())}
@@ -52,10 +82,16 @@ class MercadoLibreClient:
         Necesario para obtener pack_id (si no viene en el listado).
         """
         try:
-            url = f"{API_BASE}/orders/{order_id}"
-            resp = requests.get(url, headers=self._headers, timeout=30)
+            url = f"{self.base_url}/orders/{order_id}"
+            resp = upstream_call(
+                "ml.get_order",
+                lambda t: requests.get(url, headers=self._headers, timeout=t),
+                ceiling=30,
+                hedge=True,
+                tenant=self.tenant_id,
+            )
             resp.raise_for_status()
-            data = resp.json()
+            data = response_json(resp)
             pack_id = data.get("pack_id") or data.get("id")  # si pack_id null, usar order id
             return {"success": True, "data": data, "pack_id": pack_id}
         except requests.RequestException as e:
@@ -70,12 +106,18 @@ class MercadoLibreClient:
         - 404 o fiscal_documents vacío = no hay documento.
         """
         try:
-            url = f"{API_BASE}/packs/{pack_id}/fiscal_documents"
-            resp = requests.get(url, headers=self._headers, timeout=15)
+            url = f"{self.base_url}/packs/{pack_id}/fiscal_documents"
+            resp = upstream_call(
+                "ml.get_fiscal_documents",
+                lambda t: requests.get(url, headers=self._headers, timeout=t),
+                ceiling=15,
+                hedge=True,
+                tenant=self.tenant_id,
+            )
             if resp.status_code == 404:
                 return {"success": True, "data": {"fiscal_documents": []}}
             resp.raise_for_status()
-            data = resp.json()
+            data = response_json(resp)
             docs = data.get("fiscal_documents") if isinstance(data, dict) else []
             if not isinstance(docs, list):
                 docs = []
@@ -114,45 +156,84 @@ class MercadoLibreClient:
         pack_id = order_resp.get("pack_id") or order_id
         return self.fiscal_document_uploaded(str(pack_id))
 
-    def upload_fiscal_document(self, pack_id: str, pdf_content: bytes, filename: str = "factura.pdf") -> Dict[str, Any]:
+    def upload_fiscal_document(
+        self,
+        pack_id: str,
+        pdf_content: Optional[bytes] = None,
+        filename: str = "factura.pdf",
+        pdf_path: Optional[str] = None,
+    ) -> Dict[str, Any]:
         """
         POST /packs/{pack_id}/fiscal_documents
         multipart/form-data con el PDF. Máx 1 MB. Un documento fiscal por pack.
+        Con pdf_path el multipart se envía leyendo el archivo por partes (app.services.stream_bodies).
         """
-        if len(pdf_content) > 1024 * 1024:
+        size = os.path.getsize(pdf_path) if pdf_path else len(pdf_content or b"")
+        if size > MAX_FISCAL_DOCUMENT_BYTES:
             return {"success": False, "error": "El archivo supera 1 MB"}
         try:
-            url = f"{API_BASE}/packs/{pack_id}/fiscal_documents"
-            files = {"fiscal_document": (filename, pdf_content, "application/pdf")}
-            resp = requests.post(url, headers=self._headers, files=files, timeout=60)
+            url = f"{self.base_url}/packs/{pack_id}/fiscal_documents"
+            if pdf_path:
+                body = MultipartFileBody("fiscal_document", filename, "application/pdf", pdf_path)
+                kwargs = {"headers": {**self._headers, "Content-Type": body.content_type}, "data": body}
+            else:
+                files = {"fiscal_document": (filename, pdf_content, "application/pdf")}
+                kwargs = {"headers": self._headers, "files": files}
+            resp = upstream_call(
+                "ml.upload_fiscal_document",
+                lambda t: requests.post(url, timeout=t, **kwargs),
+                ceiling=60,
+                tenant=self.tenant_id,
+            )
             if not resp.ok:
                 try:
                     err = resp.json()
                 except Exception:
                     err = {"message": resp.text}
                 return {"success": False, "error": err.get("message", resp.text), "response": err}
-            return {"success": True, "data": resp.json()}
+            return {"success": True, "data": response_json(resp)}
         except requests.RequestException as e:
             logger.exception("ML upload_fiscal_document error: %s", e)
             return {"success": False, "error": str(e)}
 
 
-def refresh_ml_token(client_id: str, client_secret: str, refresh_token: str) -> Dict[str, Any]:
+def _projection(fields: Sequence[str]) -> str:
+    """Arma el valor de `attributes` para orders/search: paging + results.<campo>."""
+    return ",".join(["paging"] + [f"results.{f}" for f in fields])
+
+
+def order_total(order: Dict[str, Any]) -> float:
+    """Monto de una orden del listado (total o total_amount, según la versión de la API)."""
+    return float(order.get("total") or order.get("total_amount") or 0)
+
+
+def refresh_ml_token(
+    client_id: str,
+    client_secret: str,
+    refresh_token: str,
+    tenant_id: Optional[int] = None,
+) -> Dict[str, Any]:
     """
     POST /oauth/token con grant_type=refresh_token.
     Devuelve nuevo access_token y refresh_token (el anterior queda invalidado).
     """
     try:
-        url = f"{API_BASE}/oauth/token"
+        url = f"{api_base()}/oauth/token"
         data = {
             "grant_type": "refresh_token",
             "client_id": client_id,
             "client_secret": client_secret,
             "refresh_token": refresh_token,
         }
-        resp = requests.post(url, data=data, headers={"Accept": "application/json", "Content-Type": "application/x-www-form-urlencoded"}, timeout=30)
+        headers = {"Accept": "application/json", "Content-Type": "application/x-www-form-urlencoded"}
+        resp = upstream_call(
+            "ml.oauth_token",
+            lambda t: requests.post(url, data=data, headers=headers, timeout=t),
+            ceiling=30,
+            tenant=tenant_id,
+        )
         resp.raise_for_status()
-        return {"success": True, "data": resp.json()}
+        return {"success": True, "data": response_json(resp)}
     except requests.RequestException as e:
         logger.exception("ML refresh_token error: %s", e)
         try:
@@ -0,0 +1,99 @@
+"""
+Despertar de workers con LISTEN/NOTIFY de PostgreSQL (canal WORK_CHANNEL).
+
+- notify_work: lo llaman los escritores que dejan trabajo listo (jobs en cola, tareas del outbox
+  de subidas, reintentos vencidos) dentro de su transacción. pg_notify es transaccional: se
+  entrega al confirmar y, si la transacción se revierte, no despierta a nadie. PostgreSQL junta
+  los avisos repetidos de una misma transacción en uno solo.
+- WorkListener: conexión dedicada (separada del pool de db.session) con LISTEN; wait(timeout)
+  bloquea en select() hasta un aviso o el timeout. Si la conexión se cae se reabre en la
+  siguiente espera; mientras tanto el worker queda en el sondeo lento.
+En otros motores (tests con SQLite) notify_work no hace nada y wait solo duerme.
+"""
+from __future__ import annotations
+
+import logging
+import select
+import time
+from typing import List
+
+from sqlalchemy import text
+
+from app import db
+
+logger = logging.getLogger(__name__)
+
+WORK_CHANNEL = "invoice_work"
+
+# Tipos de aviso (payload): solo informativos, el worker drena jobs y subidas igual
+JOBS = "jobs"
+UPLOADS = "uploads"
+RETRIES = "retries"
+
+
+def _is_postgres() -> bool:
+    return db.engine.dialect.name == "postgresql"
+
+
+def notify_work(kind: str) -> None:
+    """Avisa a los workers que hay trabajo `kind`; se entrega al confirmar la transacción actual."""
+    if _is_postgres():
+        db.session.execute(text("SELECT pg_notify(:channel, :kind)"), {"channel": WORK_CHANNEL, "kind": kind})
+
+
+class WorkListener:
+    def __init__(self, channel: str = WORK_CHANNEL):
+        self.channel = channel
+        self._conn = None
+
+    @property
+    def active(self) -> bool:
+        """True si hay (o se puede abrir) una conexión escuchando el canal."""
+        return self._connect() is not None
+
+    def _connect(self):
+        if self._conn is not None or not _is_postgres():
+            return self._conn
+        try:
+            conn = db.engine.raw_connection()
+            conn.detach()  # no vuelve al pool: queda dedicada a LISTEN hasta close()
+            driver = conn.driver_connection
+            driver.rollback()  # el pre-ping del pool pudo dejar una transacción abierta
+            driver.autocommit = True
+            with driver.cursor() as cur:
+                cur.execute(f'LISTEN "{self.channel}"')
+            self._conn = conn
+        except Exception as e:
+            logger.warning("notify: no se pudo escuchar %s: %s", self.channel, e)
+        return self._conn
+
+    def wait(self, timeout: float) -> List[str]:
+        """Espera hasta `timeout` segundos; devuelve los avisos recibidos (vacío si venció)."""
+        conn = self._connect()
+        if conn is None:
+            time.sleep(timeout)
+            return []
+        driver = conn.driver_connection
+        try:
+            if not driver.notifies:
+                ready, _, _ = select.select([driver], [], [], max(0.0, timeout))
+                if ready:
+                    driver.poll()
+            else:
+                driver.poll()
+            kinds = [n.payload for n in driver.notifies]
+            del driver.notifies[:]
+            return kinds
+        except Exception as e:
+            logger.warning("notify: conexión de %s perdida: %s", self.channel, e)
+            self.close()
+            time.sleep(min(timeout, 5))
+            return []
+
+    def close(self) -> None:
+        conn, self._conn = self._conn, None
+        if conn is not None:
+            try:
+                conn.close()
+            except Exception:
+                pass
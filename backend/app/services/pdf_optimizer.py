@@ -0,0 +1,187 @@
+"""
+Reducción de tamaño de los PDFs antes de subirlos (etapa "optimize" de app.tasks.uploads).
+
+Mercado Libre rechaza documentos fiscales de más de 1 MB; el resto de las plataformas también
+recibe menos bytes. Pasos, de menor a mayor pérdida, hasta que el archivo cabe en max_bytes:
+  1. Sin pérdida, solo stdlib: se descarta lo que venga después del último %%EOF.
+  2. Sin pérdida, con pypdf: recomprime los content streams, deduplica objetos y quita la
+     metadata (/Info y XMP).
+  3. Con pérdida, con pypdf + Pillow y solo si aún no cabe: reduce y recomprime las imágenes
+     en JPEG (LOSSY_STEPS: lado máximo y calidad).
+pypdf y Pillow son opcionales: sin ellos solo corre el paso 1.
+
+El trabajo corre en un pool de procesos (PDF_OPTIMIZE_PROCESSES), fuera de los threads del
+pipeline, y el resultado queda en el almacén por contenido (app.services.blob_store) con un
+índice en disco por hash de origen y límite: el mismo PDF no se optimiza dos veces, aunque lo
+pidan el web y el worker.
+"""
+from __future__ import annotations
+
+import io
+import logging
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from typing import Optional, Tuple
+
+from app.services.blob_store import BlobStore, blob_store
+
+try:  # dependencias opcionales
+    import pypdf
+except ImportError:  # pragma: no cover - depende del entorno
+    pypdf = None
+try:
+    from PIL import Image
+except ImportError:  # pragma: no cover - depende del entorno
+    Image = None
+
+logger = logging.getLogger(__name__)
+
+PROCESSES = int(os.environ.get("PDF_OPTIMIZE_PROCESSES", "2"))
+# PDFs menores que esto que ya caben en el límite se suben tal cual (no compensa el proceso)
+MIN_BYTES = int(os.environ.get("PDF_OPTIMIZE_MIN_BYTES", str(256 * 1024)))
+# (lado máximo en px, calidad JPEG) de cada intento con pérdida
+LOSSY_STEPS = ((2000, 80), (1400, 65), (1000, 50), (700, 35))
+
+_EOF = b"%%EOF"
+
+_pool: Optional[ProcessPoolExecutor] = None
+_pool_lock = threading.Lock()
+
+
+# ── Pasos (corren en el proceso del pool: solo bytes, sin app ni BD) ─────────
+
+def strip_trailing(data: bytes) -> bytes:
+    """Quita lo que sigue al último %%EOF (relleno o basura que ningún lector usa)."""
+    end = data.rfind(_EOF)
+    if end < 0:
+        return data
+    end += len(_EOF)
+    if data[end:end + 2] == b"\r\n":
+        end += 2
+    elif data[end:end + 1] in (b"\n", b"\r"):
+        end += 1
+    return data[:end]
+
+
+def _write(writer) -> bytes:
+    out = io.BytesIO()
+    writer.write(out)
+    return out.getvalue()
+
+
+def _lossless(data: bytes) -> bytes:
+    writer = pypdf.PdfWriter(clone_from=pypdf.PdfReader(io.BytesIO(data)))
+    for page in writer.pages:
+        page.compress_content_streams(level=9)
+    writer.compress_identical_objects()
+    writer.metadata = None
+    writer.root_object.pop("/Metadata", None)
+    return _write(writer)
+
+
+def _lossy(data: bytes, max_side: int, quality: int) -> bytes:
+    writer = pypdf.PdfWriter(clone_from=pypdf.PdfReader(io.BytesIO(data)))
+    for page in writer.pages:
+        for img in page.images:
+            pil = img.image
+            if pil.mode not in ("RGB", "L"):
+                pil = pil.convert("RGB")
+            if max(pil.size) > max_side:
+                pil.thumbnail((max_side, max_side))
+            img.replace(pil, quality=quality)
+    writer.compress_identical_objects()
+    return _write(writer)
+
+
+def reduce_pdf(data: bytes, max_bytes: Optional[int]) -> bytes:
+    """Aplica los pasos hasta que el PDF cabe en max_bytes (None: solo los sin pérdida)."""
+    best = strip_trailing(data)
+    if pypdf is None:
+        return best
+    try:
+        candidate = _lossless(best)
+        if len(candidate) < len(best):
+            best = candidate
+    except Exception as e:  # PDF que pypdf no sabe reescribir: se sigue con lo que hay
+        logger.warning("pdf_optimizer sin pérdida: %s", e)
+        return best
+    if Image is None or not max_bytes or len(best) <= max_bytes:
+        return best
+    for max_side, quality in LOSSY_STEPS:
+        try:
+            candidate = _lossy(best, max_side, quality)
+        except Exception as e:
+            logger.warning("pdf_optimizer con pérdida (%d px, q%d): %s", max_side, quality, e)
+            break
+        if len(candidate) < len(best):
+            best = candidate
+        if len(best) <= max_bytes:
+            break
+    return best
+
+
+def _optimize_in_process(root: str, digest: str, max_bytes: Optional[int]) -> Tuple[str, int]:
+    store = BlobStore(root)
+    data = store.read(digest)
+    reduced = reduce_pdf(data, max_bytes)
+    if len(reduced) >= len(data):
+        return digest, len(data)
+    return store.put(reduced)
+
+
+# ── API (threads del pipeline) ─────────────────────────────────────────────
+
+def _index_path(store: BlobStore, digest: str, max_bytes: Optional[int]) -> str:
+    store.path(digest)  # valida el digest antes de usarlo en una ruta
+    return os.path.join(store.root, "optimized", f"{digest}.{max_bytes or 0}")
+
+
+def _cached(store: BlobStore, digest: str, max_bytes: Optional[int]) -> Optional[str]:
+    try:
+        with open(_index_path(store, digest, max_bytes)) as f:
+            result = f.read().strip()
+    except OSError:
+        return None
+    return result if store.exists(result) else None
+
+
+def _remember(store: BlobStore, digest: str, max_bytes: Optional[int], result: str) -> None:
+    path = _index_path(store, digest, max_bytes)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp = f"{path}.{os.getpid()}.{threading.get_ident()}"
+    with open(tmp, "w") as f:
+        f.write(result)
+    os.replace(tmp, path)
+
+
+def _executor() -> ProcessPoolExecutor:
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            # spawn: el worker tiene threads (pipeline, scheduler) y fork no es seguro con ellos
+            _pool = ProcessPoolExecutor(
+                max_workers=max(1, PROCESSES), mp_context=multiprocessing.get_context("spawn"),
+            )
+        return _pool
+
+
+def optimize_pdf(digest: str, max_bytes: Optional[int] = None) -> Tuple[str, int]:
+    """
+    (sha256, tamaño) de la versión reducida del PDF `digest` del almacén; el mismo digest si
+    no hubo nada que ganar. Bloquea hasta que el pool de procesos termina.
+    """
+    store = blob_store()
+    size = os.path.getsize(store.path(digest))
+    if size < MIN_BYTES and (not max_bytes or size <= max_bytes):
+        return digest, size
+    cached = _cached(store, digest, max_bytes)
+    if cached:
+        return cached, os.path.getsize(store.path(cached))
+
+    result, result_size = _executor().submit(_optimize_in_process, store.root, digest, max_bytes).result()
+    _remember(store, digest, max_bytes, result)
+    if result != digest:
+        logger.info("pdf_optimizer %s: %d → %d bytes", digest[:12], size, result_size)
+    return result, result_size
@@ -0,0 +1,103 @@
+"""
+Pipeline por etapas con concurrencia acotada por etapa.
+
+Cada etapa (p. ej. "emit" → Haulmer, "upload" → Falabella/ML) tiene su propio pool de threads,
+de modo que mientras una orden se emite otra ya está subiendo su PDF: el throughput queda
+limitado por la etapa más lenta y no por la suma de las latencias.
+
+- Las funciones de etapa corren en threads del pool y solo deben hacer I/O de red
+  (nada de db.session: la sesión es del thread que llama a run()).
+- route(stage, item, result, error) corre en el thread que llama a run(); ahí va toda la
+  escritura en BD. Devuelve el nombre de la siguiente etapa o None si el ítem terminó.
+  Se llama con stage=None al admitir cada ítem para elegir su primera etapa.
+- Colas acotadas: como máximo `workers` ítems en vuelo por etapa y, en total, la suma de las
+  capacidades; no se admiten ítems nuevos de la fuente hasta que haya espacio.
+"""
+from __future__ import annotations
+
+import logging
+import queue
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import Any, Callable, Deque, Dict, Iterable, List, Optional
+
+logger = logging.getLogger(__name__)
+
+Route = Callable[[Optional[str], Any, Any, Optional[BaseException]], Optional[str]]
+
+
+@dataclass
+class Stage:
+    name: str
+    fn: Callable[[Any], Any]
+    workers: int = 4
+
+
+class StagedPipeline:
+    def __init__(self, stages: List[Stage], thread_name_prefix: str = "pipeline"):
+        if not stages:
+            raise ValueError("El pipeline necesita al menos una etapa")
+        self.stages: Dict[str, Stage] = {s.name: s for s in stages}
+        self._prefix = thread_name_prefix
+
+    def run(self, items: Iterable[Any], route: Route) -> int:
+        """Procesa todos los ítems. Devuelve cuántos terminaron. Bloquea hasta el final."""
+        done_q: "queue.Queue[tuple]" = queue.Queue()
+        waiting: Dict[str, Deque[Any]] = {name: deque() for name in self.stages}
+        inflight: Dict[str, int] = {name: 0 for name in self.stages}
+        max_outstanding = sum(max(1, s.workers) for s in self.stages.values())
+        pools = {
+            name: ThreadPoolExecutor(max_workers=max(1, s.workers), thread_name_prefix=f"{self._prefix}-{name}")
+            for name, s in self.stages.items()
+        }
+        source = iter(items)
+        exhausted = False
+        finished = 0
+
+        def _call(name: str, item: Any) -> None:
+            try:
+                done_q.put((name, item, self.stages[name].fn(item), None))
+            except BaseException as e:  # se entrega a route() en el thread coordinador
+                done_q.put((name, item, None, e))
+
+        def _advance(item: Any, name: Optional[str]) -> None:
+            nonlocal finished
+            if name is None:
+                finished += 1
+            elif name not in self.stages:
+                raise ValueError(f"Etapa desconocida: {name}")
+            else:
+                waiting[name].append(item)
+
+        try:
+            while True:
+                # Despachar lo que espera en cada etapa hasta su límite de concurrencia
+                for name, stage in self.stages.items():
+                    while waiting[name] and inflight[name] < max(1, stage.workers):
+                        inflight[name] += 1
+                        pools[name].submit(_call, name, waiting[name].popleft())
+
+                outstanding = sum(inflight.values()) + sum(len(w) for w in waiting.values())
+                # Admitir ítems nuevos solo si hay espacio (backpressure hacia la fuente)
+                if not exhausted and outstanding < max_outstanding:
+                    try:
+                        item = next(source)
+                    except StopIteration:
+                        exhausted = True
+                    else:
+                        _advance(item, route(None, item, None, None))
+                        continue
+
+                if outstanding == 0:
+                    if exhausted:
+                        break
+                    continue
+
+                name, item, result, error = done_q.get()
+                inflight[name] -= 1
+                _advance(item, route(name, item, result, error))
+        finally:
+            for pool in pools.values():
+                pool.shutdown(wait=True, cancel_futures=True)
+        return finished
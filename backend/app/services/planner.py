@@ -0,0 +1,222 @@
+"""
+Plan (dry-run) de POST /auto/process: qué haría una ejecución y cuánto tardaría, sin llamar
+a Haulmer ni a las plataformas.
+
+- Candidatas: la selección explícita (sale_ids, id_ventas u órdenes del body) o, si no viene,
+  las ventas ya sincronizadas en la BD (sync_sales) dentro de la ventana `since`, que es lo que
+  la ejecución traería de Falabella/ML.
+- Cada orden recibe una acción (emit | skip | reject) con su motivo, usando las mismas reglas de
+  idempotencia que el job. Todo sale de una pasada en lote (IN por chunks), sin consultas por orden.
+- Estimación: latencias p50 del tracker de este proceso; si no hay muestras, el promedio del
+  ledger (upstream_usage) del usuario; si tampoco, valores por defecto. Cada pipeline (job de
+  emisión y outbox de subidas) queda acotado por su etapa más lenta:
+  max(trabajo de la etapa / concurrencia) + una orden completa.
+"""
+from __future__ import annotations
+
+import math
+from collections import Counter
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy import func
+
+from app import db
+from app.models import Sale, UpstreamUsage, User
+from app.services import haulmer_client
+from app.services.latency import tracker
+from app.utils import load_sales_map, parse_date
+
+MAX_PLAN_ACTIONS = 5000
+LEDGER_DAYS = 7
+
+# Operaciones de cada etapa del pipeline por plataforma ("*" = cualquier plataforma)
+STAGE_OPS: Dict[str, Dict[str, List[str]]] = {
+    "check":  {"Falabella": ["falabella.GetInvoice"], "Mercado Libre": ["ml.get_fiscal_documents"]},
+    "emit":   {"*": ["haulmer.emit_document"]},
+    "pdf":    {"*": ["haulmer.pdf"]},
+    "upload": {
+        "Falabella": ["falabella.SetInvoicePDF"],
+        "Mercado Libre": ["ml.upload_fiscal_document"],
+    },
+}
+DEFAULT_SECONDS = {
+    "falabella.GetInvoice": 1.0,
+    "ml.get_fiscal_documents": 0.5,
+    "haulmer.emit_document": 2.0,
+    "haulmer.pdf": 0.5,
+    "falabella.SetInvoicePDF": 2.0,
+    "ml.upload_fiscal_document": 1.5,
+}
+
+
+def _candidates(user: User, payload: dict) -> Tuple[str, List[dict]]:
+    """("request" | "selection" | "local", órdenes normalizadas como las recibe el job)."""
+    from app.tasks.process_orders import default_since, selected_orders
+
+    selected = selected_orders(user.id, payload)
+    if selected is not None:
+        source = "selection" if payload.get("sale_ids") or payload.get("id_ventas") else "request"
+        return source, selected
+
+    since = parse_date(payload.get("since") or default_since())
+    rows = (
+        db.session.query(Sale.id_venta, Sale.monto, Sale.platform, Sale.tipo_doc)
+        .filter(
+            Sale.user_id == user.id,
+            Sale.platform.in_(("Falabella", "Mercado Libre")),
+            func.coalesce(Sale.document_date, func.date(Sale.created_at)) >= since,
+        )
+        .all()
+    )
+    return "local", [
+        {"id_venta": r.id_venta, "monto": float(r.monto or 0), "platform": r.platform, "tipo_doc": r.tipo_doc}
+        for r in rows
+    ]
+
+
+def _classify(order: dict, sale: Optional[Sale], duplicate: bool, is_retry: bool) -> Tuple[str, str]:
+    """(acción, motivo) con las reglas de _OrderProcessor._admit."""
+    if not order.get("id_venta") or float(order.get("monto") or 0) <= 0:
+        return "reject", "invalida"
+    if duplicate:
+        return "skip", "duplicada"
+    if sale is None:
+        return "emit", "nueva"
+    if sale.document_uploaded_at:
+        return "skip", "ya_cargada"
+    if sale.status == "Éxito":
+        return ("emit", "reintento_forzado") if is_retry else ("skip", "ya_emitida")
+    if sale.status == "Error":
+        return "emit", "reintento_error"
+    if sale.status == "Emitiendo":
+        return "emit", "emision_interrumpida"
+    return "emit", "pendiente"
+
+
+def _latencies(user_id: int) -> Tuple[Dict[str, float], Dict[str, str]]:
+    """{op: segundos p50} y {op: origen} para las operaciones del pipeline."""
+    ops = {op for per_platform in STAGE_OPS.values() for names in per_platform.values() for op in names}
+    seconds: Dict[str, float] = {}
+    basis: Dict[str, str] = {}
+    for op in ops:
+        p50 = tracker.percentile(op, 0.50)
+        if p50 is not None:
+            seconds[op], basis[op] = p50, "tracker"
+
+    missing = ops - set(seconds)
+    if missing:
+        since = datetime.utcnow() - timedelta(days=LEDGER_DAYS)
+        rows = (
+            db.session.query(
+                UpstreamUsage.service, UpstreamUsage.operation,
+                func.sum(UpstreamUsage.latency_ms), func.sum(UpstreamUsage.calls),
+            )
+            .filter(UpstreamUsage.user_id == user_id, UpstreamUsage.period_start >= since)
+            .group_by(UpstreamUsage.service, UpstreamUsage.operation)
+            .all()
+        )
+        for service, operation, latency_ms, calls in rows:
+            op = f"{service}.{operation}"
+            if op in missing and calls:
+                seconds[op], basis[op] = latency_ms / 1000 / calls, "ledger"
+    for op in ops - set(seconds):
+        seconds[op], basis[op] = DEFAULT_SECONDS[op], "default"
+    return seconds, basis
+
+
+def _stage_cost(stage: str, platform: str, latency: Dict[str, float]) -> float:
+    ops = STAGE_OPS[stage].get(platform) or STAGE_OPS[stage].get("*") or []
+    return sum(latency[op] for op in ops)
+
+
+def _pipeline_seconds(work: Dict[str, float], workers: Dict[str, int], longest: float) -> float:
+    if not longest:
+        return 0.0
+    return max(work[stage] / max(1, workers[stage]) for stage in work) + longest
+
+
+def _estimate(actions: List[dict], user_id: int) -> dict:
+    from app.tasks import process_orders, uploads
+
+    latency, basis = _latencies(user_id)
+    workers = {
+        "check":  process_orders.CHECK_WORKERS,
+        "emit":   min(process_orders.EMIT_WORKERS, haulmer_client.MAX_CONCURRENCY),
+        "pdf":    uploads.PDF_WORKERS,
+        "upload": uploads.UPLOAD_WORKERS,
+    }
+    work = dict.fromkeys(workers, 0.0)
+    longest = {"job": 0.0, "uploads": 0.0}
+    for a in actions:
+        if a["action"] != "emit":
+            continue
+        paths = {"job": ["check", "emit"] if a["platform_check"] else ["emit"]}
+        if a["upload"]:
+            paths["uploads"] = ["pdf", "upload"]
+        for name, stages in paths.items():
+            path = 0.0
+            for stage in stages:
+                cost = _stage_cost(stage, a["platform"], latency)
+                work[stage] += cost
+                path += cost
+            longest[name] = max(longest[name], path)
+
+    job_stages = ("check", "emit")
+    upload_stages = ("pdf", "upload")
+    return {
+        # Duración del job (emisión); las subidas corren después en el outbox
+        "seconds":         math.ceil(_pipeline_seconds(
+            {s: work[s] for s in job_stages}, workers, longest["job"])),
+        "uploads_seconds": math.ceil(_pipeline_seconds(
+            {s: work[s] for s in upload_stages}, workers, longest["uploads"])),
+        "per_stage":       {stage: round(work[stage] / max(1, workers[stage]), 2) for stage in workers},
+        "workers":         workers,
+        "latency":         {op: {"seconds": round(latency[op], 3), "basis": basis[op]} for op in sorted(latency)},
+    }
+
+
+def plan_process(user: User, payload: dict) -> dict:
+    """Plan de POST /auto/process para el usuario (sin llamadas externas)."""
+    is_retry = bool(payload.get("retry"))
+    has_falabella = bool(user.falabella_api_key_enc and user.falabella_user_id)
+    has_ml = bool(user.ml_access_token_enc)
+
+    source, orders = _candidates(user, payload)
+    sales = load_sales_map(user.id, (o.get("id_venta") for o in orders))
+
+    actions: List[dict] = []
+    seen = set()
+    for o in orders:
+        id_venta = o.get("id_venta") or ""
+        platform = o.get("platform") or "Manual"
+        action, reason = _classify(o, sales.get(id_venta), id_venta in seen, is_retry)
+        seen.add(id_venta)
+        uploads = (platform == "Falabella" and has_falabella) or (platform == "Mercado Libre" and has_ml)
+        actions.append({
+            "id_venta":       id_venta,
+            "platform":       platform,
+            "action":         action,
+            "reason":         reason,
+            # La ejecución consulta la plataforma antes de emitir y puede terminar omitiéndola
+            "platform_check": action == "emit" and uploads and (
+                platform == "Falabella" or source != "request" or bool(o.get("pack_id"))
+            ),
+            "upload":         action == "emit" and uploads,
+        })
+
+    counts = Counter(a["action"] for a in actions)
+    return {
+        "plan":      True,
+        "source":    source,
+        "summary":   {
+            "total":  len(actions),
+            "emit":   counts.get("emit", 0),
+            "skip":   counts.get("skip", 0),
+            "reject": counts.get("reject", 0),
+        },
+        "reasons":   dict(Counter(a["reason"] for a in actions)),
+        "estimate":  _estimate(actions, user.id),
+        "actions":   actions[:MAX_PLAN_ACTIONS],
+        "truncated": len(actions) > MAX_PLAN_ACTIONS,
+    }
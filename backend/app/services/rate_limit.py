@@ -0,0 +1,56 @@
+"""
+Token bucket por upstream y seller para acotar el ritmo de las llamadas masivas
+(p. ej. la reconciliación), compartido por todos los threads del proceso.
+"""
+from __future__ import annotations
+
+import threading
+import time
+from typing import Dict, Tuple
+
+
+class TokenBucket:
+    """`rate` tokens por segundo, hasta `burst` acumulados. Thread-safe."""
+
+    def __init__(self, rate: float, burst: float = 1.0):
+        self.rate = max(0.001, float(rate))
+        self.burst = max(1.0, float(burst))
+        self._tokens = self.burst
+        self._last = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self, now: float) -> None:
+        self._tokens = min(self.burst, self._tokens + (now - self._last) * self.rate)
+        self._last = now
+
+    def try_acquire(self, tokens: float = 1.0) -> bool:
+        with self._lock:
+            self._refill(time.monotonic())
+            if self._tokens >= tokens:
+                self._tokens -= tokens
+                return True
+            return False
+
+    def acquire(self, tokens: float = 1.0) -> None:
+        """Bloquea hasta que haya `tokens` disponibles."""
+        while True:
+            with self._lock:
+                self._refill(time.monotonic())
+                if self._tokens >= tokens:
+                    self._tokens -= tokens
+                    return
+                wait = (tokens - self._tokens) / self.rate
+            time.sleep(wait)
+
+
+_buckets: Dict[Tuple[str, str], TokenBucket] = {}
+_buckets_lock = threading.Lock()
+
+
+def bucket_for(name: str, key: str, rate: float, burst: float = 1.0) -> TokenBucket:
+    """Bucket compartido por (name, key), p. ej. ("falabella", seller_id)."""
+    with _buckets_lock:
+        bucket = _buckets.get((name, key))
+        if bucket is None:
+            bucket = _buckets[name, key] = TokenBucket(rate, burst)
+        return bucket
@@ -0,0 +1,93 @@
+"""
+Ítems de marketplace por venta (tabla sale_items).
+
+Falabella necesita los OrderItemId para subir la boleta (SetInvoicePDF) y pedir etiquetas;
+se obtienen una sola vez, al sincronizar, con GetMultipleOrderItems (hasta
+MAX_ORDERS_PER_ITEMS_CALL órdenes por llamada) y después se leen de la BD.
+"""
+import logging
+from typing import Dict, Iterable, List, Set
+
+from app import db
+from app.models import SaleItem
+from app.services.falabella_client import (
+    MAX_ORDERS_PER_ITEMS_CALL, FalabellaClient, parse_multiple_order_items_response,
+)
+from app.utils import SALES_IN_CHUNK
+
+logger = logging.getLogger(__name__)
+
+
+def sales_with_items(sale_ids: Iterable[int]) -> Set[int]:
+    """Ids de las ventas que ya tienen ítems guardados (consultas IN por lote)."""
+    ids = list(dict.fromkeys(sale_ids))
+    found: Set[int] = set()
+    for start in range(0, len(ids), SALES_IN_CHUNK):
+        rows = (
+            db.session.query(SaleItem.sale_id)
+            .filter(SaleItem.sale_id.in_(ids[start:start + SALES_IN_CHUNK]))
+            .distinct()
+        )
+        found.update(sale_id for (sale_id,) in rows)
+    return found
+
+
+def item_ids_for(sale_ids: Iterable[int]) -> Dict[int, List[int]]:
+    """{sale_id: [OrderItemId, ...]} de las ventas dadas; las que no tienen ítems no aparecen."""
+    ids = list(dict.fromkeys(sale_ids))
+    out: Dict[int, List[int]] = {}
+    for start in range(0, len(ids), SALES_IN_CHUNK):
+        rows = (
+            db.session.query(SaleItem.sale_id, SaleItem.item_id)
+            .filter(SaleItem.sale_id.in_(ids[start:start + SALES_IN_CHUNK]))
+            .order_by(SaleItem.id)
+        )
+        for sale_id, item_id in rows:
+            out.setdefault(sale_id, []).append(int(item_id))
+    return out
+
+
+def fetch_falabella_items(client: FalabellaClient, order_ids: List[str]) -> Dict[str, List[dict]]:
+    """
+    {OrderId: [OrderItem, ...]} con una llamada GetMultipleOrderItems por cada
+    MAX_ORDERS_PER_ITEMS_CALL órdenes. Solo red: no toca db.session.
+    """
+    items: Dict[str, List[dict]] = {}
+    for start in range(0, len(order_ids), MAX_ORDERS_PER_ITEMS_CALL):
+        chunk  = order_ids[start:start + MAX_ORDERS_PER_ITEMS_CALL]
+        result = client.get_multiple_order_items(chunk)
+        if not result.get("success"):
+            logger.warning("Falabella GetMultipleOrderItems (%d órdenes): %s", len(chunk), result.get("error"))
+            continue
+        items.update(parse_multiple_order_items_response(result))
+    return items
+
+
+def store_falabella_items(sale_ids: Dict[str, int], items: Dict[str, List[dict]]) -> int:
+    """Agrega a la sesión los ítems de cada orden ({id_venta: sale_id}). Devuelve cuántos."""
+    rows = []
+    for id_venta, sale_id in sale_ids.items():
+        seen = set()
+        for it in items.get(id_venta) or []:
+            item_id = it.get("OrderItemId")
+            if item_id is None or str(item_id) in seen:
+                continue
+            seen.add(str(item_id))
+            rows.append(SaleItem(
+                sale_id=sale_id, platform="Falabella", item_id=str(item_id), sku=it.get("Sku"),
+            ))
+    db.session.add_all(rows)
+    return len(rows)
+
+
+def fill_falabella_items(client: FalabellaClient, sale_ids: Dict[str, int]) -> int:
+    """
+    Completa los ítems de las ventas Falabella ({id_venta: sale_id}) que aún no los tienen.
+    Confirma la transacción de lectura antes de ir a la red; el llamador confirma lo agregado.
+    """
+    known   = sales_with_items(sale_ids.values())
+    missing = {id_venta: sale_id for id_venta, sale_id in sale_ids.items() if sale_id not in known}
+    db.session.commit()
+    if not missing:
+        return 0
+    return store_falabella_items(missing, fetch_falabella_items(client, list(missing)))
@@ -0,0 +1,88 @@
+"""
+Bodies de subida que se leen del archivo por partes mientras requests los envía, en vez de
+armar el body completo en memoria (PDF + base64 + JSON, o PDF + multipart).
+
+Cada body conoce su largo exacto (__len__), así que requests manda Content-Length y no
+Transfer-Encoding: chunked; y se puede iterar más de una vez (cada iteración reabre el archivo).
+La memoria por subida queda en ~CHUNK_SIZE, sin importar el tamaño del PDF.
+"""
+from __future__ import annotations
+
+import base64
+import os
+import uuid
+from typing import Any, Dict, Iterator
+
+from app.json_utils import dumps_bytes
+
+# Múltiplo de 3: cada bloque leído se codifica en base64 sin relleno intermedio
+CHUNK_SIZE = 48 * 1024
+
+
+class Base64JSONBody:
+    """
+    Objeto JSON con `fields` más un campo string con el archivo en base64:
+    {...fields, "<b64_field>": "<base64 del archivo>"}.
+    """
+
+    def __init__(self, fields: Dict[str, Any], b64_field: str, path: str, chunk_size: int = CHUNK_SIZE):
+        if chunk_size % 3:
+            raise ValueError("chunk_size debe ser múltiplo de 3")
+        head = dumps_bytes(fields)
+        self.prefix = head[:-1] + (b"," if fields else b"") + dumps_bytes(b64_field) + b':"'
+        self.suffix = b'"}'
+        self.path = path
+        self.chunk_size = chunk_size
+        self.size = os.path.getsize(path)
+
+    def __len__(self) -> int:
+        return len(self.prefix) + 4 * ((self.size + 2) // 3) + len(self.suffix)
+
+    def __iter__(self) -> Iterator[bytes]:
+        yield self.prefix
+        with open(self.path, "rb") as f:
+            while True:
+                chunk = f.read(self.chunk_size)
+                if not chunk:
+                    break
+                # Un read corto antes del final dejaría relleno "=" en medio: se completa el bloque
+                while len(chunk) % 3 and len(chunk) < self.chunk_size:
+                    more = f.read(self.chunk_size - len(chunk))
+                    if not more:
+                        break
+                    chunk += more
+                yield base64.b64encode(chunk)
+        yield self.suffix
+
+
+class MultipartFileBody:
+    """multipart/form-data con un único campo de archivo."""
+
+    def __init__(self, field: str, filename: str, content_type: str, path: str, chunk_size: int = CHUNK_SIZE):
+        self.boundary = uuid.uuid4().hex
+        self.head = (
+            f"--{self.boundary}\r\n"
+            f'Content-Disposition: form-data; name="{field}"; filename="{filename}"\r\n'
+            f"Content-Type: {content_type}\r\n\r\n"
+        ).encode()
+        self.tail = f"\r\n--{self.boundary}--\r\n".encode()
+        self.path = path
+        self.chunk_size = chunk_size
+        self.size = os.path.getsize(path)
+
+    @property
+    def content_type(self) -> str:
+        return f"multipart/form-data; boundary={self.boundary}"
+
+    def __len__(self) -> int:
+        return len(self.head) + self.size + len(self.tail)
+
+    def __iter__(self) -> Iterator[bytes]:
+        yield self.head
+        with open(self.path, "rb") as f:
+            while True:
+                chunk = f.read(self.chunk_size)
+                if not chunk:
+                    break
+                yield chunk
+        yield self.tail
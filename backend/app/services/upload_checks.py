@@ -0,0 +1,78 @@
+"""
+Caché de las comprobaciones "¿ya está cargado el documento?" (Falabella GetInvoice, ML
+fiscal_documents) por plataforma, seller y orden/pack.
+
+- Positivo (ya cargado): TTL largo, UPLOAD_CHECK_POSITIVE_TTL. Además se escribe en
+  Sale.document_uploaded_at, de modo que la siguiente corrida ni siquiera lo consulta.
+- Negativo (no cargado): TTL corto, UPLOAD_CHECK_NEGATIVE_TTL: otro sistema puede cargarlo.
+  Nuestras propias subidas (app.tasks.uploads) lo reemplazan por un positivo.
+- None (no se pudo comprobar) no se guarda.
+
+Es memoria del proceso: lo comparten los jobs y el outbox del mismo worker. Thread-safe.
+"""
+from __future__ import annotations
+
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Optional, Tuple
+
+from app.models import User
+
+POSITIVE_TTL = float(os.environ.get("UPLOAD_CHECK_POSITIVE_TTL", str(24 * 3600)))
+NEGATIVE_TTL = float(os.environ.get("UPLOAD_CHECK_NEGATIVE_TTL", "600"))
+MAX_ENTRIES = int(os.environ.get("UPLOAD_CHECK_MAX_ENTRIES", "100000"))
+
+Key = Tuple[str, str, str]
+
+
+def seller_for(user: User, platform: str) -> str:
+    """Seller de la plataforma (Falabella UserID, ML user_id); si falta, el usuario de la app."""
+    seller = user.falabella_user_id if platform == "Falabella" else user.ml_user_id
+    return str(seller or f"user:{user.id}")
+
+
+class UploadCheckCache:
+    def __init__(self, positive_ttl: float = POSITIVE_TTL, negative_ttl: float = NEGATIVE_TTL,
+                 max_entries: int = MAX_ENTRIES):
+        self.positive_ttl = positive_ttl
+        self.negative_ttl = negative_ttl
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[Key, Tuple[bool, float]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, platform: str, seller: str, ref: str) -> Optional[bool]:
+        """Respuesta vigente o None si no hay (o venció)."""
+        key = (platform, seller, str(ref))
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            value, expires = entry
+            if expires <= time.monotonic():
+                del self._entries[key]
+                return None
+            return value
+
+    def put(self, platform: str, seller: str, ref: str, value: Optional[bool]) -> None:
+        if value is None:
+            return
+        ttl = self.positive_ttl if value else self.negative_ttl
+        key = (platform, seller, str(ref))
+        with self._lock:
+            self._entries[key] = (value, time.monotonic() + ttl)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, platform: str, seller: str, ref: str) -> None:
+        with self._lock:
+            self._entries.pop((platform, seller, str(ref)), None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+
+upload_checks = UploadCheckCache()
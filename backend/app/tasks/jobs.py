@@ -0,0 +1,317 @@
+"""
+Cola de jobs en PostgreSQL (tabla processing_jobs).
+
+- enqueue_job: inserta un job "queued" y vuelve de inmediato (POST /auto/process → 202).
+- claim_next_job: SELECT ... FOR UPDATE SKIP LOCKED; varios workers toman jobs distintos
+  sin bloquearse entre sí. El tenant se elige con reparto justo ponderado
+  (app.services.fair_queue): un backlog grande no retrasa a los vendedores chicos. Cada tenant
+  tiene un tope de jobs en curso según su plan (por defecto 1): se excluyen los que ya lo
+  alcanzaron y el worker además toma uno de sus advisory locks (app.services.locks.user_slot).
+- enqueue_due_retries: ventas en Error con next_attempt_at vencido (índice parcial
+  ix_sales_retry_due) → un job "retry" por usuario.
+- run_pending_jobs: drena la cola. Lo llama el worker embebido del proceso web
+  (JOBS_INLINE_WORKER) o el worker dedicado, que escala aparte del web y drena también el
+  outbox de subidas:
+      cd backend && python -m app.tasks.jobs
+- run_worker no sondea la BD en vacío: con PostgreSQL espera avisos LISTEN/NOTIFY
+  (app.services.notify) de quien deja trabajo listo, el vencimiento del próximo reintento
+  programado o, como respaldo, JOBS_FALLBACK_POLL_SECONDS.
+"""
+import logging
+import os
+import signal
+import socket
+import sys
+import threading
+import time
+from collections import defaultdict
+from datetime import datetime, timedelta
+from typing import Callable, Collection, Dict, List, Optional, Set
+
+from sqlalchemy import func, select
+
+from app import db
+from app.models import ProcessingJob, Sale, UploadTask
+from app.services.ledger import FLUSH_INTERVAL_SECONDS, flush_ledger
+from app.services.fair_queue import job_tenant_order, max_jobs_for, plans_for
+from app.services.locks import user_slot
+from app.services.notify import JOBS, WorkListener, notify_work
+from app.tasks.process_orders import run_process_job, run_retry_job
+from app.tasks.reconcile import run_reconcile_job
+from app.tasks.uploads import drain_upload_tasks
+
+logger = logging.getLogger(__name__)
+
+POLL_SECONDS = float(os.environ.get("JOBS_POLL_SECONDS", "2"))
+# Con LISTEN/NOTIFY el sondeo es solo un respaldo (aviso perdido, conexión caída)
+FALLBACK_POLL_SECONDS = float(os.environ.get("JOBS_FALLBACK_POLL_SECONDS", "60"))
+# Espera mínima entre vueltas cuando hay trabajo vencido que otro worker tiene tomado
+MIN_IDLE_SECONDS = 0.5
+STALE_AFTER = timedelta(minutes=int(os.environ.get("JOBS_STALE_MINUTES", "10")))
+MAX_ATTEMPTS = 3
+RETRY_BATCH_SIZE = int(os.environ.get("RETRY_BATCH_SIZE", "200"))
+
+RUNNERS: Dict[str, Callable[[ProcessingJob], dict]] = {
+    "process":   run_process_job,
+    "retry":     run_retry_job,
+    "reconcile": run_reconcile_job,
+}
+
+
+def worker_id() -> str:
+    return f"{socket.gethostname()}:{os.getpid()}:{threading.get_ident()}"
+
+
+def enqueue_job(
+    user_id: int, kind: str, payload: Optional[dict] = None, idempotency_key: Optional[str] = None,
+) -> ProcessingJob:
+    """Inserta el job. Con idempotency_key repetida para el usuario lanza IntegrityError."""
+    if kind not in RUNNERS:
+        raise ValueError(f"Tipo de job desconocido: {kind}")
+    job = ProcessingJob(
+        user_id=user_id, kind=kind, status="queued", payload=payload or {}, idempotency_key=idempotency_key,
+    )
+    db.session.add(job)
+    notify_work(JOBS)
+    db.session.commit()
+    return job
+
+
+def find_duplicate_job(
+    user_id: int, kind: str, payload: dict, idempotency_key: Optional[str] = None,
+) -> Optional[ProcessingJob]:
+    """
+    Job que ya atiende este envío: el de la misma Idempotency-Key (en cualquier estado) o, si
+    no lo hay, uno en cola o en curso del mismo tipo con el mismo payload (doble clic, dos
+    pestañas). Cada envío del dashboard trae su propia key: sin esta segunda búsqueda, dos
+    pestañas con la misma selección encolarían dos jobs completos.
+    """
+    if idempotency_key:
+        job = ProcessingJob.query.filter_by(user_id=user_id, idempotency_key=idempotency_key).first()
+        if job is not None:
+            return job
+    active = ProcessingJob.query.filter(
+        ProcessingJob.user_id == user_id,
+        ProcessingJob.kind == kind,
+        ProcessingJob.status.in_(("queued", "running")),
+    ).order_by(ProcessingJob.id)
+    return next((job for job in active if (job.payload or {}) == payload), None)
+
+
+def claim_next_job(worker: Optional[str] = None, exclude_users: Collection[int] = ()) -> Optional[ProcessingJob]:
+    """
+    Toma el job en cola más antiguo del tenant al que le toca según el reparto justo
+    (fair_queue.job_tenant_order) y lo marca running en la misma transacción.
+    """
+    job = None
+    for user_id in job_tenant_order(exclude_users):
+        stmt = (
+            select(ProcessingJob)
+            .where(ProcessingJob.status == "queued", ProcessingJob.user_id == user_id)
+            .order_by(ProcessingJob.created_at, ProcessingJob.id)
+            .limit(1)
+            .with_for_update(skip_locked=True)
+        )
+        job = db.session.execute(stmt).scalar_one_or_none()
+        if job is not None:
+            break
+    if job is None:
+        db.session.rollback()
+        return None
+    now = datetime.utcnow()
+    job.status = "running"
+    job.worker_id = worker or worker_id()
+    job.attempts = (job.attempts or 0) + 1
+    job.started_at = now
+    job.heartbeat_at = now
+    db.session.commit()
+    logger.info("jobs: job %s del usuario %s tomado tras %.1fs en cola",
+                job.id, job.user_id, (now - job.created_at).total_seconds())
+    return job
+
+
+def release_job(job: ProcessingJob) -> None:
+    """Devuelve a la cola un job tomado que no se pudo ejecutar (lock del usuario ocupado)."""
+    job.status = "queued"
+    job.attempts = max(0, (job.attempts or 1) - 1)
+    job.worker_id = None
+    job.started_at = job.heartbeat_at = None
+    db.session.commit()
+
+
+def requeue_stale_jobs() -> int:
+    """Jobs running sin avance en STALE_AFTER (worker caído): vuelven a la cola o quedan en error."""
+    cutoff = datetime.utcnow() - STALE_AFTER
+    stale = (
+        ProcessingJob.query
+        .filter(ProcessingJob.status == "running", ProcessingJob.heartbeat_at < cutoff)
+        .with_for_update(skip_locked=True)
+        .all()
+    )
+    for job in stale:
+        if job.attempts >= MAX_ATTEMPTS:
+            job.status = "error"
+            job.error_message = "El worker dejó de responder demasiadas veces"
+            job.finished_at = datetime.utcnow()
+        else:
+            job.status = "queued"
+    if stale:
+        notify_work(JOBS)
+    db.session.commit()
+    if stale:
+        logger.warning("jobs: %d jobs sin avance recuperados", len(stale))
+    return len(stale)
+
+
+def enqueue_due_retries(limit: int = RETRY_BATCH_SIZE) -> int:
+    """
+    Toma hasta `limit` ventas con reintento vencido y encola un job "retry" por usuario.
+    El filtro coincide con el predicado del índice parcial: no se recorre la tabla sales.
+    next_attempt_at se limpia al encolar; el resultado de la emisión programa el siguiente.
+    """
+    stmt = (
+        select(Sale.id, Sale.user_id)
+        .where(Sale.status == "Error", Sale.next_attempt_at.isnot(None), Sale.next_attempt_at <= datetime.utcnow())
+        .order_by(Sale.next_attempt_at)
+        .limit(limit)
+        .with_for_update(skip_locked=True)
+    )
+    due = db.session.execute(stmt).all()
+    if not due:
+        db.session.rollback()
+        return 0
+    by_user: Dict[int, List[int]] = defaultdict(list)
+    for sale_id, user_id in due:
+        by_user[user_id].append(sale_id)
+    Sale.query.filter(Sale.id.in_([sale_id for sale_id, _ in due])).update(
+        {"next_attempt_at": None}, synchronize_session=False,
+    )
+    for user_id, sale_ids in by_user.items():
+        db.session.add(ProcessingJob(user_id=user_id, kind="retry", status="queued", payload={"sale_ids": sale_ids}))
+    notify_work(JOBS)
+    db.session.commit()
+    logger.info("jobs: %d ventas con reintento vencido encoladas", len(due))
+    return len(due)
+
+
+def run_job(job: ProcessingJob) -> None:
+    """Ejecuta el runner del job y deja el estado final (done | error)."""
+    job_id = job.id
+    try:
+        result = RUNNERS[job.kind](job)
+    except Exception as e:
+        db.session.rollback()
+        logger.exception("job %s (%s) falló: %s", job_id, job.kind, e)
+        job = db.session.get(ProcessingJob, job_id)
+        job.status = "error"
+        job.error_message = str(e)[:2000]
+    else:
+        job.status = "done"
+        job.result = result
+    job.finished_at = datetime.utcnow()
+    db.session.commit()
+
+
+def run_pending_jobs(max_jobs: Optional[int] = None) -> int:
+    """Procesa jobs hasta vaciar la cola (o max_jobs). Requiere app context."""
+    requeue_stale_jobs()
+    enqueue_due_retries()
+    worker = worker_id()
+    busy: Set[int] = set()
+    done = 0
+    while max_jobs is None or done < max_jobs:
+        job = claim_next_job(worker, exclude_users=busy)
+        if job is None:
+            break
+        user_id = job.user_id
+        # Tope de jobs por usuario en todo el cluster: la carga upstream de una corrida
+        with user_slot(user_id, max_jobs_for(plans_for([user_id]).get(user_id))) as slot:
+            if slot is not None:
+                run_job(job)
+                done += 1
+                continue
+        release_job(job)
+        busy.add(user_id)
+    return done
+
+
+def seconds_until_due(now: Optional[datetime] = None) -> Optional[float]:
+    """
+    Segundos hasta el próximo trabajo programado (reintento de una venta o subida en backoff);
+    None si no hay. Ambas consultas van por índice (ix_sales_retry_due, ix_upload_tasks_status_next_attempt).
+    """
+    now = now or datetime.utcnow()
+    upload = db.session.query(func.min(UploadTask.next_attempt_at)).filter(UploadTask.status == "pending").scalar()
+    retry = (
+        db.session.query(func.min(Sale.next_attempt_at))
+        .filter(Sale.status == "Error", Sale.next_attempt_at.isnot(None))
+        .scalar()
+    )
+    db.session.rollback()
+    due = [t for t in (upload, retry) if t is not None]
+    return max(0.0, (min(due) - now).total_seconds()) if due else None
+
+
+def idle_timeout(listening: bool, poll_seconds: float = POLL_SECONDS) -> float:
+    """Cuánto puede dormir el worker sin trabajo: hasta el próximo vencimiento o el sondeo."""
+    timeout = FALLBACK_POLL_SECONDS if listening else poll_seconds
+    due = seconds_until_due()
+    if due is not None:
+        timeout = min(timeout, due)
+    return max(MIN_IDLE_SECONDS, timeout)
+
+
+def _flush_ledger_safely() -> None:
+    try:
+        flush_ledger()
+    except Exception as e:
+        db.session.rollback()
+        logger.warning("worker: no se pudo volcar el ledger: %s", e)
+
+
+def run_worker(poll_seconds: float = POLL_SECONDS, max_loops: Optional[int] = None) -> None:
+    """
+    Bucle del worker (dedicado o embebido en el web). Requiere app context.
+    Alterna un job y un lote de subidas por vuelta, y vuelca el ledger de llamadas externas
+    (app.services.ledger) cada FLUSH_INTERVAL_SECONDS y al salir: las llamadas de los jobs
+    ocurren en este proceso y el scheduler del web no ve su buffer.
+    """
+    listener = WorkListener()
+    logger.info("Worker de jobs iniciado (%s, %s)", worker_id(),
+                "LISTEN/NOTIFY" if listener.active else f"sondeo cada {poll_seconds:g}s")
+    next_flush = time.monotonic() + FLUSH_INTERVAL_SECONDS
+    loops = 0
+    try:
+        while max_loops is None or loops < max_loops:
+            loops += 1
+            try:
+                ran = run_pending_jobs(max_jobs=1)
+                uploaded = drain_upload_tasks(max_batches=1)
+                if time.monotonic() >= next_flush:
+                    _flush_ledger_safely()
+                    next_flush = time.monotonic() + FLUSH_INTERVAL_SECONDS
+                if not ran and not uploaded:
+                    until_flush = max(MIN_IDLE_SECONDS, next_flush - time.monotonic())
+                    listener.wait(min(idle_timeout(listener.active, poll_seconds), until_flush))
+            except Exception as e:
+                db.session.rollback()
+                logger.exception("worker: %s", e)
+                time.sleep(poll_seconds)
+    finally:
+        _flush_ledger_safely()
+        listener.close()
+
+
+if __name__ == "__main__":
+    from dotenv import load_dotenv
+
+    load_dotenv()
+    os.environ.setdefault("SCHEDULER_ENABLED", "0")
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s [%(name)s] %(message)s")
+
+    from app import create_app
+
+    # SIGTERM (docker stop) sale por SystemExit: el finally de run_worker vuelca el ledger
+    signal.signal(signal.SIGTERM, lambda *_: sys.exit(0))
+    with create_app().app_context():
+        run_worker()
@@ -0,0 +1,609 @@
+"""
+Procesamiento de ventas (lo que antes hacía POST /auto/process dentro de la petición):
+capturar órdenes de Falabella/ML, emitir vía Haulmer y encolar la subida del documento a la
+plataforma (outbox upload_tasks, drenado por app.tasks.uploads).
+
+Se ejecuta en un worker (app.tasks.jobs) y reporta el avance por orden en ProcessingJobItem.
+Cada orden avanza por un pipeline de etapas con concurrencia propia (app.services.pipeline).
+Idempotencia: por cada (user_id, id_venta) solo se crea una Sale, y cada emisión lleva un
+Idempotency-Key estable; una Sale que quedó en "Emitiendo" (worker caído) se reemite con la
+misma key sin duplicar el documento tributario.
+"""
+import logging
+import os
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from datetime import datetime, timezone, timedelta
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy.exc import IntegrityError
+
+from app import db
+from app.crypto_utils import decrypt_value
+from app.models import Document, ProcessingJob, ProcessingJobItem, Sale, UploadTask, User
+from app.services.errors import classify_exception, clear_failure, record_failure
+from app.services.falabella_client import FalabellaClient
+from app.services.heartbeat import keep_alive
+from app.services.haulmer_client import HaulmerClient, emission_key
+from app.services.mercadolibre_client import ORDER_SUMMARY_FIELDS, MercadoLibreClient, order_total
+from app.services.notify import UPLOADS, notify_work
+from app.services.pipeline import Stage, StagedPipeline
+from app.services.sale_items import fill_falabella_items
+from app.services.upload_checks import seller_for, upload_checks
+from app.utils import SALES_IN_CHUNK, load_sales_map, parse_date
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_SINCE_DAYS = 30
+
+# Concurrencia por etapa del pipeline (llamadas simultáneas a cada upstream por job)
+CHECK_WORKERS = int(os.environ.get("PIPELINE_CHECK_WORKERS", "4"))
+EMIT_WORKERS  = int(os.environ.get("PIPELINE_EMIT_WORKERS", "4"))
+
+# Estado del ítem → contador del job
+_JOB_COUNTERS = {"Éxito": "processed", "Omitida": "skipped", "Error": "failed"}
+
+
+# ── Clientes ───────────────────────────────────────────────────────────────
+
+def falabella_client(user: User) -> Optional[FalabellaClient]:
+    if not user.falabella_api_key_enc or not user.falabella_user_id:
+        return None
+    try:
+        key = decrypt_value(user.falabella_api_key_enc)
+    except ValueError:
+        return None
+    return FalabellaClient(user_id=user.falabella_user_id, api_key=key, tenant_id=user.id)
+
+
+def ml_client_for(user: User) -> Tuple[Optional[MercadoLibreClient], Optional[str]]:
+    """Devuelve (client, ml_user_id) o (None, None) si no hay token."""
+    if not user.ml_access_token_enc:
+        return None, None
+    try:
+        token = decrypt_value(user.ml_access_token_enc)
+    except ValueError:
+        return None, None
+    return MercadoLibreClient(access_token=token, tenant_id=user.id), user.ml_user_id
+
+
+# ── Recolección de órdenes ─────────────────────────────────────────────────
+
+def _fetch_falabella_orders(client: FalabellaClient, since: str) -> List[dict]:
+    """
+    Devuelve lista de órdenes normalizadas de Falabella. Si el listado se corta a mitad
+    (FalabellaStreamError) la excepción sigue hacia el job: procesar o conciliar contra un
+    listado truncado daría por inexistentes órdenes que sí están.
+    """
+    result = client.get_orders(created_after=since, updated_after=since, limit=100, stream=True)
+    if not result.get("success"):
+        logger.warning("Falabella get_orders: %s", result.get("error"))
+        return []
+
+    normalized = []
+    for o in result["orders"]:
+        if not isinstance(o, dict) or "OrderId" not in o:
+            continue
+        created = o.get("CreatedAt") or o.get("OrderDate") or o.get("CreatedDate")
+        normalized.append({
+            "id_venta":      str(o["OrderId"]),
+            "monto":         float(o.get("Price", 0) or 0),
+            "platform":      "Falabella",
+            "document_date": parse_date(created),
+        })
+    return normalized
+
+
+def _fetch_ml_orders(client: MercadoLibreClient, ml_user_id: str) -> List[dict]:
+    """Devuelve lista de órdenes normalizadas de Mercado Libre."""
+    result = client.get_orders(seller_id=ml_user_id, limit=50, attributes=ORDER_SUMMARY_FIELDS)
+    if not result.get("success"):
+        logger.warning("ML get_orders: %s", result.get("error"))
+        return []
+    results = (result.get("data") or {}).get("results") or []
+    orders  = []
+    for r in results:
+        order_id = str(r.get("id", ""))
+        if not order_id:
+            continue
+        monto   = order_total(r)
+        pack_id = r.get("pack_id")
+        created = r.get("date_created")
+        # Solo se pide el detalle si el listado no trajo el monto
+        if monto <= 0:
+            detail = client.get_order(order_id)
+            if detail.get("success"):
+                data    = detail.get("data") or {}
+                monto   = float(data.get("total", 0) or 0)
+                pack_id = pack_id or detail.get("pack_id")
+                created = created or data.get("date_created")
+        orders.append({
+            "id_venta":      order_id,
+            "monto":         max(monto, 0.01),
+            "platform":      "Mercado Libre",
+            "document_date": parse_date(created),
+            "pack_id":       str(pack_id or order_id),
+        })
+    return orders
+
+
+def _orders_from_body(raw_orders: list) -> List[dict]:
+    """Órdenes explícitas del body (manuales o reenviadas desde el dashboard)."""
+    orders = []
+    for o in raw_orders:
+        orders.append({
+            "id_venta":      str(o.get("id_venta") or o.get("id") or ""),
+            "monto":         float(o.get("monto") or o.get("total", 0)),
+            "platform":      o.get("platform") or "Manual",
+            "document_date": parse_date(o.get("document_date")),
+            "tipo_doc":      o.get("tipo_documento") or o.get("tipo_doc") or "Boleta",
+            "pack_id":       o.get("pack_id"),
+        })
+    return orders
+
+
+def default_since() -> str:
+    return (datetime.now(timezone.utc) - timedelta(days=DEFAULT_SINCE_DAYS)).strftime("%Y-%m-%dT00:00:00+00:00")
+
+
+def _order_from_sale(sale: Sale) -> dict:
+    """Orden armada con los datos guardados de la venta (sin consultar la plataforma)."""
+    return {
+        "id_venta":      sale.id_venta,
+        "monto":         float(sale.monto),
+        "platform":      sale.platform or "Manual",
+        "document_date": sale.document_date,
+        "tipo_doc":      sale.tipo_doc,
+        "pack_id":       sale.pack_id,
+    }
+
+
+def _orders_from_sales(user_id: int, column, values: list, *filters) -> List[dict]:
+    """Órdenes de las ventas del usuario con column IN values (consultas por lote)."""
+    orders: List[dict] = []
+    for start in range(0, len(values), SALES_IN_CHUNK):
+        rows = Sale.query.filter(
+            Sale.user_id == user_id, column.in_(values[start:start + SALES_IN_CHUNK]), *filters,
+        ).order_by(Sale.id)
+        orders.extend(_order_from_sale(s) for s in rows)
+    return orders
+
+
+def selected_orders(user_id: int, payload: dict) -> Optional[List[dict]]:
+    """
+    Órdenes de una selección explícita, sin recolectar nada de las plataformas:
+    payload["sale_ids"] o payload["id_ventas"] (ventas ya guardadas, con su monto, tipo_doc y
+    pack_id) o payload["orders"] (órdenes del body). None si no hay selección.
+    """
+    if payload.get("sale_ids"):
+        return _orders_from_sales(user_id, Sale.id, [int(v) for v in payload["sale_ids"]])
+    if payload.get("id_ventas"):
+        return _orders_from_sales(user_id, Sale.id_venta, [str(v) for v in payload["id_ventas"]])
+    if payload.get("orders"):
+        return _orders_from_body(payload["orders"])
+    return None
+
+
+def collect_orders(
+    payload: dict,
+    falabella: Optional[FalabellaClient],
+    ml_client: Optional[MercadoLibreClient],
+    ml_user_id: Optional[str],
+) -> List[dict]:
+    """Órdenes de Falabella y ML (si están configurados) desde payload["since"]."""
+    since   = payload.get("since") or default_since()
+    fetches = []
+    if falabella:
+        fetches.append(lambda: _fetch_falabella_orders(falabella, since))
+    if ml_client and ml_user_id:
+        fetches.append(lambda: _fetch_ml_orders(ml_client, ml_user_id))
+
+    orders: List[dict] = []
+    if len(fetches) == 1:
+        orders = fetches[0]()
+    elif fetches:
+        # Falabella y ML en paralelo: la recolección tarda lo que la plataforma más lenta
+        with ThreadPoolExecutor(max_workers=len(fetches), thread_name_prefix="collect") as pool:
+            for future in [pool.submit(fetch) for fetch in fetches]:
+                orders.extend(future.result())
+    return orders
+
+
+# ── Procesamiento por orden ────────────────────────────────────────────────
+
+@dataclass
+class _Work:
+    """Una orden dentro del pipeline. Las etapas solo leen estos campos planos, nunca el ORM."""
+    order:   dict
+    item:    ProcessingJobItem
+    sale_id: Optional[int] = None
+    emission_key: Optional[str] = None
+    status:  str = "Éxito"
+    error:   Optional[str] = None
+
+    @property
+    def id_venta(self) -> str:
+        return self.order.get("id_venta", "")
+
+    @property
+    def platform(self) -> str:
+        return self.order.get("platform") or "Manual"
+
+    @property
+    def tipo_doc(self) -> str:
+        return self.order.get("tipo_doc") or "Boleta"
+
+    @property
+    def check_ref(self) -> str:
+        """Lo que consulta la etapa check: la orden en Falabella, el pack en ML."""
+        return str(self.id_venta if self.platform == "Falabella" else self.order.get("pack_id"))
+
+
+class _OrderProcessor:
+    """
+    Emite las órdenes de un job con StagedPipeline:
+      check (¿ya cargado en la plataforma?) → emit (Haulmer).
+    La subida a la plataforma no está en este camino: cada emisión exitosa deja una tarea en
+    el outbox upload_tasks (app.tasks.uploads). route() concentra toda la escritura en BD.
+    """
+
+    def __init__(
+        self,
+        job: ProcessingJob,
+        user: User,
+        haulmer: HaulmerClient,
+        falabella: Optional[FalabellaClient],
+        ml_client: Optional[MercadoLibreClient],
+        is_retry: bool,
+        sales: Dict[str, Sale],
+    ):
+        # Decisiones de idempotencia con los valores ya cargados (sin releer cada Sale)
+        self.sale_ids  = {id_venta: sale.id for id_venta, sale in sales.items()}
+        self.done      = {
+            id_venta for id_venta, sale in sales.items()
+            if sale.document_uploaded_at or (sale.status == "Éxito" and not is_retry)
+        }
+        self.job       = job
+        self.job_id    = job.id
+        self.user      = user
+        self.user_id   = user.id
+        self.haulmer   = haulmer
+        self.falabella = falabella
+        self.ml_client = ml_client
+        self.is_retry  = is_retry
+        self.sellers   = {p: seller_for(user, p) for p in ("Falabella", "Mercado Libre")}
+        self.pipeline  = StagedPipeline([
+            Stage("check",  self._check,  CHECK_WORKERS),
+            Stage("emit",   self._emit,   EMIT_WORKERS),
+        ], thread_name_prefix=f"job{self.job_id}")
+
+    def run(self, works: List[_Work]) -> None:
+        self.pipeline.run(works, self.route)
+
+    # ── Etapas (threads del pipeline) ──────────────────────────────────────
+
+    def _check(self, w: _Work) -> Optional[bool]:
+        if w.platform == "Falabella":
+            return self.falabella.invoice_uploaded(w.id_venta)
+        return self.ml_client.fiscal_document_uploaded(w.check_ref)
+
+    def _emit(self, w: _Work) -> dict:
+        return self.haulmer.emit_document(
+            tipo_doc=w.tipo_doc,
+            id_venta=w.id_venta,
+            monto=float(w.order.get("monto", 0)),
+            idempotency_key=w.emission_key,
+        )
+
+    # ── Coordinación (thread del job) ──────────────────────────────────────
+
+    def route(self, stage: Optional[str], w: _Work, result, error: Optional[BaseException]) -> Optional[str]:
+        """
+        Una transición de estado de la orden = una transacción corta. Siempre se confirma
+        antes de devolver la orden al pipeline: mientras las etapas hacen red no queda
+        ninguna transacción abierta ni conexión del pool retenida.
+        """
+        try:
+            nxt = self._route(stage, w, result, error)
+            if nxt is None:
+                self._finish(w)
+            db.session.commit()
+        except Exception as e:
+            db.session.rollback()
+            logger.exception("process job %s orden %s: %s", self.job_id, w.id_venta, e)
+            w.status, w.error, nxt = "Error", str(e), None
+            sale = self._sale(w)
+            if sale:
+                record_failure(sale, str(e), classify_exception(e))
+            self._finish(w)
+            db.session.commit()
+        return nxt
+
+    def _route(self, stage: Optional[str], w: _Work, result, error: Optional[BaseException]) -> Optional[str]:
+        if error is not None and stage in ("check", "emit"):
+            raise error
+        if stage is None:
+            return self._admit(w)
+        if stage == "check":
+            upload_checks.put(w.platform, self.sellers[w.platform], w.check_ref, result)
+            return self._checked(w, result)
+        return self._emitted(w, result)
+
+    def _checked(self, w: _Work, uploaded: Optional[bool]) -> Optional[str]:
+        if uploaded is True:
+            sale = self._sale(w)
+            if sale and not sale.document_uploaded_at:
+                sale.document_uploaded_at = datetime.utcnow()
+                sale.upload_status        = "Cargado"
+            w.status = "Omitida"
+            return None
+        return self._prepare_emission(w)
+
+    def _admit(self, w: _Work) -> Optional[str]:
+        if not w.id_venta or float(w.order.get("monto", 0)) <= 0:
+            w.status, w.error = "Error", "id_venta o monto inválido"
+            return None
+
+        # Idempotencia: no reemitir si ya fue cargado o emitido con éxito ("Emitiendo" se retoma)
+        w.sale_id = self.sale_ids.get(w.id_venta)
+        if w.id_venta in self.done:
+            w.status = "Omitida"
+            return None
+
+        # Verificación en plataforma antes de emitir (con caché de respuestas recientes)
+        if (w.platform == "Falabella" and self.falabella) or (
+            w.platform == "Mercado Libre" and self.ml_client and w.order.get("pack_id")
+        ):
+            cached = upload_checks.get(w.platform, self.sellers[w.platform], w.check_ref)
+            return "check" if cached is None else self._checked(w, cached)
+        return self._prepare_emission(w)
+
+    def _prepare_emission(self, w: _Work) -> str:
+        """Completa la Sale (ya insertada por _preload_sales) y registra la intención de emitir."""
+        doc_date = w.order.get("document_date")
+        sale     = self._sale(w)
+        if w.platform and not sale.platform:
+            sale.platform = w.platform
+        if doc_date and not sale.document_date:
+            sale.document_date = doc_date
+        # Intención de emisión: route() la confirma antes de que la etapa llame a Haulmer
+        w.emission_key = emission_key(self.user_id, w.id_venta, w.tipo_doc)
+        sale.status              = "Emitiendo"
+        sale.emission_key        = w.emission_key
+        sale.emission_started_at = datetime.utcnow()
+        return "emit"
+
+    def _emitted(self, w: _Work, result: dict) -> None:
+        sale = self._sale(w)
+        if not result.get("success"):
+            record_failure(sale, result.get("error"), result.get("error_kind"))
+            w.status, w.error = "Error", result.get("error")
+            return None
+
+        sale.status = "Éxito"
+        clear_failure(sale)
+        if not sale.document_date:
+            sale.document_date = datetime.utcnow().date()
+        db.session.add(Document(
+            user_id=self.user_id,
+            sale_id=sale.id,
+            pdf_url=result.get("pdf_url"),
+            xml_url=result.get("xml_url"),
+            haulmer_response=str(result.get("raw", ""))[:4000],
+        ))
+        # Outbox: la subida se encola en la misma transacción que registra la emisión
+        pdf_url = result.get("pdf_url")
+        if pdf_url and self._uploads_to(w.platform):
+            _enqueue_upload(sale, w.platform, w.order.get("pack_id"), pdf_url)
+
+    def _uploads_to(self, platform: str) -> bool:
+        return (platform == "Falabella" and bool(self.falabella)) or (
+            platform == "Mercado Libre" and bool(self.ml_client)
+        )
+
+    def _sale(self, w: _Work) -> Optional[Sale]:
+        return db.session.get(Sale, w.sale_id) if w.sale_id else None
+
+    def _finish(self, w: _Work) -> None:
+        """Registra el resultado de la orden en su ítem y en los contadores del job."""
+        w.item.status = w.status
+        w.item.error  = str(w.error)[:1000] if w.error else None
+        counter = _JOB_COUNTERS[w.status]
+        setattr(self.job, counter, getattr(self.job, counter) + 1)
+        self.job.heartbeat_at = datetime.utcnow()
+
+
+# ── Outbox de subidas ──────────────────────────────────────────────────────
+
+def _enqueue_upload(sale: Sale, platform: str, pack_id: Optional[str], pdf_url: str) -> None:
+    """Crea (o reactiva, si la venta se reemitió) la tarea de subida de la venta."""
+    task = UploadTask.query.filter_by(sale_id=sale.id).first()
+    if task is None:
+        task = UploadTask(user_id=sale.user_id, sale_id=sale.id)
+        db.session.add(task)
+    task.platform        = platform
+    task.pack_id         = str(pack_id) if pack_id else None
+    task.pdf_url         = pdf_url
+    task.status          = "pending"
+    task.attempts        = 0
+    task.next_attempt_at = datetime.utcnow()
+    task.last_error      = None
+    sale.upload_status   = "Pendiente"
+    notify_work(UPLOADS)
+
+
+def _backfill_uploads(orders: List[dict], sales: Dict[str, Sale], platforms: set) -> int:
+    """
+    Ventas emitidas antes del outbox y nunca cargadas (Éxito sin upload_status): encola su
+    subida con el PDF del último documento. Una consulta IN por lote.
+    """
+    pending = {}
+    for o in orders:
+        sale = sales.get(o.get("id_venta"))
+        if (
+            sale and sale.status == "Éxito" and not sale.document_uploaded_at
+            and sale.upload_status is None and o.get("platform") in platforms
+        ):
+            pending[sale.id] = (sale, o)
+    if not pending:
+        return 0
+
+    pdf_urls: Dict[int, str] = {}
+    ids = list(pending)
+    for start in range(0, len(ids), SALES_IN_CHUNK):
+        rows = (
+            db.session.query(Document.sale_id, Document.pdf_url)
+            .filter(Document.sale_id.in_(ids[start:start + SALES_IN_CHUNK]), Document.pdf_url.isnot(None))
+            .order_by(Document.id)
+        )
+        pdf_urls.update({sale_id: pdf_url for sale_id, pdf_url in rows})
+
+    for sale_id, pdf_url in pdf_urls.items():
+        sale, o = pending[sale_id]
+        db.session.add(UploadTask(
+            user_id=sale.user_id, sale_id=sale_id, platform=o["platform"],
+            pack_id=o.get("pack_id"), pdf_url=pdf_url,
+        ))
+        sale.upload_status = "Pendiente"
+    if pdf_urls:
+        notify_work(UPLOADS)
+    return len(pdf_urls)
+
+
+# ── Job ────────────────────────────────────────────────────────────────────
+
+def _preload_sales(user_id: int, orders: List[dict]) -> Dict[str, Sale]:
+    """
+    Sales existentes de las órdenes con consultas IN por lote; las que faltan se insertan
+    juntas (Pendiente) en un solo flush. Devuelve {id_venta: Sale}.
+    """
+    sales = load_sales_map(user_id, (o.get("id_venta") for o in orders))
+    new: Dict[str, Sale] = {}
+    for o in orders:
+        id_venta = o.get("id_venta")
+        if id_venta in sales:
+            if o.get("pack_id") and not sales[id_venta].pack_id:
+                sales[id_venta].pack_id = str(o["pack_id"])
+            continue
+        if not id_venta or id_venta in new or float(o.get("monto", 0)) <= 0:
+            continue
+        new[id_venta] = Sale(
+            user_id=user_id,
+            id_venta=id_venta,
+            pack_id=str(o["pack_id"]) if o.get("pack_id") else None,
+            monto=float(o["monto"]),
+            tipo_doc=o.get("tipo_doc") or "Boleta",
+            status="Pendiente",
+            platform=o.get("platform") or "Manual",
+            document_date=o.get("document_date"),
+        )
+    if new:
+        db.session.add_all(new.values())
+        db.session.flush()
+    sales.update(new)
+    return sales
+
+
+def job_heartbeat(job_id: int, every: Optional[float] = None):
+    """
+    Renueva heartbeat_at del job mientras dura el bloque. La recolección de órdenes es solo red
+    (sin route() que registre avance) y puede superar JOBS_STALE_MINUTES: sin esto otro worker
+    la daría por caída y la volvería a encolar con la corrida en curso.
+    """
+    return keep_alive(ProcessingJob, [job_id], "heartbeat_at", every)
+
+
+def _job_user(job: ProcessingJob) -> User:
+    user = db.session.get(User, job.user_id)
+    if not user or not user.haulmer_api_key_enc:
+        raise ValueError("Configura tu API key de Haulmer en /config/keys")
+    return user
+
+
+def _process_orders(
+    job: ProcessingJob,
+    user: User,
+    haulmer: HaulmerClient,
+    falabella: Optional[FalabellaClient],
+    ml_client: Optional[MercadoLibreClient],
+    orders: List[dict],
+    is_retry: bool,
+) -> dict:
+    """Registra un ítem por orden y las pasa por el pipeline."""
+    sales     = _preload_sales(user.id, orders)
+    platforms = {p for p, client in (("Falabella", falabella), ("Mercado Libre", ml_client)) if client}
+    _backfill_uploads(orders, sales, platforms)
+    processor = _OrderProcessor(job, user, haulmer, falabella, ml_client, is_retry, sales)
+    if falabella:
+        # OrderItemId que sync_sales no alcanzó a guardar: se piden en lote antes de emitir.
+        # Si falla, la subida los pide orden por orden (GetOrderItems). Se confirma aquí: un
+        # choque con sync_sales guardando la misma venta (uq_sale_items_sale_item) no debe
+        # saltar en el próximo autoflush y tumbar el job.
+        pending = {
+            id_venta: sale.id for id_venta, sale in sales.items()
+            if sale.platform == "Falabella" and id_venta not in processor.done
+        }
+        db.session.commit()
+        try:
+            fill_falabella_items(falabella, pending)
+            db.session.commit()
+        except IntegrityError:
+            db.session.rollback()
+            logger.info("process job %s: ítems de Falabella ya guardados por otra sincronización", job.id)
+        except Exception as e:
+            db.session.rollback()
+            logger.warning("process job %s: ítems de Falabella: %s", job.id, e)
+
+    # Un reintento del job (worker caído) parte de cero; las Sales ya emitidas se omiten
+    ProcessingJobItem.query.filter_by(job_id=job.id).delete()
+    items = [
+        ProcessingJobItem(job_id=job.id, id_venta=o.get("id_venta", ""), platform=o.get("platform"))
+        for o in orders
+    ]
+    db.session.add_all(items)
+    job.total = len(items)
+    job.processed = job.skipped = job.failed = 0
+    db.session.commit()
+
+    processor.run([_Work(order=o, item=it) for o, it in zip(orders, items)])
+
+    return {"total": job.total, "processed": job.processed, "skipped": job.skipped, "failed": job.failed}
+
+
+def run_process_job(job: ProcessingJob) -> dict:
+    """
+    Ejecuta un job "process": toma la selección explícita del payload (selected_orders) o, si
+    no hay, recolecta las órdenes de las plataformas; registra un ítem por orden y las pasa por
+    el pipeline, confirmando el avance tras cada orden para que GET /auto/jobs/<id> lo vea.
+    Lanza ValueError si el usuario no tiene Haulmer configurado.
+    """
+    user      = _job_user(job)
+    payload   = job.payload or {}
+    haulmer   = HaulmerClient(decrypt_value(user.haulmer_api_key_enc), tenant_id=user.id)
+    falabella = falabella_client(user)
+    ml_client, ml_user_id = ml_client_for(user)
+    orders    = selected_orders(user.id, payload)
+    # Cerrar la transacción de lectura: la recolección es red y puede tardar minutos
+    db.session.commit()
+
+    if orders is None:
+        with job_heartbeat(job.id):
+            orders = collect_orders(payload, falabella, ml_client, ml_user_id)
+    return _process_orders(job, user, haulmer, falabella, ml_client, orders, bool(payload.get("retry")))
+
+
+def run_retry_job(job: ProcessingJob) -> dict:
+    """
+    Ejecuta un job "retry" (app.tasks.jobs.enqueue_due_retries): reemite las ventas en Error
+    de payload["sale_ids"] sin recolectar órdenes de las plataformas.
+    """
+    user      = _job_user(job)
+    sale_ids  = list((job.payload or {}).get("sale_ids") or [])
+    haulmer   = HaulmerClient(decrypt_value(user.haulmer_api_key_enc), tenant_id=user.id)
+    falabella = falabella_client(user)
+    ml_client, _ = ml_client_for(user)
+
+    orders    = _orders_from_sales(user.id, Sale.id, sale_ids, Sale.status == "Error")
+    db.session.commit()
+
+    return _process_orders(job, user, haulmer, falabella, ml_client, orders, is_retry=False)
@@ -0,0 +1,289 @@
+"""
+Reconciliación entre Falabella/ML y la tabla sales (job "reconcile", POST /auto/reconcile).
+
+- Candidatas: las ventas locales del rango (por páginas de id, sin cargar la tabla entera) y
+  las órdenes de la plataforma que todavía no existen localmente.
+- Cada candidata se comprueba en la plataforma (invoice_uploaded / fiscal_document_uploaded)
+  con RECONCILE_WORKERS threads y un token bucket por plataforma y seller.
+- Las correcciones se aplican en bloque por página (UPDATE ... WHERE id IN):
+    · documento arriba y la venta no lo sabía  → Cargado (y su tarea de subida, done)
+    · venta Cargado sin documento arriba        → vuelve a Pendiente y se encola la subida
+    · orden externa con documento                → se crea la venta ya Cargado
+- El resumen queda en job.result, con una muestra de las correcciones.
+"""
+import logging
+import os
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, datetime, timedelta
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from sqlalchemy import func
+
+from app import db
+from app.models import Document, ProcessingJob, Sale, UploadTask, User
+from app.services.falabella_client import FalabellaClient
+from app.services.mercadolibre_client import MercadoLibreClient
+from app.services.rate_limit import bucket_for
+from app.services.upload_checks import seller_for, upload_checks
+from app.tasks.process_orders import (
+    _enqueue_upload, _fetch_falabella_orders, _fetch_ml_orders, falabella_client, job_heartbeat, ml_client_for,
+)
+from app.utils import SALES_IN_CHUNK, load_sales_map, parse_date
+
+logger = logging.getLogger(__name__)
+
+PAGE_SIZE = int(os.environ.get("RECONCILE_PAGE_SIZE", "1000"))
+WORKERS = int(os.environ.get("RECONCILE_WORKERS", "8"))
+RATES = {
+    "Falabella":     float(os.environ.get("RECONCILE_FALABELLA_RPS", "5")),
+    "Mercado Libre": float(os.environ.get("RECONCILE_ML_RPS", "10")),
+}
+DEFAULT_DAYS = 30
+MAX_SAMPLE = 200
+
+
+class _Candidate:
+    __slots__ = ("sale_id", "id_venta", "platform", "ref", "uploaded", "order", "answer")
+
+    def __init__(self, sale_id, id_venta, platform, ref, uploaded, order=None):
+        self.sale_id  = sale_id
+        self.id_venta = id_venta
+        self.platform = platform
+        self.ref      = ref            # orden (Falabella) o pack (ML) que se consulta
+        self.uploaded = uploaded       # lo que dice la BD
+        self.order    = order          # orden de la plataforma (solo externas)
+        self.answer: Optional[bool] = None
+
+
+def _date_range(payload: dict) -> Tuple[date, date]:
+    until = parse_date(payload.get("until")) or datetime.utcnow().date()
+    since = parse_date(payload.get("since")) or until - timedelta(days=DEFAULT_DAYS)
+    if since > until:
+        raise ValueError("since debe ser anterior a until")
+    return since, until
+
+
+def _local_pages(user_id: int, platforms: List[str], since: date, until: date) -> Iterator[List[_Candidate]]:
+    """Ventas locales del rango en páginas de PAGE_SIZE (keyset por id)."""
+    day   = func.coalesce(Sale.document_date, func.date(Sale.created_at))
+    after = 0
+    while True:
+        rows = (
+            db.session.query(Sale.id, Sale.id_venta, Sale.platform, Sale.pack_id, Sale.document_uploaded_at)
+            .filter(
+                Sale.user_id == user_id, Sale.id > after, Sale.platform.in_(platforms),
+                day >= since, day <= until,
+            )
+            .order_by(Sale.id)
+            .limit(PAGE_SIZE)
+            .all()
+        )
+        db.session.commit()
+        if not rows:
+            return
+        after = rows[-1].id
+        yield [
+            _Candidate(
+                r.id, r.id_venta, r.platform,
+                r.id_venta if r.platform == "Falabella" else (r.pack_id or r.id_venta),
+                r.document_uploaded_at is not None,
+            )
+            for r in rows
+        ]
+
+
+def _external_candidates(user_id: int, orders: List[dict], since: date, until: date) -> List[_Candidate]:
+    """Órdenes de la plataforma dentro del rango que no están en sales."""
+    in_range = [
+        o for o in orders
+        if o.get("id_venta") and (o.get("document_date") is None or since <= o["document_date"] <= until)
+    ]
+    known = load_sales_map(user_id, (o["id_venta"] for o in in_range))
+    db.session.commit()
+    seen, out = set(), []
+    for o in in_range:
+        if o["id_venta"] in known or o["id_venta"] in seen:
+            continue
+        seen.add(o["id_venta"])
+        ref = o["id_venta"] if o["platform"] == "Falabella" else (o.get("pack_id") or o["id_venta"])
+        out.append(_Candidate(None, o["id_venta"], o["platform"], ref, False, order=o))
+    return out
+
+
+class _Reconciler:
+    def __init__(self, job: ProcessingJob, user: User,
+                 falabella: Optional[FalabellaClient], ml_client: Optional[MercadoLibreClient]):
+        self.job     = job
+        self.user_id = user.id
+        self.clients = {"Falabella": falabella, "Mercado Libre": ml_client}
+        self.sellers = {p: seller_for(user, p) for p in self.clients}
+        self.buckets = {
+            p: bucket_for("reconcile", f"{p}:{self.sellers[p]}", RATES[p], burst=RATES[p])
+            for p in self.clients
+        }
+        self.summary = dict.fromkeys(
+            ("checked", "confirmed", "not_uploaded", "marked_uploaded", "cleared",
+             "uploads_requeued", "external_created", "unknown"), 0,
+        )
+        self.sample: List[dict] = []
+
+    # ── Comprobación concurrente (threads: sin db.session) ────────────────
+
+    def _check(self, c: _Candidate) -> None:
+        self.buckets[c.platform].acquire()
+        client = self.clients[c.platform]
+        try:
+            if c.platform == "Falabella":
+                c.answer = client.invoice_uploaded(c.ref)
+            else:
+                c.answer = client.fiscal_document_uploaded(c.ref)
+        except Exception as e:  # una orden sin respuesta no detiene la página
+            logger.warning("reconcile %s %s: %s", c.platform, c.id_venta, e)
+            c.answer = None
+
+    def check(self, pool: ThreadPoolExecutor, page: List[_Candidate]) -> None:
+        list(pool.map(self._check, page))
+        for c in page:
+            upload_checks.put(c.platform, self.sellers[c.platform], c.ref, c.answer)
+
+    # ── Correcciones en bloque (thread del job) ───────────────────────────
+
+    def _note(self, c: _Candidate, action: str) -> None:
+        if len(self.sample) < MAX_SAMPLE:
+            self.sample.append({"id_venta": c.id_venta, "platform": c.platform, "action": action})
+
+    def apply(self, page: List[_Candidate]) -> None:
+        now = datetime.utcnow()
+        mark, clear, create = [], [], []
+        for c in page:
+            self.summary["checked"] += 1
+            if c.answer is None:
+                self.summary["unknown"] += 1
+            elif c.answer and c.sale_id is None:
+                create.append(c)
+            elif c.answer and not c.uploaded:
+                mark.append(c)
+            elif not c.answer and c.uploaded:
+                clear.append(c)
+            elif c.answer:
+                self.summary["confirmed"] += 1
+            else:
+                self.summary["not_uploaded"] += 1
+
+        for ids in _chunks([c.sale_id for c in mark]):
+            Sale.query.filter(Sale.id.in_(ids)).update(
+                {"document_uploaded_at": now, "upload_status": "Cargado"}, synchronize_session=False,
+            )
+            UploadTask.query.filter(UploadTask.sale_id.in_(ids), UploadTask.status != "done").update(
+                {"status": "done", "last_error": None}, synchronize_session=False,
+            )
+        for c in mark:
+            self._note(c, "marcada_cargada")
+        self.summary["marked_uploaded"] += len(mark)
+
+        for ids in _chunks([c.sale_id for c in clear]):
+            Sale.query.filter(Sale.id.in_(ids)).update(
+                {"document_uploaded_at": None, "upload_status": None}, synchronize_session=False,
+            )
+        for c in clear:
+            self._note(c, "sin_documento_en_plataforma")
+        self.summary["cleared"] += len(clear)
+        self.summary["uploads_requeued"] += self._requeue_uploads(clear)
+
+        if create:
+            db.session.add_all(Sale(
+                user_id=self.user_id,
+                id_venta=c.id_venta,
+                pack_id=c.order.get("pack_id"),
+                monto=max(float(c.order.get("monto") or 0), 0.01),
+                tipo_doc="Boleta",
+                status="Pendiente",
+                platform=c.platform,
+                document_date=c.order.get("document_date"),
+                document_uploaded_at=now,
+                upload_status="Cargado",
+            ) for c in create)
+            for c in create:
+                self._note(c, "externa_creada")
+            self.summary["external_created"] += len(create)
+
+        self.job.processed    = self.summary["checked"]
+        self.job.heartbeat_at = now
+        db.session.commit()
+
+    def _requeue_uploads(self, cleared: List[_Candidate]) -> int:
+        """Ventas emitidas que perdieron el documento arriba: se vuelve a encolar su subida."""
+        if not cleared or not any(self.clients[c.platform] for c in cleared):
+            return 0
+        by_id = {c.sale_id: c for c in cleared if self.clients[c.platform]}
+        pdf_urls: Dict[int, str] = {}
+        for ids in _chunks(list(by_id)):
+            rows = (
+                db.session.query(Document.sale_id, Document.pdf_url)
+                .join(Sale, Sale.id == Document.sale_id)
+                .filter(Document.sale_id.in_(ids), Document.pdf_url.isnot(None), Sale.status == "Éxito")
+                .order_by(Document.id)
+            )
+            pdf_urls.update({sale_id: pdf_url for sale_id, pdf_url in rows})
+        for sale_id, pdf_url in pdf_urls.items():
+            c = by_id[sale_id]
+            pack_id = c.ref if c.platform == "Mercado Libre" and c.ref != c.id_venta else None
+            _enqueue_upload(db.session.get(Sale, sale_id), c.platform, pack_id, pdf_url)
+        return len(pdf_urls)
+
+
+def _chunks(ids: List[int]) -> Iterator[List[int]]:
+    for start in range(0, len(ids), SALES_IN_CHUNK):
+        yield ids[start:start + SALES_IN_CHUNK]
+
+
+def run_reconcile_job(job: ProcessingJob) -> dict:
+    """
+    Ejecuta un job "reconcile": payload {since, until, external (bool, default true)}.
+    Lanza ValueError si el usuario no tiene Falabella ni ML configurados.
+    """
+    user = db.session.get(User, job.user_id)
+    if not user:
+        raise ValueError("Usuario no encontrado")
+    payload   = job.payload or {}
+    since, until = _date_range(payload)
+    falabella = falabella_client(user)
+    ml_client, ml_user_id = ml_client_for(user)
+    platforms = [p for p, client in (("Falabella", falabella), ("Mercado Libre", ml_client)) if client]
+    if not platforms:
+        raise ValueError("Configura Falabella o Mercado Libre en /config/keys")
+
+    reconciler = _Reconciler(job, user, falabella, ml_client)
+    job.total = job.processed = job.skipped = job.failed = 0
+    db.session.commit()
+
+    with ThreadPoolExecutor(max_workers=max(1, WORKERS), thread_name_prefix=f"reconcile{job.id}") as pool:
+        for page in _local_pages(user.id, platforms, since, until):
+            job.total += len(page)
+            reconciler.check(pool, page)
+            reconciler.apply(page)
+
+        if payload.get("external", True):
+            orders: List[dict] = []
+            # Sin transacción abierta sobre el job: el heartbeat lo actualiza desde otra conexión
+            db.session.commit()
+            with job_heartbeat(job.id):
+                if falabella:
+                    orders.extend(_fetch_falabella_orders(falabella, since.strftime("%Y-%m-%dT00:00:00+00:00")))
+                if ml_client and ml_user_id:
+                    orders.extend(_fetch_ml_orders(ml_client, ml_user_id))
+            external = _external_candidates(user.id, orders, since, until)
+            for start in range(0, len(external), PAGE_SIZE):
+                page = external[start:start + PAGE_SIZE]
+                job.total += len(page)
+                reconciler.check(pool, page)
+                reconciler.apply(page)
+
+    job.failed = reconciler.summary["unknown"]
+    db.session.commit()
+    return {
+        "since":       since.isoformat(),
+        "until":       until.isoformat(),
+        **reconciler.summary,
+        "corrections": reconciler.sample,
+    }
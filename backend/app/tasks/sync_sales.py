@@ -1,6 +1,8 @@
 """
 Sincroniza ventas desde Falabella y Mercado Libre.
 Se ejecuta cada 30 min por APScheduler o vía GET /internal/sync-sales (cron).
+Guarda también lo que después necesita la subida del documento: el pack_id de ML y los
+OrderItemId de Falabella (sale_items), para no volver a pedirlos por cada orden.
 """
 import logging
 from datetime import datetime, timezone, timedelta
@@ -10,8 +12,9 @@ from sqlalchemy import and_, or_
 from app import db
 from app.crypto_utils import decrypt_value
 from app.models import Sale, User
-from app.services.falabella_client import FalabellaClient
-from app.services.mercadolibre_client import MercadoLibreClient
+from app.services.falabella_client import FalabellaClient, FalabellaStreamError
+from app.services.mercadolibre_client import ORDER_SUMMARY_FIELDS, MercadoLibreClient, order_total
+from app.services.sale_items import fill_falabella_items
 from app.utils import parse_date
 
 logger = logging.getLogger(__name__)
@@ -29,41 +32,51 @@ def _fetch_and_upsert_falabella(user: User) -> int:
         return 0
 
     since  = (datetime.now(timezone.utc) - timedelta(days=SYNC_DAYS)).strftime("%Y-%m-%dT00:00:00+00:00")
-    client = FalabellaClient(user_id=user.falabella_user_id, api_key=key)
-    result = client.get_orders(created_after=since, updated_after=since, limit=100)
+    client = FalabellaClient(user_id=user.falabella_user_id, api_key=key, tenant_id=user.id)
+    result = client.get_orders(created_after=since, updated_after=since, limit=100, stream=True)
     if not result.get("success"):
         logger.warning("Falabella get_orders user %s: %s", user.id, result.get("error"))
         return 0
 
-    body   = result.get("data", {}).get("Body") or result.get("data", {})
-    raw    = (body.get("Orders") or {}).get("Order") or body.get("Order") or []
-    orders = raw if isinstance(raw, list) else ([raw] if raw else [])
-    count  = 0
-
-    for o in orders:
-        if not isinstance(o, dict) or "OrderId" not in o:
-            continue
-        id_venta = str(o["OrderId"])
-        monto    = float(o.get("Price", 0) or 0)
-        if not id_venta or monto <= 0:
-            continue
-        doc_date = parse_date(o.get("CreatedAt") or o.get("OrderDate")) or datetime.utcnow().date()
-        sale     = Sale.query.filter_by(user_id=user.id, id_venta=id_venta).first()
-        if sale:
-            if not sale.document_date:
-                sale.document_date = doc_date
-            continue
-        db.session.add(Sale(
-            user_id=user.id,
-            id_venta=id_venta,
-            monto=monto,
-            tipo_doc="Boleta",
-            status="Pendiente",
-            platform="Falabella",
-            document_date=doc_date,
-        ))
-        count += 1
-
+    count = 0
+    sales = {}
+    try:
+        for o in result["orders"]:
+            if not isinstance(o, dict) or "OrderId" not in o:
+                continue
+            id_venta = str(o["OrderId"])
+            monto    = float(o.get("Price", 0) or 0)
+            if not id_venta or monto <= 0:
+                continue
+            doc_date = parse_date(o.get("CreatedAt") or o.get("OrderDate")) or datetime.utcnow().date()
+            sale     = Sale.query.filter_by(user_id=user.id, id_venta=id_venta).first()
+            if sale:
+                if not sale.document_date:
+                    sale.document_date = doc_date
+                if not sale.document_uploaded_at:
+                    sales[id_venta] = sale
+                continue
+            sale = Sale(
+                user_id=user.id,
+                id_venta=id_venta,
+                monto=monto,
+                tipo_doc="Boleta",
+                status="Pendiente",
+                platform="Falabella",
+                document_date=doc_date,
+            )
+            db.session.add(sale)
+            sales[id_venta] = sale
+            count += 1
+    except FalabellaStreamError as e:
+        # Lo recibido son órdenes reales y el upsert es idempotente: se guarda y la próxima
+        # sincronización completa el resto
+        logger.warning("Falabella get_orders user %s incompleto (%d nuevas): %s", user.id, count, e)
+
+    # OrderItemId de las ventas aún sin cargar: una llamada por cada 50 órdenes
+    if sales:
+        db.session.flush()
+        fill_falabella_items(client, {id_venta: sale.id for id_venta, sale in sales.items()})
     return count
 
 
@@ -75,8 +88,8 @@ def _fetch_and_upsert_ml(user: User) -> int:
     except ValueError:
         return 0
 
-    client = MercadoLibreClient(access_token=token)
-    result = client.get_orders(seller_id=user.ml_user_id, limit=50)
+    client = MercadoLibreClient(access_token=token, tenant_id=user.id)
+    result = client.get_orders(seller_id=user.ml_user_id, limit=50, attributes=ORDER_SUMMARY_FIELDS)
     if not result.get("success"):
         logger.warning("ML get_orders user %s: %s", user.id, result.get("error"))
         return 0
@@ -88,23 +101,26 @@ def _fetch_and_upsert_ml(user: User) -> int:
         order_id = str(r.get("id", ""))
         if not order_id:
             continue
-        if Sale.query.filter_by(user_id=user.id, id_venta=order_id).first():
+        pack_id = r.get("pack_id")
+        sale    = Sale.query.filter_by(user_id=user.id, id_venta=order_id).first()
+        if sale:
+            if not sale.pack_id:
+                sale.pack_id = str(pack_id or order_id)
             continue
 
-        monto = 0.0
-        orders_list = r.get("orders") or []
-        if orders_list and isinstance(orders_list[0], dict):
-            monto = float(orders_list[0].get("total", 0) or 0)
+        monto = order_total(r)
         if monto <= 0:
             detail = client.get_order(order_id)
             if detail.get("success"):
-                monto = float((detail.get("data") or {}).get("total", 0) or 0)
+                monto   = float((detail.get("data") or {}).get("total", 0) or 0)
+                pack_id = pack_id or detail.get("pack_id")
         monto = monto or 0.01
 
         doc_date = parse_date(r.get("date_created") or r.get("date_last_updated")) or datetime.utcnow().date()
         db.session.add(Sale(
             user_id=user.id,
             id_venta=order_id,
+            pack_id=str(pack_id or order_id),
             monto=monto,
             tipo_doc="Boleta",
             status="Pendiente",
@@ -0,0 +1,289 @@
+"""
+Outbox de subidas (tabla upload_tasks): carga en Falabella/ML los documentos ya emitidos.
+
+- Cada emisión exitosa encola una tarea en la misma transacción (app.tasks.process_orders).
+- drain_upload_tasks toma un lote de tareas vencidas con FOR UPDATE SKIP LOCKED y las pasa
+  por un pipeline pdf → optimize → upload (plataforma). La etapa pdf descarga de Haulmer solo
+  la primera vez: el archivo queda en el almacén local (app.services.documents) y los
+  reintentos lo leen de disco. optimize reduce el PDF en un pool de procesos
+  (app.services.pdf_optimizer) hasta el límite de la plataforma (1 MB en ML).
+- Cada lote se reparte entre los tenants con tareas vencidas según el peso de su plan
+  (app.services.fair_queue.upload_shares): el outbox de un vendedor grande no frena al resto.
+- Un fallo reprograma la tarea con backoff exponencial; tras MAX_ATTEMPTS queda en error y la
+  venta en upload_status "Error". El estado de la emisión (Sale.status) no cambia.
+- Mientras un lote está en curso, updated_at de sus tareas se renueva (keep_alive): un lote
+  lento (descargas, optimize, subidas con techo de 60 s) no parece caído a otro drenaje.
+- Lo drena el scheduler del web (JOBS_INLINE_WORKER) o el worker dedicado (app.tasks.jobs).
+- Los OrderItemId de Falabella (sale_items) y el pack_id de ML se leen de la BD al tomar el lote;
+  solo se piden a la plataforma si la sincronización no los guardó.
+"""
+import logging
+import os
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy import select
+
+from app import db
+from app.models import Document, Sale, UploadTask, User
+from app.services.blob_store import blob_store
+from app.services.documents import download_to_store
+from app.services.fair_queue import upload_shares
+from app.services.heartbeat import keep_alive
+from app.services.falabella_client import FalabellaClient, parse_order_items_response
+from app.services.mercadolibre_client import MAX_FISCAL_DOCUMENT_BYTES, MercadoLibreClient
+from app.services.notify import UPLOADS, notify_work
+from app.services.pdf_optimizer import PROCESSES as OPTIMIZE_PROCESSES, optimize_pdf
+from app.services.pipeline import Stage, StagedPipeline
+from app.services.sale_items import item_ids_for
+from app.services.upload_checks import seller_for, upload_checks
+from app.tasks.process_orders import falabella_client, ml_client_for
+
+logger = logging.getLogger(__name__)
+
+BATCH_SIZE = int(os.environ.get("UPLOAD_BATCH_SIZE", "50"))
+PDF_WORKERS = int(os.environ.get("PIPELINE_PDF_WORKERS", "4"))
+OPTIMIZE_WORKERS = int(os.environ.get("PIPELINE_OPTIMIZE_WORKERS", str(OPTIMIZE_PROCESSES)))
+UPLOAD_WORKERS = int(os.environ.get("PIPELINE_UPLOAD_WORKERS", "4"))
+MAX_ATTEMPTS = 8
+BACKOFF_BASE = timedelta(minutes=1)
+BACKOFF_MAX = timedelta(hours=6)
+# Tamaño máximo del PDF por plataforma (None: sin límite, solo reducciones sin pérdida)
+MAX_PDF_BYTES: Dict[str, Optional[int]] = {
+    "Falabella":     None,
+    "Mercado Libre": MAX_FISCAL_DOCUMENT_BYTES,
+}
+STALE_AFTER = timedelta(minutes=15)
+
+
+# ── Llamadas de red (threads del pipeline: sin db.session) ─────────────────
+
+def _upload_to_falabella(
+    falabella: FalabellaClient, id_venta: str, item_ids: List[int], pdf_path: str,
+) -> Tuple[bool, Optional[str]]:
+    """Sube el PDF a Falabella con los OrderItemId guardados (o pedidos si faltan). Devuelve (éxito, error)."""
+    if not item_ids:
+        items    = parse_order_items_response(falabella.get_order_items(id_venta))
+        item_ids = [int(it["OrderItemId"]) for it in items if it.get("OrderItemId")]
+    if not item_ids:
+        return False, f"Sin OrderItemIds para la orden {id_venta}"
+
+    upload = falabella.set_invoice_pdf(
+        order_item_ids=item_ids,
+        invoice_number=id_venta,
+        invoice_date=datetime.utcnow().strftime("%Y-%m-%d"),
+        invoice_type="BOLETA",
+        operator_code="FACL",
+        pdf_path=pdf_path,
+    )
+    return bool(upload.get("success")), upload.get("error")
+
+
+def _upload_to_ml(
+    ml_client: MercadoLibreClient, id_venta: str, pack_id: Optional[str], pdf_path: str,
+) -> Tuple[bool, Optional[str]]:
+    """Sube el PDF a Mercado Libre. Devuelve (éxito, error)."""
+    if not pack_id:
+        ord_resp = ml_client.get_order(id_venta)
+        pack_id  = ord_resp.get("pack_id") or id_venta if ord_resp.get("success") else id_venta
+    upload = ml_client.upload_fiscal_document(str(pack_id), pdf_path=pdf_path)
+    return bool(upload.get("success")), upload.get("error")
+
+
+# ── Cola ───────────────────────────────────────────────────────────────────
+
+def _backoff(attempts: int) -> timedelta:
+    return min(BACKOFF_MAX, BACKOFF_BASE * (2 ** max(0, attempts - 1)))
+
+
+def requeue_stale_uploads() -> int:
+    """Tareas running sin avance en STALE_AFTER (worker caído) vuelven a pending."""
+    cutoff = datetime.utcnow() - STALE_AFTER
+    n = (
+        UploadTask.query
+        .filter(UploadTask.status == "running", UploadTask.updated_at < cutoff)
+        .update({"status": "pending"}, synchronize_session=False)
+    )
+    if n:
+        notify_work(UPLOADS)
+    db.session.commit()
+    return n
+
+
+def claim_upload_tasks(limit: int = BATCH_SIZE) -> List[dict]:
+    """
+    Toma hasta `limit` tareas vencidas (la parte de cada tenant según upload_shares), las marca
+    running y devuelve sus datos planos.
+    """
+    now = datetime.utcnow()
+    rows = []
+    for user_id, share in upload_shares(limit, now).items():
+        stmt = (
+            select(UploadTask, Sale.id_venta, Sale.pack_id)
+            .join(Sale, Sale.id == UploadTask.sale_id)
+            .where(UploadTask.status == "pending", UploadTask.next_attempt_at <= now, UploadTask.user_id == user_id)
+            .order_by(UploadTask.next_attempt_at, UploadTask.id)
+            .limit(share)
+            .with_for_update(of=UploadTask, skip_locked=True)
+        )
+        rows.extend(db.session.execute(stmt).all())
+    claimed = []
+    for task, id_venta, sale_pack_id in rows:
+        task.status = "running"
+        task.updated_at = now
+        claimed.append({
+            "id": task.id, "user_id": task.user_id, "sale_id": task.sale_id, "id_venta": id_venta,
+            "platform": task.platform, "pack_id": task.pack_id or sale_pack_id, "pdf_url": task.pdf_url,
+        })
+    item_ids = item_ids_for(t["sale_id"] for t in claimed if t["platform"] == "Falabella")
+    documents = _documents_for(claimed)
+    for t in claimed:
+        t["item_ids"] = item_ids.get(t["sale_id"], [])
+        t["document_id"], t["pdf_sha256"] = documents.get(t["id"], (None, None))
+    db.session.commit()
+    return claimed
+
+
+def _documents_for(tasks: List[dict]) -> Dict[int, Tuple[int, Optional[str]]]:
+    """{task_id: (document_id, pdf_sha256)}: el Document de la venta con el pdf_url de la tarea."""
+    if not tasks:
+        return {}
+    by_key = {(t["sale_id"], t["pdf_url"]): t["id"] for t in tasks}
+    rows = (
+        db.session.query(Document.id, Document.sale_id, Document.pdf_url, Document.pdf_sha256)
+        .filter(Document.sale_id.in_({t["sale_id"] for t in tasks}))
+        .order_by(Document.id)
+    )
+    return {
+        by_key[sale_id, pdf_url]: (doc_id, sha)
+        for doc_id, sale_id, pdf_url, sha in rows if (sale_id, pdf_url) in by_key
+    }
+
+
+class _UploadBatch:
+    """Sube un lote de tareas con StagedPipeline; route() escribe cada resultado en su transacción."""
+
+    def __init__(self, tasks: List[dict]):
+        self.tasks = tasks
+        self.clients: Dict[int, Tuple[Optional[FalabellaClient], Optional[MercadoLibreClient]]] = {}
+        self.sellers: Dict[Tuple[int, str], str] = {}
+        for user in User.query.filter(User.id.in_({t["user_id"] for t in tasks})):
+            self.clients[user.id] = (falabella_client(user), ml_client_for(user)[0])
+            for platform in ("Falabella", "Mercado Libre"):
+                self.sellers[user.id, platform] = seller_for(user, platform)
+        db.session.commit()
+        self.pipeline = StagedPipeline([
+            Stage("pdf", self._pdf, PDF_WORKERS),
+            Stage("optimize", self._optimize, OPTIMIZE_WORKERS),
+            Stage("upload", self._upload, UPLOAD_WORKERS),
+        ], thread_name_prefix="uploads")
+        self.uploaded = 0
+
+    def run(self) -> int:
+        self.pipeline.run(self.tasks, self.route)
+        return self.uploaded
+
+    def _client(self, t: dict):
+        falabella, ml_client = self.clients.get(t["user_id"], (None, None))
+        return falabella if t["platform"] == "Falabella" else ml_client
+
+    def _pdf(self, t: dict) -> Tuple[str, Optional[int]]:
+        """(sha256, tamaño) del PDF en el almacén; tamaño None si ya estaba (sin descarga)."""
+        if t["pdf_sha256"] and blob_store().exists(t["pdf_sha256"]):
+            return t["pdf_sha256"], None
+        return download_to_store(t["pdf_url"], t["user_id"])
+
+    def _optimize(self, t: dict) -> Tuple[str, int]:
+        return optimize_pdf(t["pdf_sha256"], MAX_PDF_BYTES.get(t["platform"]))
+
+    def _upload(self, t: dict) -> Tuple[bool, Optional[str]]:
+        client = self._client(t)
+        # El body se arma por partes desde el archivo del almacén: sin copias del PDF en memoria
+        pdf    = blob_store().path(t["upload_sha256"])
+        if t["platform"] == "Falabella":
+            return _upload_to_falabella(client, t["id_venta"], t["item_ids"], pdf)
+        return _upload_to_ml(client, t["id_venta"], t["pack_id"], pdf)
+
+    def route(self, stage: Optional[str], t: dict, result, error: Optional[BaseException]) -> Optional[str]:
+        if stage is None:
+            if self._client(t) is None:
+                self._failed(t, f"{t['platform']} no está configurado", permanent=True)
+                return None
+            return "pdf"
+        if stage == "pdf":
+            if error is not None:
+                self._failed(t, f"Descarga del PDF: {error}")
+                return None
+            self._stored(t, *result)
+            return "optimize"
+        if stage == "optimize":
+            return self._optimized(t, result, error)
+        ok, upload_error = result if error is None else (False, str(error))
+        if ok:
+            self._done(t)
+        else:
+            self._failed(t, upload_error or "La plataforma rechazó el documento")
+        return None
+
+    def _stored(self, t: dict, digest: str, size: Optional[int]) -> None:
+        t["pdf_sha256"] = digest
+        if size is not None and t["document_id"]:
+            Document.query.filter_by(id=t["document_id"]).update(
+                {"pdf_sha256": digest, "pdf_size": size}, synchronize_session=False,
+            )
+            db.session.commit()
+
+    def _optimized(self, t: dict, result, error: Optional[BaseException]) -> Optional[str]:
+        if error is not None:
+            # La reducción es una mejora: si falla se intenta con el PDF original
+            logger.warning("optimize %s %s: %s", t["platform"], t["id_venta"], error)
+            t["upload_sha256"] = t["pdf_sha256"]
+            return "upload"
+        digest, size = result
+        limit = MAX_PDF_BYTES.get(t["platform"])
+        if limit and size > limit:
+            self._failed(t, f"El PDF pesa {size // 1024} KB y no se pudo reducir a {limit // 1024} KB",
+                         permanent=True)
+            return None
+        t["upload_sha256"] = digest
+        return "upload"
+
+    def _done(self, t: dict) -> None:
+        now  = datetime.utcnow()
+        task = db.session.get(UploadTask, t["id"])
+        sale = db.session.get(Sale, t["sale_id"])
+        task.status, task.last_error = "done", None
+        sale.document_uploaded_at = sale.document_uploaded_at or now
+        sale.upload_status = "Cargado"
+        db.session.commit()
+        self.uploaded += 1
+        # La subida propia reemplaza un "no cargado" en caché por "cargado"
+        ref = t["id_venta"] if t["platform"] == "Falabella" else (t["pack_id"] or t["id_venta"])
+        upload_checks.put(t["platform"], self.sellers[t["user_id"], t["platform"]], ref, True)
+
+    def _failed(self, t: dict, error: str, permanent: bool = False) -> None:
+        logger.warning("upload %s %s: %s", t["platform"], t["id_venta"], error)
+        task = db.session.get(UploadTask, t["id"])
+        task.attempts += 1
+        task.last_error = str(error)[:1000]
+        if permanent or task.attempts >= MAX_ATTEMPTS:
+            task.status = "error"
+            db.session.get(Sale, t["sale_id"]).upload_status = "Error"
+        else:
+            task.status = "pending"
+            task.next_attempt_at = datetime.utcnow() + _backoff(task.attempts)
+        db.session.commit()
+
+
+def drain_upload_tasks(batch_size: int = BATCH_SIZE, max_batches: Optional[int] = None) -> int:
+    """Sube lotes de tareas vencidas hasta vaciar la cola (o max_batches). Requiere app context."""
+    requeue_stale_uploads()
+    uploaded = batches = 0
+    while max_batches is None or batches < max_batches:
+        tasks = claim_upload_tasks(batch_size)
+        if not tasks:
+            break
+        with keep_alive(UploadTask, [t["id"] for t in tasks], "updated_at"):
+            uploaded += _UploadBatch(tasks).run()
+        batches += 1
+    return uploaded
@@ -1,20 +1,20 @@
 """
 Helpers compartidos por todos los blueprints: respuestas de error, acceso a usuario,
-parseo de fechas.
+carga de ventas en lote, parseo de fechas.
 """
 from __future__ import annotations
 
 import logging
 import re
 from datetime import datetime, date
-from typing import Any, Optional, Tuple, Union
+from typing import Any, Dict, Iterable, Optional, Tuple, Union
 
 from flask import jsonify
 from flask_jwt_extended import get_jwt_identity
 from werkzeug.exceptions import HTTPException
 
 from app import db
-from app.models import User
+from app.models import Sale, User
 
 logger = logging.getLogger(__name__)
 
@@ -51,6 +51,25 @@ def require_user() -> Tuple[Optional[User], Optional[Tuple]]:
     return user, None
 
 
+# ── Ventas en lote ─────────────────────────────────────────────────────────
+
+SALES_IN_CHUNK = 500
+
+
+def load_sales_map(user_id: int, id_ventas: Iterable[str], chunk_size: int = SALES_IN_CHUNK) -> Dict[str, Sale]:
+    """
+    Carga las Sales existentes del usuario para los id_venta dados con consultas IN
+    (de a chunk_size valores) en vez de una consulta por orden. Devuelve {id_venta: Sale}.
+    """
+    ids = list(dict.fromkeys(str(i) for i in id_ventas if i))
+    sales: Dict[str, Sale] = {}
+    for start in range(0, len(ids), chunk_size):
+        chunk = ids[start:start + chunk_size]
+        for sale in Sale.query.filter(Sale.user_id == user_id, Sale.id_venta.in_(chunk)):
+            sales[sale.id_venta] = sale
+    return sales
+
+
 # ── Fechas ─────────────────────────────────────────────────────────────────
 
 def parse_date(value: Any) -> Optional[date]:
@@ -0,0 +1,22 @@
+"""
+Servidores falsos de Falabella Seller Center, Mercado Libre y Haulmer para desarrollo,
+benchmarks y pruebas de carga sin credenciales reales.
+
+Cada servicio es una app Flask que implementa solo el subconjunto de la API que usan
+los clientes de app/services. Latencia, tasa de errores, 429 y volumen de órdenes
+se configuran con FakeConfig (CLI, env o POST /_fake/config en caliente).
+
+Uso: cd backend && python -m fake_upstreams --orders 5000 --latency-ms 80
+"""
+from fake_upstreams.common import FakeConfig, serve_in_thread
+from fake_upstreams.falabella import create_falabella_app
+from fake_upstreams.haulmer import create_haulmer_app
+from fake_upstreams.mercadolibre import create_ml_app
+
+__all__ = [
+    "FakeConfig",
+    "serve_in_thread",
+    "create_falabella_app",
+    "create_haulmer_app",
+    "create_ml_app",
+]
@@ -0,0 +1,51 @@
+"""
+Levanta los tres servidores falsos y muestra las variables para apuntar el backend a ellos.
+
+Uso:
+  cd backend && python -m fake_upstreams --orders 5000 --latency-ms 80 --jitter-ms 40 \\
+      --error-rate 0.01 --rate-limit-rate 0.02
+"""
+import argparse
+import time
+from dataclasses import fields
+
+from fake_upstreams.common import FakeConfig, serve_in_thread
+from fake_upstreams.falabella import DEFAULT_API_KEY, create_falabella_app
+from fake_upstreams.haulmer import create_haulmer_app
+from fake_upstreams.mercadolibre import create_ml_app
+
+
+def main() -> None:
+    defaults = FakeConfig.from_env()
+    parser = argparse.ArgumentParser(description="Servidores falsos de Falabella, Mercado Libre y Haulmer")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--falabella-port", type=int, default=8101)
+    parser.add_argument("--ml-port", type=int, default=8102)
+    parser.add_argument("--haulmer-port", type=int, default=8103)
+    for f in fields(FakeConfig):
+        parser.add_argument(f"--{f.name.replace('_', '-')}", type=type(f.default), default=getattr(defaults, f.name))
+    args = parser.parse_args()
+
+    def config() -> FakeConfig:
+        # Configuración independiente por servicio (cada uno se ajusta en caliente por separado)
+        return FakeConfig(**{f.name: getattr(args, f.name) for f in fields(FakeConfig)})
+
+    falabella_url, _ = serve_in_thread(create_falabella_app(config()), args.host, args.falabella_port)
+    ml_url, _ = serve_in_thread(create_ml_app(config()), args.host, args.ml_port)
+    haulmer_url, _ = serve_in_thread(create_haulmer_app(config()), args.host, args.haulmer_port)
+
+    print("Servidores falsos activos. Exporta en el backend:")
+    print(f"  export FALABELLA_BASE_URL_OVERRIDE={falabella_url}")
+    print(f"  export ML_API_BASE={ml_url}")
+    print(f"  export HAULMER_API_BASE={haulmer_url}")
+    print(f"Falabella acepta cualquier UserID firmado con la API key '{DEFAULT_API_KEY}'.")
+    print("Ajuste en caliente: POST <url>/_fake/config con JSON (latency_ms, error_rate, ...).")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,121 @@
+"""
+Piezas compartidas por los servidores falsos: configuración de fallas, datos sintéticos
+y arranque en un hilo (para tests y benchmarks).
+"""
+from __future__ import annotations
+
+import os
+import random
+import threading
+import time
+from dataclasses import asdict, dataclass, fields
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, Tuple
+
+from flask import Flask, jsonify, request
+from werkzeug.serving import make_server
+
+# PDF mínimo válido (una página en blanco); se repite para simular tamaños mayores
+MINIMAL_PDF = (
+    b"%PDF-1.4\n1 0 obj<</Type/Catalog/Pages 2 0 R>>endobj\n"
+    b"2 0 obj<</Type/Pages/Kids[3 0 R]/Count 1>>endobj\n"
+    b"3 0 obj<</Type/Page/Parent 2 0 R/MediaBox[0 0 612 792]>>endobj\n"
+    b"trailer<</Root 1 0 R>>\n%%EOF\n"
+)
+
+
+@dataclass
+class FakeConfig:
+    """Comportamiento del servidor falso. Se puede cambiar en caliente con POST /_fake/config."""
+
+    latency_ms: float = 0.0        # latencia base por petición
+    jitter_ms: float = 0.0         # variación uniforme adicional (0..jitter_ms)
+    error_rate: float = 0.0        # probabilidad de responder 500
+    rate_limit_rate: float = 0.0   # probabilidad de responder 429 con Retry-After
+    retry_after: int = 1
+    orders: int = 200              # volumen de órdenes sintéticas
+    days: int = 30                 # rango de fechas de las órdenes
+    pdf_kb: int = 40               # tamaño de los PDFs servidos por Haulmer
+    seed: int = 42
+
+    @classmethod
+    def from_env(cls) -> "FakeConfig":
+        """FAKE_LATENCY_MS, FAKE_ERROR_RATE, FAKE_RATE_LIMIT_RATE, FAKE_ORDERS, ..."""
+        values: Dict[str, Any] = {}
+        for f in fields(cls):
+            raw = os.environ.get(f"FAKE_{f.name.upper()}")
+            if raw not in (None, ""):
+                values[f.name] = type(f.default)(raw)
+        return cls(**values)
+
+    def update(self, data: Dict[str, Any]) -> None:
+        for f in fields(self):
+            if f.name in data:
+                setattr(self, f.name, type(f.default)(data[f.name]))
+
+
+def install_faults(app: Flask, config: FakeConfig) -> None:
+    """Latencia, 500 y 429 inyectados antes de cada petición, más los endpoints /_fake/*."""
+    rng = random.Random(config.seed)
+    lock = threading.Lock()
+
+    @app.before_request
+    def _inject():
+        if request.path.startswith("/_fake/"):
+            return None
+        delay = config.latency_ms + (rng.uniform(0, config.jitter_ms) if config.jitter_ms else 0)
+        if delay:
+            time.sleep(delay / 1000.0)
+        with lock:
+            roll = rng.random()
+        if roll < config.rate_limit_rate:
+            resp = jsonify({"message": "Too Many Requests", "error": "rate_limited", "status": 429})
+            resp.status_code = 429
+            resp.headers["Retry-After"] = str(config.retry_after)
+            return resp
+        if roll < config.rate_limit_rate + config.error_rate:
+            return jsonify({"message": "Injected failure", "error": "internal_error", "status": 500}), 500
+        return None
+
+    @app.route("/_fake/config", methods=["GET", "POST"])
+    def _fake_config():
+        if request.method == "POST":
+            config.update(request.get_json() or {})
+        return jsonify(asdict(config))
+
+
+def synthetic_orders(config: FakeConfig) -> list:
+    """
+    Órdenes deterministas (misma seed → mismos datos): id, monto, fecha de creación y
+    cantidad de ítems. Cada servidor las adapta a su propio formato.
+    """
+    rng = random.Random(config.seed)
+    now = datetime.now(timezone.utc).replace(microsecond=0)
+    span = max(1, config.days * 24 * 3600)
+    orders = []
+    for i in range(config.orders):
+        created = now - timedelta(seconds=int(span * (i + 1) / (config.orders + 1)))
+        orders.append({
+            "n": i,
+            "amount": round(rng.uniform(3_000, 150_000), 0),
+            "created": created,
+            "items": rng.randint(1, 3),
+            # ~1 de cada 4 órdenes comparte pack con la anterior en ML
+            "shared_pack": i > 0 and rng.random() < 0.25,
+        })
+    return orders
+
+
+def fake_pdf(size_kb: int, tag: str = "") -> bytes:
+    """PDF válido de ~size_kb KB (relleno como comentario al final)."""
+    body = MINIMAL_PDF + f"% {tag}\n".encode()
+    pad = max(0, size_kb * 1024 - len(body))
+    return body + (b"%" + b"0" * 78 + b"\n") * (pad // 80)
+
+
+def serve_in_thread(app: Flask, host: str = "127.0.0.1", port: int = 0) -> Tuple[str, Any]:
+    """Levanta la app en un hilo daemon. Devuelve (base_url, server); server.shutdown() la detiene."""
+    server = make_server(host, port, app, threaded=True)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    return f"http://{host}:{server.server_port}", server
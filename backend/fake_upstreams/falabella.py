@@ -0,0 +1,209 @@
+"""
+Falso Falabella Seller Center: GetOrders, GetOrderItems, GetMultipleOrderItems, GetInvoice,
+GetDocument (firmados)
+y SetInvoicePDF (POST /v1/marketplace-sellers/invoice/pdf con firma en headers).
+
+La firma se verifica igual que la API real: HMAC-SHA256 de los parámetros ordenados
+(RFC 3986) con la API key. Cualquier UserID es válido si firma con la key configurada.
+"""
+from __future__ import annotations
+
+import base64
+import hashlib
+import hmac
+import threading
+from datetime import datetime, timezone
+from typing import Any, Dict, Optional
+from urllib.parse import quote, unquote
+
+from flask import Flask, jsonify, request
+
+from fake_upstreams.common import FakeConfig, fake_pdf, install_faults, synthetic_orders
+
+DEFAULT_API_KEY = "fake-api-key"
+ORDER_ID_BASE = 3_000_000_000
+
+
+def _sign(params: Dict[str, str], api_key: str) -> str:
+    pairs = [f"{quote(k, safe='-_.~')}={quote(params[k], safe='-_.~')}" for k in sorted(params)]
+    return hmac.new(api_key.encode(), "&".join(pairs).encode(), hashlib.sha256).hexdigest()
+
+
+def _error(code: str, message: str):
+    # Seller Center responde los errores de negocio con HTTP 200 y ErrorResponse en el body
+    return jsonify({"ErrorResponse": {"Head": {"ErrorCode": code, "ErrorMessage": message}}})
+
+
+def _success(action: str, body: Dict[str, Any], **head: Any):
+    return jsonify({
+        "SuccessResponse": {
+            "Head": {"RequestAction": action, "Timestamp": datetime.now(timezone.utc).isoformat(), **head},
+            "Body": body,
+        }
+    })
+
+
+def _parse_ts(value: Optional[str]) -> Optional[datetime]:
+    if not value:
+        return None
+    try:
+        ts = datetime.fromisoformat(value.replace("Z", "+00:00"))
+    except ValueError:
+        return None
+    return ts if ts.tzinfo else ts.replace(tzinfo=timezone.utc)
+
+
+def create_falabella_app(config: Optional[FakeConfig] = None, api_key: str = DEFAULT_API_KEY) -> Flask:
+    config = config or FakeConfig.from_env()
+    app = Flask("fake_falabella")
+    install_faults(app, config)
+
+    lock = threading.Lock()
+    state: Dict[str, Any] = {"invoices": {}, "orders": None, "orders_for": None}
+
+    def orders() -> list:
+        # Se regeneran si cambió el volumen o la seed vía /_fake/config
+        key = (config.orders, config.days, config.seed)
+        with lock:
+            if state["orders_for"] != key:
+                state["orders"] = synthetic_orders(config)
+                state["orders_for"] = key
+            return state["orders"]
+
+    def order_by_id(order_id: str) -> Optional[dict]:
+        try:
+            n = int(order_id) - ORDER_ID_BASE
+        except (TypeError, ValueError):
+            return None
+        data = orders()
+        return data[n] if 0 <= n < len(data) else None
+
+    def order_doc(o: dict) -> dict:
+        created = o["created"].strftime("%Y-%m-%d %H:%M:%S")
+        return {
+            "OrderId": ORDER_ID_BASE + o["n"],
+            "OrderNumber": str(1000 + o["n"]),
+            "Price": f"{o['amount']:.2f}",
+            "CreatedAt": created,
+            "UpdatedAt": created,
+            "ItemsCount": o["items"],
+            "Statuses": {"Status": "ready_to_ship"},
+            "CustomerFirstName": "Cliente",
+            "CustomerLastName": f"Sintético {o['n']}",
+        }
+
+    def items_doc(o: dict) -> list:
+        order_id = ORDER_ID_BASE + o["n"]
+        share = round(o["amount"] / o["items"], 2)
+        return [{
+            "OrderItemId": order_id * 10 + i,
+            "OrderId": order_id,
+            "Sku": f"SKU-{o['n']}-{i}",
+            "Name": f"Producto {i + 1}",
+            "ItemPrice": f"{share:.2f}",
+            "PaidPrice": f"{share:.2f}",
+            "Status": "ready_to_ship",
+        } for i in range(o["items"])]
+
+    @app.route("/", methods=["GET", "POST"])
+    def api():
+        params = {k: ",".join(request.args.getlist(k)) for k in request.args if k != "Signature"}
+        if request.args.get("Signature") != _sign(params, api_key):
+            return _error("E007", "Login failed. Signature mismatching")
+        action = params.get("Action")
+        handler = actions.get(action or "")
+        if not handler:
+            return _error("E008", f"Invalid Action: {action}")
+        return handler(params)
+
+    def get_orders(params: Dict[str, str]):
+        created_after = _parse_ts(params.get("CreatedAfter"))
+        updated_after = _parse_ts(params.get("UpdatedAfter"))
+        if not created_after and not updated_after:
+            return _error("E014", "CreatedAfter or UpdatedAfter is required")
+        since = min(t for t in (created_after, updated_after) if t)
+        limit = min(int(params.get("Limit") or 100), 100)
+        offset = int(params.get("Offset") or 0)
+        matching = [o for o in orders() if o["created"] >= since]
+        page = [order_doc(o) for o in matching[offset:offset + limit]]
+        return _success("GetOrders", {"Orders": {"Order": page}}, ResponseType="Orders", TotalCount=len(matching))
+
+    def get_order_items(params: Dict[str, str]):
+        o = order_by_id(params.get("OrderId", ""))
+        if not o:
+            return _error("E016", "Invalid Order ID")
+        return _success("GetOrderItems", {"OrderItems": {"OrderItem": items_doc(o)}})
+
+    def get_multiple_order_items(params: Dict[str, str]):
+        raw = params.get("OrderIdList", "").strip("[]")
+        ids = [x.strip() for x in raw.split(",") if x.strip()]
+        if not ids:
+            return _error("E056", "OrderIdList is required")
+        found = [order_by_id(i) for i in ids]
+        if any(o is None for o in found):
+            return _error("E016", "Invalid Order ID")
+        return _success("GetMultipleOrderItems", {"Orders": {"Order": [{
+            "OrderId": ORDER_ID_BASE + o["n"],
+            "OrderNumber": str(1000 + o["n"]),
+            "OrderItems": {"OrderItem": items_doc(o)},
+        } for o in found]}})
+
+    def get_invoice(params: Dict[str, str]):
+        order_id = params.get("OrderId", "")
+        if not order_by_id(order_id):
+            return _error("E016", "Invalid Order ID")
+        with lock:
+            invoice = state["invoices"].get(str(order_id))
+        if not invoice:
+            return _error("E035", "Invoice not found")
+        return _success("GetInvoice", {"InvoiceNumber": invoice["invoiceNumber"], "InvoiceDate": invoice["invoiceDate"]})
+
+    def get_document(params: Dict[str, str]):
+        if params.get("DocumentType") != "shippingParcel" or not params.get("OrderItemIds"):
+            return _error("E018", "Invalid DocumentType or OrderItemIds")
+        label = base64.b64encode(fake_pdf(8, "label " + params["OrderItemIds"])).decode()
+        return _success("GetDocument", {"Document": {
+            "DocumentType": "shippingParcel", "MimeType": "application/pdf", "File": label,
+        }})
+
+    actions = {
+        "GetOrders": get_orders,
+        "GetOrderItems": get_order_items,
+        "GetMultipleOrderItems": get_multiple_order_items,
+        "GetInvoice": get_invoice,
+        "GetDocument": get_document,
+    }
+
+    @app.route("/v1/marketplace-sellers/invoice/pdf", methods=["POST"])
+    def set_invoice_pdf():
+        signed = {k: request.headers.get(k, "") for k in ("Action", "Format", "Service", "Timestamp", "UserID", "Version")}
+        if unquote(request.headers.get("Signature", "")) != _sign(signed, api_key):
+            return jsonify({"message": "Signature mismatching"}), 401
+        body = request.get_json(silent=True) or {}
+        item_ids = body.get("orderItemIds") or []
+        if not item_ids:
+            return jsonify({"message": "orderItemIds is required"}), 400
+        try:
+            pdf = base64.b64decode(body.get("invoiceDocument") or "", validate=True)
+        except ValueError:
+            return jsonify({"message": "invoiceDocument must be base64"}), 400
+        if not pdf.startswith(b"%PDF"):
+            return jsonify({"message": "invoiceDocument is not a PDF"}), 400
+        order_ids = {str(int(x) // 10) for x in item_ids}
+        if len(order_ids) != 1 or not order_by_id(next(iter(order_ids))):
+            return jsonify({"message": "orderItemIds must belong to one existing order"}), 400
+        with lock:
+            state["invoices"][order_ids.pop()] = {
+                "invoiceNumber": body.get("invoiceNumber"),
+                "invoiceDate": body.get("invoiceDate"),
+                "invoiceType": body.get("invoiceType"),
+                "size": len(pdf),
+            }
+        return jsonify({"message": "Invoice uploaded successfully"})
+
+    @app.route("/_fake/state", methods=["GET"])
+    def _state():
+        with lock:
+            return jsonify({"orders": config.orders, "invoices": len(state["invoices"])})
+
+    return app
@@ -0,0 +1,81 @@
+"""
+Falso Haulmer (OpenFactura): POST /v2/dte/document emite un DTE con folio correlativo y
+devuelve pdf_url/xml_url que apuntan a este mismo servidor (GET /files/<folio>.pdf|xml).
+
+Respeta el header Idempotency-Key: la misma key devuelve el mismo documento sin emitir otro.
+"""
+from __future__ import annotations
+
+import threading
+from typing import Any, Dict, Optional
+
+from flask import Flask, Response, jsonify, request
+
+from fake_upstreams.common import FakeConfig, fake_pdf, install_faults
+
+
+def create_haulmer_app(config: Optional[FakeConfig] = None) -> Flask:
+    config = config or FakeConfig.from_env()
+    app = Flask("fake_haulmer")
+    install_faults(app, config)
+
+    lock = threading.Lock()
+    state: Dict[str, Any] = {"next_folio": 1, "documents": {}, "by_key": {}}
+
+    @app.route("/v2/dte/document", methods=["POST"])
+    def emit():
+        if not request.headers.get("Authorization", "").startswith("Bearer "):
+            return jsonify({"error": {"message": "apikey inválida", "code": "OF-01"}}), 401
+        payload = request.get_json(silent=True) or {}
+        tipo = payload.get("tipo")
+        try:
+            monto = float(payload.get("monto") or 0)
+        except (TypeError, ValueError):
+            monto = 0
+        if tipo not in ("boleta", "factura") or monto <= 0:
+            return jsonify({"error": {"message": "tipo o monto inválido", "code": "OF-10"}}), 400
+
+        key = request.headers.get("Idempotency-Key")
+        base = request.host_url.rstrip("/")
+        with lock:
+            if key and key in state["by_key"]:
+                doc = state["documents"][state["by_key"][key]]
+                return jsonify({**doc, "idempotent_replay": True})
+            folio = state["next_folio"]
+            state["next_folio"] += 1
+            doc = {
+                "folio": folio,
+                "tipo": tipo,
+                "monto": monto,
+                "descripcion": payload.get("descripcion"),
+                "pdf_url": f"{base}/files/{folio}.pdf",
+                "xml_url": f"{base}/files/{folio}.xml",
+            }
+            state["documents"][folio] = doc
+            if key:
+                state["by_key"][key] = folio
+        return jsonify(doc)
+
+    @app.route("/files/<int:folio>.pdf", methods=["GET"])
+    def pdf(folio: int):
+        with lock:
+            known = folio in state["documents"]
+        if not known:
+            return jsonify({"error": {"message": "documento no encontrado"}}), 404
+        return Response(fake_pdf(config.pdf_kb, f"folio {folio}"), mimetype="application/pdf")
+
+    @app.route("/files/<int:folio>.xml", methods=["GET"])
+    def xml(folio: int):
+        with lock:
+            doc = state["documents"].get(folio)
+        if not doc:
+            return jsonify({"error": {"message": "documento no encontrado"}}), 404
+        body = f'<?xml version="1.0" encoding="ISO-8859-1"?><DTE><Folio>{folio}</Folio><MntTotal>{doc["monto"]:.0f}</MntTotal></DTE>'
+        return Response(body, mimetype="application/xml")
+
+    @app.route("/_fake/state", methods=["GET"])
+    def _state():
+        with lock:
+            return jsonify({"emitted": len(state["documents"]), "idempotency_keys": len(state["by_key"])})
+
+    return app
@@ -0,0 +1,180 @@
+"""
+Falso Mercado Libre: GET /marketplace/orders/search (con proyección `attributes`),
+GET /orders/{id}, GET|POST /packs/{pack_id}/fiscal_documents y POST /oauth/token.
+
+Las órdenes traen el documento completo (buyer, shipping, payments, order_items) para que
+la proyección tenga efecto medible. ~1 de cada 4 comparte pack con la anterior.
+"""
+from __future__ import annotations
+
+import secrets
+import threading
+from datetime import datetime, timezone
+from typing import Any, Dict, Optional
+
+from flask import Flask, jsonify, request
+
+from fake_upstreams.common import FakeConfig, install_faults, synthetic_orders
+
+ORDER_ID_BASE = 2_000_000_000
+PACK_ID_BASE = 4_000_000_000
+MAX_FISCAL_DOCUMENT = 1024 * 1024
+DEFAULT_SELLER_ID = "123456789"
+
+
+def _ml_error(status: int, message: str, error: str):
+    return jsonify({"message": message, "error": error, "status": status, "cause": []}), status
+
+
+def create_ml_app(config: Optional[FakeConfig] = None, seller_id: str = DEFAULT_SELLER_ID) -> Flask:
+    config = config or FakeConfig.from_env()
+    app = Flask("fake_mercadolibre")
+    install_faults(app, config)
+
+    lock = threading.Lock()
+    state: Dict[str, Any] = {"fiscal_documents": {}, "orders": None, "orders_for": None}
+
+    def orders() -> list:
+        key = (config.orders, config.days, config.seed)
+        with lock:
+            if state["orders_for"] != key:
+                data = synthetic_orders(config)
+                leader = 0
+                sizes: Dict[int, int] = {}
+                for o in data:
+                    leader = leader if o["shared_pack"] else o["n"]
+                    o["leader"] = leader
+                    sizes[leader] = sizes.get(leader, 0) + 1
+                for o in data:
+                    o["pack_id"] = PACK_ID_BASE + o["leader"] if sizes[o["leader"]] > 1 else None
+                state["orders"] = data
+                state["orders_for"] = key
+            return state["orders"]
+
+    def order_doc(o: dict) -> dict:
+        order_id = ORDER_ID_BASE + o["n"]
+        created = o["created"].isoformat()
+        return {
+            "id": order_id,
+            "status": "paid",
+            "date_created": created,
+            "date_closed": created,
+            "last_updated": created,
+            "total_amount": o["amount"],
+            "paid_amount": o["amount"],
+            "currency_id": "CLP",
+            "pack_id": o["pack_id"],
+            "seller": {"id": int(seller_id)},
+            "buyer": {"id": 900000 + o["n"], "nickname": f"COMPRADOR{o['n']}"},
+            "shipping": {"id": 5_000_000_000 + o["n"]},
+            "payments": [{
+                "id": 6_000_000_000 + o["n"], "status": "approved",
+                "transaction_amount": o["amount"], "payment_method_id": "visa",
+                "date_approved": created,
+            }],
+            "order_items": [{
+                "item": {"id": f"MLC{100000 + o['n'] * 10 + i}", "title": f"Producto {i + 1}", "seller_sku": f"SKU-{i}"},
+                "quantity": 1,
+                "unit_price": round(o["amount"] / o["items"], 0),
+            } for i in range(o["items"])],
+            "tags": ["paid", "not_delivered"],
+        }
+
+    def _authorized() -> bool:
+        auth = request.headers.get("Authorization", "")
+        return auth.startswith("Bearer ") and len(auth) > len("Bearer ")
+
+    @app.before_request
+    def _auth():
+        if request.path.startswith("/_fake/") or request.path == "/oauth/token":
+            return None
+        if not _authorized():
+            return _ml_error(401, "invalid access token", "unauthorized")
+        return None
+
+    @app.route("/marketplace/orders/search", methods=["GET"])
+    def orders_search():
+        limit = min(int(request.args.get("limit", 50)), 51)
+        offset = int(request.args.get("offset", 0))
+        data = orders()
+        if request.args.get("sort") == "date_asc":
+            data = list(reversed(data))
+        page = [order_doc(o) for o in data[offset:offset + limit]]
+        payload: Dict[str, Any] = {
+            "query": request.args.get("seller", seller_id),
+            "results": page,
+            "paging": {"total": len(data), "offset": offset, "limit": limit},
+            "sort": {"id": request.args.get("sort", "date_desc")},
+        }
+        attributes = [a.strip() for a in (request.args.get("attributes") or "").split(",") if a.strip()]
+        if attributes:
+            result_fields = {a.split(".", 1)[1] for a in attributes if a.startswith("results.")}
+            payload = {k: v for k, v in payload.items() if k in attributes}
+            if result_fields:
+                payload["results"] = [{k: v for k, v in r.items() if k in result_fields} for r in page]
+        return jsonify(payload)
+
+    @app.route("/orders/<int:order_id>", methods=["GET"])
+    def get_order(order_id: int):
+        n = order_id - ORDER_ID_BASE
+        data = orders()
+        if not 0 <= n < len(data):
+            return _ml_error(404, f"Order {order_id} not found", "not_found")
+        return jsonify(order_doc(data[n]))
+
+    def _known_pack(pack_id: int) -> bool:
+        return any(pack_id in (o["pack_id"], ORDER_ID_BASE + o["n"]) for o in orders())
+
+    @app.route("/packs/<int:pack_id>/fiscal_documents", methods=["GET"])
+    def get_fiscal_documents(pack_id: int):
+        with lock:
+            docs = list(state["fiscal_documents"].get(pack_id, []))
+        if not docs:
+            return _ml_error(404, "Fiscal documents not found", "not_found")
+        return jsonify({"pack_id": pack_id, "fiscal_documents": docs})
+
+    @app.route("/packs/<int:pack_id>/fiscal_documents", methods=["POST"])
+    def upload_fiscal_document(pack_id: int):
+        upload = request.files.get("fiscal_document")
+        if upload is None:
+            return _ml_error(400, "fiscal_document is required", "bad_request")
+        content = upload.read()
+        if len(content) > MAX_FISCAL_DOCUMENT:
+            return _ml_error(400, "File exceeds 1 MB", "file_too_large")
+        if not content.startswith(b"%PDF"):
+            return _ml_error(400, "Invalid file type", "invalid_file")
+        if not _known_pack(pack_id):
+            return _ml_error(404, f"Pack {pack_id} not found", "not_found")
+        doc_id = secrets.token_hex(12)
+        with lock:
+            docs = state["fiscal_documents"].setdefault(pack_id, [])
+            if docs:
+                return _ml_error(400, "Pack already has a fiscal document", "fiscal_document_already_uploaded")
+            docs.append({
+                "id": doc_id,
+                "file_name": upload.filename,
+                "size": len(content),
+                "date_created": datetime.now(timezone.utc).isoformat(),
+            })
+        return jsonify({"ids": [doc_id]}), 201
+
+    @app.route("/oauth/token", methods=["POST"])
+    def oauth_token():
+        grant = request.form.get("grant_type")
+        if grant not in ("authorization_code", "refresh_token"):
+            return _ml_error(400, "unsupported grant_type", "invalid_grant")
+        return jsonify({
+            "access_token": f"APP_USR-fake-{secrets.token_hex(8)}",
+            "refresh_token": f"TG-fake-{secrets.token_hex(8)}",
+            "token_type": "Bearer",
+            "expires_in": 21600,
+            "user_id": int(seller_id),
+            "scope": "offline_access read write",
+        })
+
+    @app.route("/_fake/state", methods=["GET"])
+    def _state():
+        with lock:
+            return jsonify({"orders": config.orders, "packs_with_documents": len(state["fiscal_documents"])})
+
+    return app
@@ -6,7 +6,7 @@ import sys
 
 sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 from app import create_app, db
-from app.models import User, Sale, Document
+from app.models import User, Sale, Document, UpstreamUsage, ProcessingJob, ProcessingJobItem, UploadTask, SaleItem
 from alembic import context
 
 config = context.config
@@ -0,0 +1,35 @@
+"""Add upstream_usage (ledger de llamadas externas por tenant)
+
+Revision ID: 006
+Revises: 005
+Create Date: 2026-10-19
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = "006"
+down_revision = "005"
+
+
+def upgrade():
+    op.create_table(
+        "upstream_usage",
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column("user_id", sa.Integer(), sa.ForeignKey("users.id"), nullable=False),
+        sa.Column("service", sa.String(32), nullable=False),
+        sa.Column("operation", sa.String(64), nullable=False),
+        sa.Column("period_start", sa.DateTime(), nullable=False),
+        sa.Column("calls", sa.BigInteger(), nullable=False, server_default="0"),
+        sa.Column("errors", sa.BigInteger(), nullable=False, server_default="0"),
+        sa.Column("latency_ms", sa.BigInteger(), nullable=False, server_default="0"),
+        sa.Column("bytes_in", sa.BigInteger(), nullable=False, server_default="0"),
+        sa.Column("bytes_out", sa.BigInteger(), nullable=False, server_default="0"),
+        sa.UniqueConstraint("user_id", "service", "operation", "period_start", name="uq_usage_user_op_period"),
+    )
+    op.create_index("ix_upstream_usage_period_start", "upstream_usage", ["period_start"])
+
+
+def downgrade():
+    op.drop_index("ix_upstream_usage_period_start", table_name="upstream_usage")
+    op.drop_table("upstream_usage")
@@ -0,0 +1,57 @@
+"""Add processing_jobs y processing_job_items (cola de POST /auto/process)
+
+Revision ID: 007
+Revises: 006
+Create Date: 2026-10-19
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = "007"
+down_revision = "006"
+
+
+def upgrade():
+    op.create_table(
+        "processing_jobs",
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column("user_id", sa.Integer(), sa.ForeignKey("users.id"), nullable=False),
+        sa.Column("kind", sa.String(32), nullable=False, server_default="process"),
+        sa.Column("status", sa.String(16), nullable=False, server_default="queued"),
+        sa.Column("payload", sa.JSON(), nullable=True),
+        sa.Column("result", sa.JSON(), nullable=True),
+        sa.Column("error_message", sa.Text(), nullable=True),
+        sa.Column("total", sa.Integer(), nullable=False, server_default="0"),
+        sa.Column("processed", sa.Integer(), nullable=False, server_default="0"),
+        sa.Column("skipped", sa.Integer(), nullable=False, server_default="0"),
+        sa.Column("failed", sa.Integer(), nullable=False, server_default="0"),
+        sa.Column("attempts", sa.Integer(), nullable=False, server_default="0"),
+        sa.Column("worker_id", sa.String(128), nullable=True),
+        sa.Column("created_at", sa.DateTime(), nullable=True),
+        sa.Column("started_at", sa.DateTime(), nullable=True),
+        sa.Column("heartbeat_at", sa.DateTime(), nullable=True),
+        sa.Column("finished_at", sa.DateTime(), nullable=True),
+    )
+    op.create_index("ix_processing_jobs_user_id", "processing_jobs", ["user_id"])
+    op.create_index("ix_processing_jobs_status_created", "processing_jobs", ["status", "created_at"])
+
+    op.create_table(
+        "processing_job_items",
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column("job_id", sa.Integer(), sa.ForeignKey("processing_jobs.id", ondelete="CASCADE"), nullable=False),
+        sa.Column("id_venta", sa.String(120), nullable=False),
+        sa.Column("platform", sa.String(32), nullable=True),
+        sa.Column("status", sa.String(16), nullable=False, server_default="Pendiente"),
+        sa.Column("error", sa.Text(), nullable=True),
+        sa.Column("updated_at", sa.DateTime(), nullable=True),
+    )
+    op.create_index("ix_processing_job_items_job_id", "processing_job_items", ["job_id"])
+
+
+def downgrade():
+    op.drop_index("ix_processing_job_items_job_id", table_name="processing_job_items")
+    op.drop_table("processing_job_items")
+    op.drop_index("ix_processing_jobs_status_created", table_name="processing_jobs")
+    op.drop_index("ix_processing_jobs_user_id", table_name="processing_jobs")
+    op.drop_table("processing_jobs")
@@ -0,0 +1,22 @@
+"""Add sales.emission_key y sales.emission_started_at (intención de emisión idempotente)
+
+Revision ID: 008
+Revises: 007
+Create Date: 2026-10-19
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = "008"
+down_revision = "007"
+
+
+def upgrade():
+    op.add_column("sales", sa.Column("emission_key", sa.String(64), nullable=True))
+    op.add_column("sales", sa.Column("emission_started_at", sa.DateTime(), nullable=True))
+
+
+def downgrade():
+    op.drop_column("sales", "emission_started_at")
+    op.drop_column("sales", "emission_key")
@@ -0,0 +1,44 @@
+"""Add upload_tasks (outbox de subidas) y sales.upload_status
+
+Revision ID: 009
+Revises: 008
+Create Date: 2026-10-19
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = "009"
+down_revision = "008"
+
+
+def upgrade():
+    op.add_column("sales", sa.Column("upload_status", sa.String(16), nullable=True))
+    # Ventas ya cargadas antes del outbox
+    op.execute("UPDATE sales SET upload_status = 'Cargado' WHERE document_uploaded_at IS NOT NULL")
+
+    op.create_table(
+        "upload_tasks",
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column("user_id", sa.Integer(), sa.ForeignKey("users.id"), nullable=False),
+        sa.Column("sale_id", sa.Integer(), sa.ForeignKey("sales.id"), nullable=False),
+        sa.Column("platform", sa.String(32), nullable=False),
+        sa.Column("pack_id", sa.String(64), nullable=True),
+        sa.Column("pdf_url", sa.String(500), nullable=False),
+        sa.Column("status", sa.String(16), nullable=False, server_default="pending"),
+        sa.Column("attempts", sa.Integer(), nullable=False, server_default="0"),
+        sa.Column("next_attempt_at", sa.DateTime(), nullable=False, server_default=sa.func.now()),
+        sa.Column("last_error", sa.Text(), nullable=True),
+        sa.Column("created_at", sa.DateTime(), nullable=True),
+        sa.Column("updated_at", sa.DateTime(), nullable=True),
+        sa.UniqueConstraint("sale_id", name="uq_upload_tasks_sale_id"),
+    )
+    op.create_index("ix_upload_tasks_user_id", "upload_tasks", ["user_id"])
+    op.create_index("ix_upload_tasks_status_next_attempt", "upload_tasks", ["status", "next_attempt_at"])
+
+
+def downgrade():
+    op.drop_index("ix_upload_tasks_status_next_attempt", table_name="upload_tasks")
+    op.drop_index("ix_upload_tasks_user_id", table_name="upload_tasks")
+    op.drop_table("upload_tasks")
+    op.drop_column("sales", "upload_status")
@@ -0,0 +1,29 @@
+"""Add sales.error_kind, attempts, next_attempt_at e índice parcial de reintentos
+
+Revision ID: 010
+Revises: 009
+Create Date: 2026-10-19
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = "010"
+down_revision = "009"
+
+
+def upgrade():
+    op.add_column("sales", sa.Column("error_kind", sa.String(16), nullable=True))
+    op.add_column("sales", sa.Column("attempts", sa.Integer(), nullable=False, server_default="0"))
+    op.add_column("sales", sa.Column("next_attempt_at", sa.DateTime(), nullable=True))
+    op.create_index(
+        "ix_sales_retry_due", "sales", ["next_attempt_at"],
+        postgresql_where=sa.text("status = 'Error' AND next_attempt_at IS NOT NULL"),
+    )
+
+
+def downgrade():
+    op.drop_index("ix_sales_retry_due", table_name="sales")
+    op.drop_column("sales", "next_attempt_at")
+    op.drop_column("sales", "attempts")
+    op.drop_column("sales", "error_kind")
@@ -0,0 +1,24 @@
+"""Add processing_jobs.idempotency_key (único por usuario)
+
+Revision ID: 011
+Revises: 010
+Create Date: 2026-10-19
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = "011"
+down_revision = "010"
+
+
+def upgrade():
+    op.add_column("processing_jobs", sa.Column("idempotency_key", sa.String(128), nullable=True))
+    op.create_unique_constraint(
+        "uq_processing_jobs_user_idempotency_key", "processing_jobs", ["user_id", "idempotency_key"],
+    )
+
+
+def downgrade():
+    op.drop_constraint("uq_processing_jobs_user_idempotency_key", "processing_jobs", type_="unique")
+    op.drop_column("processing_jobs", "idempotency_key")
@@ -0,0 +1,33 @@
+"""Add sales.pack_id y sale_items (ítems del marketplace guardados al sincronizar)
+
+Revision ID: 012
+Revises: 011
+Create Date: 2026-10-19
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = "012"
+down_revision = "011"
+
+
+def upgrade():
+    op.add_column("sales", sa.Column("pack_id", sa.String(64), nullable=True))
+    op.create_table(
+        "sale_items",
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column("sale_id", sa.Integer(), sa.ForeignKey("sales.id", ondelete="CASCADE"), nullable=False),
+        sa.Column("platform", sa.String(32), nullable=False),
+        sa.Column("item_id", sa.String(64), nullable=False),
+        sa.Column("sku", sa.String(120), nullable=True),
+        sa.Column("created_at", sa.DateTime(), nullable=True),
+        sa.UniqueConstraint("sale_id", "item_id", name="uq_sale_items_sale_item"),
+    )
+    op.create_index("ix_sale_items_sale_id", "sale_items", ["sale_id"])
+
+
+def downgrade():
+    op.drop_index("ix_sale_items_sale_id", table_name="sale_items")
+    op.drop_table("sale_items")
+    op.drop_column("sales", "pack_id")
@@ -0,0 +1,26 @@
+"""Add documents.pdf_sha256/pdf_size/xml_sha256/xml_size (copia local en el almacén por contenido)
+
+Revision ID: 013
+Revises: 012
+Create Date: 2026-10-19
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = "013"
+down_revision = "012"
+
+
+def upgrade():
+    op.add_column("documents", sa.Column("pdf_sha256", sa.String(64), nullable=True))
+    op.add_column("documents", sa.Column("pdf_size", sa.Integer(), nullable=True))
+    op.add_column("documents", sa.Column("xml_sha256", sa.String(64), nullable=True))
+    op.add_column("documents", sa.Column("xml_size", sa.Integer(), nullable=True))
+
+
+def downgrade():
+    op.drop_column("documents", "xml_size")
+    op.drop_column("documents", "xml_sha256")
+    op.drop_column("documents", "pdf_size")
+    op.drop_column("documents", "pdf_sha256")
@@ -0,0 +1,20 @@
+"""Add users.plan (peso y tope de jobs en el reparto justo de la cola)
+
+Revision ID: 014
+Revises: 013
+Create Date: 2026-10-19
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = "014"
+down_revision = "013"
+
+
+def upgrade():
+    op.add_column("users", sa.Column("plan", sa.String(32), nullable=False, server_default="basic"))
+
+
+def downgrade():
+    op.drop_column("users", "plan")
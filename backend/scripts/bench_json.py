@@ -0,0 +1,125 @@
+#!/usr/bin/env python3
+"""
+Benchmark de serialización JSON: proveedor por defecto de Flask (stdlib) vs app.json_utils.
+
+Payloads (los más grandes que maneja la app):
+  - sales:  /dashboard/sales con 100 ventas por página (Decimal + fechas).
+  - orders: página GetOrders de Falabella con 100 órdenes (decodificación en el cliente).
+  - label:  respuesta /falabella/labels con una etiqueta PDF de ~1 MB en base64.
+
+Uso: cd backend && python3 scripts/bench_json.py [--rounds 200]
+Con JSON_BACKEND=stdlib se mide el fallback sin orjson.
+"""
+import argparse
+import base64
+import json
+import os
+import sys
+import time
+from datetime import date, datetime, timedelta
+from decimal import Decimal
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from flask import Flask
+from flask.json.provider import DefaultJSONProvider
+
+from app import json_utils
+
+
+def _sales_page(n: int = 100) -> dict:
+    now = datetime(2026, 2, 24, 12, 30, 15, 123456)
+    sales = []
+    for i in range(n):
+        sales.append({
+            "id": i,
+            "platform": "Falabella" if i % 2 else "Mercado Libre",
+            "id_venta": f"{3000000000 + i}",
+            "id_orden": f"{3000000000 + i}",
+            "document_date": date(2026, 2, 1) + timedelta(days=i % 28),
+            "monto": Decimal("19990.00") + i,
+            "tipo_doc": "Boleta",
+            "status": "Éxito",
+            "documento": "Cargado",
+            "documento_cargado": True,
+            "document_uploaded_at": now,
+            "error_message": None,
+            "created_at": now,
+        })
+    return {"sales": sales, "total": 10_000, "page": 1, "per_page": n, "total_pages": 10_000 // n}
+
+
+def _legacy_sales_page(page: dict) -> dict:
+    """Lo que hacía _sale_dict antes: convertir a float/isoformat en Python."""
+    out = []
+    for s in page["sales"]:
+        s = dict(s)
+        s["monto"] = float(s["monto"])
+        for k in ("document_date", "document_uploaded_at", "created_at"):
+            s[k] = s[k].isoformat() if s[k] else None
+        out.append(s)
+    return {**page, "sales": out}
+
+
+def _orders_doc(n: int = 100) -> bytes:
+    orders = [{
+        "OrderId": 3000000000 + i, "OrderNumber": str(1000 + i), "Price": "19990.00",
+        "CreatedAt": "2026-02-24 12:30:15", "UpdatedAt": "2026-02-24 13:00:00",
+        "CustomerFirstName": "Nombre", "CustomerLastName": "Apellido Ñandú",
+        "AddressBilling": {"Address1": "Av. Siempre Viva 742", "City": "Santiago", "Country": "Chile"},
+        "AddressShipping": {"Address1": "Av. Siempre Viva 742", "City": "Santiago", "Country": "Chile"},
+        "Statuses": {"Status": "ready_to_ship"}, "ItemsCount": 2, "PaymentMethod": "CreditCard",
+    } for i in range(n)]
+    doc = {"SuccessResponse": {"Head": {"RequestAction": "GetOrders"}, "Body": {"Orders": {"Order": orders}}}}
+    return json.dumps(doc).encode()
+
+
+def _label_payload() -> dict:
+    pdf = os.urandom(768 * 1024)
+    return {"success": True, "mime_type": "application/pdf",
+            "file_base64": base64.b64encode(pdf).decode(), "order_item_ids": [1, 2, 3]}
+
+
+def _timeit(fn, rounds: int) -> float:
+    fn()
+    start = time.perf_counter()
+    for _ in range(rounds):
+        fn()
+    return (time.perf_counter() - start) / rounds * 1000
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rounds", type=int, default=200)
+    args = parser.parse_args()
+
+    app = Flask(__name__)
+    default = DefaultJSONProvider(app)
+
+    sales = _sales_page()
+    orders = _orders_doc()
+    label = _label_payload()
+
+    cases = [
+        ("sales (encode)",
+         lambda: default.dumps(_legacy_sales_page(sales)),
+         lambda: json_utils.dumps_bytes(sales)),
+        ("orders (decode)",
+         lambda: json.loads(orders),
+         lambda: json_utils.loads(orders)),
+        ("label (encode)",
+         lambda: default.dumps(label),
+         lambda: json_utils.dumps_bytes(label)),
+    ]
+
+    print(f"backend: {json_utils.BACKEND}  rounds: {args.rounds}")
+    print(f"{'payload':<18}{'stdlib ms':>12}{'fast ms':>12}{'speedup':>10}")
+    with app.app_context():
+        for name, slow_fn, fast_fn in cases:
+            slow_ms = _timeit(slow_fn, args.rounds)
+            fast_ms = _timeit(fast_fn, args.rounds)
+            print(f"{name:<18}{slow_ms:>12.3f}{fast_ms:>12.3f}{slow_ms / fast_ms:>9.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,54 @@
+"""
+Fixtures compartidas: app con SQLite temporal (sin scheduler) y usuarios de prueba.
+Ejecutar desde backend/: pytest tests/ -v
+"""
+import os
+
+import pytest
+
+os.environ.setdefault("DATABASE_URL", "sqlite:///tmp/test.db")
+
+
+@pytest.fixture
+def app(tmp_path, monkeypatch):
+    from app import create_app, db
+
+    # PDFs/XMLs descargados van a un almacén propio de cada test
+    monkeypatch.setenv("BLOB_STORE_DIR", str(tmp_path / "blobs"))
+
+    app = create_app({
+        "TESTING": True,
+        "SQLALCHEMY_DATABASE_URI": f"sqlite:///{tmp_path / 'test.db'}",
+        "SQLALCHEMY_ENGINE_OPTIONS": {},
+        "SCHEDULER_ENABLED": False,
+        "JWT_SECRET_KEY": "test-secret-key-with-at-least-32-chars",
+    })
+    with app.app_context():
+        db.create_all()
+        yield app
+        db.session.remove()
+        db.drop_all()
+
+
+@pytest.fixture
+def make_user(app):
+    from app import db
+    from app.models import User
+
+    def _make(email="seller@example.com", **fields):
+        user = User(email=email, password_hash="x", **fields)
+        db.session.add(user)
+        db.session.commit()
+        return user
+
+    return _make
+
+
+@pytest.fixture
+def auth_headers(app):
+    from flask_jwt_extended import create_access_token
+
+    def _headers(user):
+        return {"Authorization": f"Bearer {create_access_token(identity=str(user.id))}"}
+
+    return _headers
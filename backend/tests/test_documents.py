@@ -0,0 +1,100 @@
+"""
+Tests del almacén local de documentos: el PDF se descarga de Haulmer una vez, los reintentos
+de subida lo leen de disco y GET /documents/<id>/pdf lo sirve con Range y GET condicional.
+Ejecutar desde backend/: pytest tests/ -v
+"""
+import os
+from datetime import datetime
+
+import pytest
+from cryptography.fernet import Fernet
+
+from app import db
+from app.crypto_utils import encrypt_value
+from app.models import Document, Sale, UploadTask
+from app.services.blob_store import blob_store
+from app.services.upload_checks import upload_checks
+from app.tasks import uploads
+from app.tasks.jobs import run_pending_jobs
+from app.tasks.uploads import drain_upload_tasks
+from fake_upstreams import FakeConfig, create_haulmer_app, serve_in_thread
+from fake_upstreams.mercadolibre import create_ml_app
+
+
+def test_blob_store_deduplicates_by_content(app):
+    store = blob_store()
+    digest, size = store.put(b"%PDF-1.4 uno")
+    assert store.put_stream([b"%PDF-1.4 ", b"uno"]) == (digest, size)
+    assert store.read(digest) == b"%PDF-1.4 uno"
+    files = [f for _, _, names in os.walk(store.root) for f in names]
+    assert files == [digest]
+
+
+@pytest.fixture
+def ml(app, make_user, monkeypatch):
+    monkeypatch.setenv("ENCRYPTION_KEY", Fernet.generate_key().decode())
+    ml_config = FakeConfig(orders=1)
+    haulmer_url, haulmer = serve_in_thread(create_haulmer_app(FakeConfig()))
+    ml_url, server = serve_in_thread(create_ml_app(ml_config))
+    monkeypatch.setenv("HAULMER_API_BASE", haulmer_url)
+    monkeypatch.setenv("ML_API_BASE", ml_url)
+    upload_checks.clear()
+    user = make_user(
+        haulmer_api_key_enc=encrypt_value("fake-haulmer-key"),
+        ml_access_token_enc=encrypt_value("APP_USR-fake"),
+        ml_user_id="123456789",
+    )
+    yield user, ml_config
+    upload_checks.clear()
+    haulmer.shutdown()
+    server.shutdown()
+
+
+def _emit(app, user, auth_headers) -> Sale:
+    resp = app.test_client().post("/auto/process", json={}, headers=auth_headers(user))
+    assert resp.status_code == 202
+    assert run_pending_jobs() == 1
+    return Sale.query.filter_by(user_id=user.id).one()
+
+
+def test_upload_retry_reads_pdf_from_disk(app, ml, auth_headers, monkeypatch):
+    user, ml_config = ml
+    sale = _emit(app, user, auth_headers)
+    downloads = []
+    original = uploads.download_to_store
+    monkeypatch.setattr(uploads, "download_to_store", lambda *a: downloads.append(a) or original(*a))
+
+    # Primera subida falla en ML, pero el PDF ya quedó en el almacén y en el Document
+    ml_config.error_rate = 1.0
+    assert drain_upload_tasks() == 0
+    doc = Document.query.filter_by(sale_id=sale.id).one()
+    assert doc.pdf_sha256 and doc.pdf_size and blob_store().exists(doc.pdf_sha256)
+
+    ml_config.error_rate = 0.0
+    UploadTask.query.update({"next_attempt_at": datetime.utcnow()})
+    db.session.commit()
+    assert drain_upload_tasks() == 1
+    assert len(downloads) == 1
+
+
+def test_document_pdf_supports_range_and_conditional_get(app, ml, auth_headers):
+    user, _ = ml
+    sale = _emit(app, user, auth_headers)
+    doc = Document.query.filter_by(sale_id=sale.id).one()
+    client = app.test_client()
+    url = f"/documents/{doc.id}/pdf"
+
+    # Sin subida previa: se descarga en la primera petición y queda anotado
+    resp = client.get(url, headers=auth_headers(user))
+    assert resp.status_code == 200 and resp.data.startswith(b"%PDF")
+    etag = resp.headers["ETag"]
+    digest = db.session.get(Document, doc.id).pdf_sha256
+    assert digest and digest in etag
+
+    resp = client.get(url, headers={**auth_headers(user), "If-None-Match": etag})
+    assert resp.status_code == 304
+
+    resp = client.get(url, headers={**auth_headers(user), "Range": "bytes=0-3"})
+    assert resp.status_code == 206 and resp.data == b"%PDF"
+
+    assert client.get(f"/documents/{doc.id}/exe", headers=auth_headers(user)).status_code == 404
@@ -0,0 +1,174 @@
+"""
+Tests de clasificación de errores y reintentos programados (next_attempt_at): un error
+transitorio de Haulmer se reintenta solo con un job "retry"; uno de validación no.
+Ejecutar desde backend/: pytest tests/ -v
+"""
+from datetime import datetime, timedelta
+
+import pytest
+import requests
+from cryptography.fernet import Fernet
+from sqlalchemy import event
+
+from app import db
+from app.crypto_utils import encrypt_value
+from app.models import ProcessingJob, Sale
+from app.routes import dashboard
+from app.services import errors
+from app.tasks.jobs import enqueue_due_retries, enqueue_job, run_pending_jobs
+from fake_upstreams import FakeConfig, create_haulmer_app, serve_in_thread
+
+
+def _http_error(status):
+    resp = requests.Response()
+    resp.status_code = status
+    return requests.HTTPError(response=resp)
+
+
+def test_classifier_maps_status_codes_and_network_errors():
+    assert errors.classify_exception(_http_error(503)) == errors.TRANSIENT
+    assert errors.classify_exception(_http_error(429)) == errors.TRANSIENT
+    assert errors.classify_exception(_http_error(401)) == errors.CREDENTIAL
+    assert errors.classify_exception(_http_error(422)) == errors.VALIDATION
+    assert errors.classify_exception(_http_error(418)) == errors.PERMANENT
+    assert errors.classify_exception(requests.ConnectTimeout()) == errors.TRANSIENT
+    assert errors.classify_exception(KeyError("x")) == errors.PERMANENT
+
+
+def test_only_transient_failures_get_a_backoff_schedule():
+    now  = datetime(2026, 1, 1)
+    sale = Sale(attempts=0)
+    errors.record_failure(sale, "503", errors.TRANSIENT, now=now)
+    errors.record_failure(sale, "503", errors.TRANSIENT, now=now)
+    assert (sale.status, sale.attempts) == ("Error", 2)
+    assert sale.next_attempt_at == now + errors.BACKOFF_BASE * 2
+
+    sale.attempts = errors.MAX_ATTEMPTS - 1
+    errors.record_failure(sale, "503", errors.TRANSIENT, now=now)
+    assert sale.next_attempt_at is None
+
+    other = Sale(attempts=0)
+    errors.record_failure(other, "monto inválido", errors.VALIDATION, now=now)
+    assert (other.error_kind, other.next_attempt_at) == ("validation", None)
+
+
+@pytest.fixture
+def flaky_haulmer(app, make_user, monkeypatch):
+    monkeypatch.setenv("ENCRYPTION_KEY", Fernet.generate_key().decode())
+    config = FakeConfig(error_rate=1.0)
+    url, server = serve_in_thread(create_haulmer_app(config))
+    monkeypatch.setenv("HAULMER_API_BASE", url)
+    yield config, make_user(haulmer_api_key_enc=encrypt_value("fake-haulmer-key"))
+    server.shutdown()
+
+
+def test_transient_emission_error_heals_through_a_retry_job(app, flaky_haulmer):
+    config, user = flaky_haulmer
+    enqueue_job(user.id, "process", {"orders": [{"id_venta": "R-1", "monto": 1000}]})
+    run_pending_jobs()
+
+    sale = Sale.query.filter_by(id_venta="R-1").one()
+    assert (sale.status, sale.error_kind, sale.attempts) == ("Error", "transient", 1)
+    assert sale.next_attempt_at > datetime.utcnow()
+    assert enqueue_due_retries() == 0  # aún no vence
+
+    config.error_rate = 0.0
+    sale.next_attempt_at = datetime.utcnow() - timedelta(seconds=1)
+    db.session.commit()
+
+    assert run_pending_jobs() == 1
+    job = ProcessingJob.query.filter_by(kind="retry").one()
+    assert (job.status, job.payload["sale_ids"], job.processed) == ("done", [sale.id], 1)
+    sale = db.session.get(Sale, sale.id)
+    assert (sale.status, sale.error_kind, sale.attempts, sale.next_attempt_at) == ("Éxito", None, 0, None)
+
+
+def test_dashboard_retry_schedules_the_sale_for_the_worker(app, make_user, auth_headers):
+    user = make_user()
+    sale = Sale(user_id=user.id, id_venta="V-9", monto=500, tipo_doc="Boleta", status="Error",
+                error_kind="permanent", attempts=1)
+    db.session.add(sale)
+    db.session.commit()
+
+    resp = app.test_client().post(f"/dashboard/sales/{sale.id}/retry", headers=auth_headers(user))
+    assert resp.status_code == 200
+    assert db.session.get(Sale, sale.id).next_attempt_at is not None
+    assert enqueue_due_retries() == 1
+    assert ProcessingJob.query.filter_by(user_id=user.id, kind="retry").count() == 1
+
+
+def test_bulk_retry_reemits_stored_sales_in_one_job(app, flaky_haulmer, auth_headers):
+    config, user = flaky_haulmer
+    config.error_rate = 0.0
+    later = datetime.utcnow() + timedelta(hours=1)
+    db.session.add_all([
+        Sale(user_id=user.id, id_venta=f"B-{i}", monto=1000 + i, tipo_doc="Boleta", status="Error",
+             platform="Falabella", error_kind="transient", attempts=1, next_attempt_at=later)
+        for i in range(3)
+    ] + [
+        Sale(user_id=user.id, id_venta="B-ML", monto=700, tipo_doc="Boleta", status="Error",
+             platform="Mercado Libre", error_kind="transient", attempts=1),
+        Sale(user_id=user.id, id_venta="B-OK", monto=900, tipo_doc="Boleta", status="Éxito",
+             platform="Falabella"),
+    ])
+    db.session.commit()
+
+    client = app.test_client()
+    resp = client.post("/dashboard/sales/retry", json={"platform": "Falabella"}, headers=auth_headers(user))
+    assert resp.status_code == 202
+    data = resp.get_json()
+    assert (data["sales"], data["remaining"], data["status_url"]) == (3, 0, f"/auto/jobs/{data['job_id']}")
+    # Un segundo clic mientras sigue en cola devuelve el mismo job
+    again = client.post("/dashboard/sales/retry", json={"platform": "Falabella"}, headers=auth_headers(user))
+    assert again.get_json()["job_id"] == data["job_id"]
+    assert Sale.query.filter(Sale.next_attempt_at.isnot(None)).count() == 0
+
+    assert run_pending_jobs() == 1
+    job = db.session.get(ProcessingJob, data["job_id"])
+    assert (job.kind, job.status, job.processed) == ("retry", "done", 3)
+    statuses = dict(db.session.query(Sale.id_venta, Sale.status))
+    assert statuses == {"B-0": "Éxito", "B-1": "Éxito", "B-2": "Éxito", "B-ML": "Error", "B-OK": "Éxito"}
+
+
+def test_bulk_retry_by_ids_only_takes_sales_in_error(app, make_user, auth_headers):
+    user = make_user(haulmer_api_key_enc=b"x")
+    ok = Sale(user_id=user.id, id_venta="I-1", monto=500, tipo_doc="Boleta", status="Éxito")
+    db.session.add(ok)
+    db.session.commit()
+
+    client = app.test_client()
+    resp = client.post("/dashboard/sales/retry", json={"sale_ids": [ok.id]}, headers=auth_headers(user))
+    assert resp.status_code == 404
+    resp = client.post("/dashboard/sales/retry", json={"sale_ids": ["x"]}, headers=auth_headers(user))
+    assert resp.status_code == 400
+    assert ProcessingJob.query.count() == 0
+
+
+def test_bulk_retry_by_ids_runs_in_chunks(app, make_user, auth_headers, monkeypatch):
+    monkeypatch.setattr(dashboard, "SALES_IN_CHUNK", 2)
+    user = make_user(haulmer_api_key_enc=b"x")
+    later = datetime.utcnow() + timedelta(hours=1)
+    sales = [
+        Sale(user_id=user.id, id_venta=f"C-{i}", monto=500, tipo_doc="Boleta", status="Error", next_attempt_at=later)
+        for i in range(5)
+    ]
+    db.session.add_all(sales)
+    db.session.commit()
+
+    updates = []
+
+    def record(conn, cursor, statement, params, context, executemany):
+        if statement.lstrip().upper().startswith("UPDATE SALES"):
+            updates.append(statement)
+
+    event.listen(db.engine, "before_cursor_execute", record)
+    try:
+        resp = app.test_client().post("/dashboard/sales/retry", json={"sale_ids": [s.id for s in sales]},
+                                      headers=auth_headers(user))
+    finally:
+        event.remove(db.engine, "before_cursor_execute", record)
+
+    assert resp.status_code == 202
+    assert (resp.get_json()["sales"], resp.get_json()["remaining"]) == (5, 0)
+    assert len(updates) == 3
+    assert Sale.query.filter(Sale.next_attempt_at.isnot(None)).count() == 0
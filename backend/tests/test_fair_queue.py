@@ -0,0 +1,98 @@
+"""
+Tests del reparto justo de la cola entre tenants (app.services.fair_queue): jobs por servicio
+reciente ponderado por plan, tope de jobs en curso y lotes de subidas repartidos por peso.
+Ejecutar desde backend/: pytest tests/ -v
+"""
+from datetime import datetime, timedelta
+
+from app import db
+from app.models import ProcessingJob, Sale, UploadTask
+from app.services import fair_queue
+from app.services.fair_queue import fair_shares
+from app.tasks.jobs import claim_next_job, enqueue_job
+from app.tasks.uploads import claim_upload_tasks
+
+
+def _served(user_id, seconds):
+    """Job terminado hace poco que usó `seconds` de worker."""
+    end = datetime.utcnow() - timedelta(minutes=1)
+    db.session.add(ProcessingJob(
+        user_id=user_id, kind="process", status="done", payload={},
+        created_at=end - timedelta(seconds=seconds), started_at=end - timedelta(seconds=seconds), finished_at=end,
+    ))
+    db.session.commit()
+
+
+def test_fair_shares_split_by_weight_and_pass_on_leftovers():
+    assert fair_shares([(1, 100, 1.0), (2, 100, 1.0)], 10) == {1: 5, 2: 5}
+    assert fair_shares([(1, 100, 1.0), (2, 100, 4.0)], 10) == {1: 2, 2: 8}
+    # Lo que el tenant chico no necesita pasa al grande
+    assert fair_shares([(1, 2, 1.0), (2, 100, 1.0)], 10) == {1: 2, 2: 8}
+    # Más tenants que unidades: reciben los primeros (los que más esperan)
+    assert fair_shares([(i, 5, 1.0) for i in range(1, 6)], 3) == {1: 1, 2: 1, 3: 1}
+    assert fair_shares([], 10) == {}
+
+
+def test_small_tenant_jumps_ahead_of_a_large_backlog(app, make_user):
+    big, small = make_user("big@example.com"), make_user("small@example.com")
+    _served(big.id, 600)
+    backlog = [enqueue_job(big.id, "process", {"orders": [{"id_venta": str(i)}]}) for i in range(5)]
+    late = enqueue_job(small.id, "process", {"orders": []})
+
+    assert claim_next_job("w1").id == late.id
+    # El grande sigue por orden de llegada y con un solo job en curso (tope del plan)
+    assert claim_next_job("w2").id == backlog[0].id
+    assert claim_next_job("w3") is None
+
+
+def test_plan_weight_and_job_cap(app, make_user, monkeypatch):
+    monkeypatch.setattr(fair_queue, "PLAN_MAX_JOBS", {"pro": 2})
+    basic = make_user("basic@example.com")
+    pro = make_user("pro@example.com", plan="pro")
+    _served(basic.id, 300)
+    _served(pro.id, 500)  # 500 / peso 2 = 250 < 300
+    basic_job = enqueue_job(basic.id, "process", {"orders": []})
+    pro_jobs = [enqueue_job(pro.id, "process", {"orders": [{"id_venta": str(i)}]}) for i in range(3)]
+
+    assert claim_next_job("w1").id == pro_jobs[0].id
+    # Con un job en curso el pro acumula servicio; el tope 2 le permite otro si aún le toca
+    claimed = [claim_next_job(f"w{i}").id for i in (2, 3)]
+    assert sorted(claimed) == sorted([basic_job.id, pro_jobs[1].id])
+    assert claim_next_job("w4") is None
+    assert db.session.get(ProcessingJob, pro_jobs[2].id).status == "queued"
+
+
+def test_upload_batch_is_shared_between_tenants(app, make_user):
+    big, small = make_user("big@example.com"), make_user("small@example.com")
+    old = datetime.utcnow() - timedelta(hours=1)
+    for user, n, due in ((big, 30, old), (small, 2, datetime.utcnow())):
+        for i in range(n):
+            sale = Sale(user_id=user.id, id_venta=f"{user.id}-{i}", monto=1000, tipo_doc="Boleta",
+                        status="Éxito", platform="Falabella")
+            db.session.add(sale)
+            db.session.flush()
+            db.session.add(UploadTask(user_id=user.id, sale_id=sale.id, platform="Falabella",
+                                      pdf_url="http://pdf", next_attempt_at=due))
+    db.session.commit()
+
+    claimed = claim_upload_tasks(limit=10)
+    by_user = {u.id: sum(1 for t in claimed if t["user_id"] == u.id) for u in (big, small)}
+    assert by_user == {big.id: 8, small.id: 2}
+
+
+def test_admin_queues_reports_depth_and_wait_per_tenant(app, make_user, auth_headers):
+    admin = make_user("admin@example.com", is_admin=True)
+    seller = make_user("seller@example.com")
+    job = enqueue_job(seller.id, "process", {"orders": []})
+    job.created_at = datetime.utcnow() - timedelta(seconds=90)
+    db.session.commit()
+
+    client = app.test_client()
+    assert client.get("/admin/queues", headers=auth_headers(seller)).status_code == 403
+    data = client.get("/admin/queues", headers=auth_headers(admin)).get_json()
+    assert data["jobs_queued"] == 1
+    tenant = data["tenants"][0]
+    assert (tenant["email"], tenant["plan"], tenant["jobs_queued"], tenant["jobs_running"]) == (
+        "seller@example.com", "basic", 1, 0,
+    )
+    assert tenant["oldest_job_wait_s"] >= 90
@@ -0,0 +1,103 @@
+"""
+Tests de punta a punta de los clientes contra los servidores falsos (fake_upstreams).
+Ejecutar desde backend/: pytest tests/ -v
+"""
+import pytest
+import requests
+
+from app.services.falabella_client import FalabellaClient, parse_order_items_response
+from app.services.haulmer_client import HaulmerClient
+from app.services.mercadolibre_client import ORDER_SUMMARY_FIELDS, MercadoLibreClient
+from fake_upstreams import (
+    FakeConfig, create_falabella_app, create_haulmer_app, create_ml_app, serve_in_thread,
+)
+from fake_upstreams.falabella import DEFAULT_API_KEY
+
+SINCE = "2000-01-01T00:00:00+00:00"
+
+
+@pytest.fixture
+def servers():
+    running = []
+
+    def start(factory, **config):
+        url, server = serve_in_thread(factory(FakeConfig(**config)))
+        running.append(server)
+        return url
+
+    yield start
+    for server in running:
+        server.shutdown()
+
+
+def test_falabella_signed_orders_items_and_invoice_upload(servers):
+    url = servers(create_falabella_app, orders=250)
+    client = FalabellaClient("seller@example.com", DEFAULT_API_KEY, base_url=url)
+
+    page = client.get_orders(created_after=SINCE, limit=100, offset=200, stream=True)
+    assert page["success"]
+    orders = list(page["orders"])
+    assert len(orders) == 50
+
+    order_id = str(orders[0]["OrderId"])
+    items = parse_order_items_response(client.get_order_items(order_id))
+    assert items and all(it["OrderItemId"] for it in items)
+
+    assert client.invoice_uploaded(order_id) is False
+    upload = client.set_invoice_pdf(
+        order_item_ids=[it["OrderItemId"] for it in items],
+        invoice_number="1", invoice_date="2026-01-01", invoice_type="BOLETA",
+        operator_code="FACL", pdf_base64="JVBERi0xLjQK",
+    )
+    assert upload["success"], upload
+    assert client.invoice_uploaded(order_id) is True
+
+
+def test_falabella_rejects_wrong_signature(servers):
+    url = servers(create_falabella_app)
+    result = FalabellaClient("seller@example.com", "otra-key", base_url=url).get_orders(created_after=SINCE)
+    assert not result["success"]
+
+
+def test_ml_projection_and_fiscal_documents(servers):
+    url = servers(create_ml_app, orders=30)
+    client = MercadoLibreClient("APP_USR-test", base_url=url)
+
+    result = client.get_orders(limit=10, attributes=ORDER_SUMMARY_FIELDS)
+    assert result["success"]
+    first = result["data"]["results"][0]
+    assert set(first) <= set(ORDER_SUMMARY_FIELDS) and "buyer" not in first
+
+    pack_id = str(first["pack_id"] or first["id"])
+    assert client.fiscal_document_uploaded(pack_id) is False
+    assert client.upload_fiscal_document(pack_id, b"%PDF-1.4 boleta")["success"]
+    assert client.fiscal_document_uploaded(pack_id) is True
+
+
+def test_haulmer_emission_idempotency_and_pdf(servers):
+    url = servers(create_haulmer_app, pdf_kb=4)
+    haulmer = HaulmerClient("key", base_url=url)
+
+    result = haulmer.emit_document(tipo_doc="Boleta", id_venta="A-1", monto=1990)
+    assert result["success"]
+    pdf = requests.get(result["pdf_url"], timeout=5)
+    assert pdf.ok and pdf.content.startswith(b"%PDF")
+
+
+def test_fault_injection_returns_429(servers):
+    url = servers(create_ml_app, rate_limit_rate=1.0, retry_after=7)
+    resp = requests.get(f"{url}/orders/2000000000", headers={"Authorization": "Bearer x"}, timeout=5)
+    assert resp.status_code == 429
+    assert resp.headers["Retry-After"] == "7"
+
+
+def test_falabella_base_url_override_ignores_legacy_variable(monkeypatch):
+    from app.services import falabella_client
+
+    # .env antiguos traen FALABELLA_API_BASE con un host muerto: no debe usarse
+    monkeypatch.setenv("FALABELLA_API_BASE", "https://api.falabella.com/seller")
+    monkeypatch.delenv("FALABELLA_BASE_URL_OVERRIDE", raising=False)
+    assert FalabellaClient("s", "k").base_url == falabella_client.DEFAULT_BASE_URL
+
+    monkeypatch.setenv("FALABELLA_BASE_URL_OVERRIDE", "http://127.0.0.1:9/")
+    assert FalabellaClient("s", "k").base_url == "http://127.0.0.1:9"
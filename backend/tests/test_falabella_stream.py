@@ -0,0 +1,89 @@
+"""
+Tests del parseo incremental de GetOrders (FalabellaClient modo streaming).
+Ejecutar desde backend/: pytest tests/ -v
+"""
+import json
+
+import pytest
+
+from app.services.falabella_client import FalabellaStreamError, _closing, _JsonItemStream
+from app.tasks.process_orders import _fetch_falabella_orders
+
+
+def _chunks(doc: str, size: int):
+    raw = doc.encode("utf-8")
+    return [raw[i:i + size] for i in range(0, len(raw), size)]
+
+
+def _orders_doc(orders):
+    return json.dumps({
+        "SuccessResponse": {
+            "Head": {"RequestAction": "GetOrders", "ResponseType": "Orders"},
+            "Body": {"Orders": {"Order": orders}},
+        }
+    })
+
+
+def test_stream_yields_each_order_across_chunk_boundaries():
+    orders = [{"OrderId": i, "Price": "1990.00", "Address": {"City": "Ñuñoa"}} for i in range(50)]
+    stream = _JsonItemStream(_chunks(_orders_doc(orders), 7), "Order")
+
+    assert stream.found()
+    assert list(stream) == orders
+
+
+def test_stream_single_order_object():
+    stream = _JsonItemStream(_chunks(_orders_doc({"OrderId": 9}), 5), "Order")
+    assert stream.found()
+    assert list(stream) == [{"OrderId": 9}]
+
+
+def test_stream_without_key_keeps_small_body_for_fallback():
+    doc = json.dumps({"ErrorResponse": {"Head": {"ErrorCode": "E009", "ErrorMessage": "Access Denied"}}})
+    stream = _JsonItemStream(_chunks(doc, 4), "Order")
+
+    assert not stream.found()
+    assert json.loads(stream.buffer)["ErrorResponse"]["Head"]["ErrorCode"] == "E009"
+
+
+def test_stream_cut_between_items_or_inside_a_lone_object_raises():
+    orders = [{"OrderId": i, "Price": "1990.00"} for i in range(5)]
+    doc = _orders_doc(orders)
+    cut = doc.index('{"OrderId": 2')  # justo antes del tercer ítem, sin cerrar la lista
+    stream = _JsonItemStream(_chunks(doc[:cut], 16), "Order")
+    assert stream.found()
+    received = []
+    with pytest.raises(FalabellaStreamError):
+        for order in stream:
+            received.append(order)
+    assert received == orders[:2]
+
+    single = _orders_doc({"OrderId": 9, "Price": "1990.00"})
+    stream = _JsonItemStream(_chunks(single[:single.index('"Price"')], 8), "Order")
+    assert stream.found()
+    with pytest.raises(FalabellaStreamError):
+        list(stream)
+
+
+class _Resp:
+    closed = False
+
+    def close(self):
+        self.closed = True
+
+
+def test_stream_cut_midway_raises_instead_of_ending_as_complete():
+    orders = [{"OrderId": i, "Price": "1990.00"} for i in range(20)]
+    doc = _orders_doc(orders)
+    stream = _JsonItemStream(_chunks(doc[:len(doc) // 2], 64), "Order")
+    resp = _Resp()
+    assert stream.found()
+
+    class _Client:
+        def get_orders(self, **kwargs):
+            return {"success": True, "orders": _closing(stream, resp)}
+
+    # Un listado truncado no llega a la recolección ni a la conciliación como si fuera completo
+    with pytest.raises(FalabellaStreamError):
+        _fetch_falabella_orders(_Client(), "2026-01-01T00:00:00+00:00")
+    assert resp.closed
@@ -0,0 +1,86 @@
+"""
+Tests de la emisión en Haulmer: Idempotency-Key estable, límite de concurrencia por API key
+y reanudación de emisiones que quedaron en "Emitiendo".
+Ejecutar desde backend/: pytest tests/ -v
+"""
+import threading
+import time
+
+import pytest
+from cryptography.fernet import Fernet
+
+from app import db
+from app.crypto_utils import encrypt_value
+from app.models import Document, Sale
+from app.services import haulmer_client
+from app.services.haulmer_client import HaulmerClient, emission_key, emit_documents
+from app.tasks.jobs import enqueue_job, run_pending_jobs
+from fake_upstreams import FakeConfig, create_haulmer_app, serve_in_thread
+
+
+@pytest.fixture
+def haulmer_url():
+    url, server = serve_in_thread(create_haulmer_app(FakeConfig()))
+    yield url
+    server.shutdown()
+
+
+def test_emission_key_is_stable_per_user_sale_and_document_type():
+    assert emission_key(1, "A-1", "Boleta") == emission_key(1, "A-1", "boleta")
+    assert emission_key(1, "A-1", "Boleta") != emission_key(1, "A-1", "Factura")
+    assert emission_key(1, "A-1", "Boleta") != emission_key(2, "A-1", "Boleta")
+
+
+def test_same_idempotency_key_does_not_emit_twice(haulmer_url):
+    client = HaulmerClient("key", base_url=haulmer_url)
+    key = emission_key(1, "A-1", "Boleta")
+    first = client.emit_document("Boleta", "A-1", 1000, idempotency_key=key)
+    again = client.emit_document("Boleta", "A-1", 1000, idempotency_key=key)
+    other = client.emit_document("Boleta", "A-2", 1000, idempotency_key=emission_key(1, "A-2", "Boleta"))
+
+    assert first["success"] and again["raw"].get("idempotent_replay")
+    assert again["pdf_url"] == first["pdf_url"] != other["pdf_url"]
+
+
+def test_concurrent_emissions_are_capped_per_api_key(monkeypatch):
+    monkeypatch.setattr(haulmer_client, "MAX_CONCURRENCY", 2)
+    monkeypatch.setattr(haulmer_client, "_slots", {})
+    lock, active, peak = threading.Lock(), [0], [0]
+
+    def fake_call(op, send, ceiling, hedge=False, tenant=None):
+        with lock:
+            active[0] += 1
+            peak[0] = max(peak[0], active[0])
+        time.sleep(0.03)
+        with lock:
+            active[0] -= 1
+        raise haulmer_client.requests.ConnectionError("sin red")
+
+    monkeypatch.setattr(haulmer_client, "upstream_call", fake_call)
+    docs = [{"tipo_doc": "Boleta", "id_venta": str(i), "monto": 10} for i in range(8)]
+    results = list(emit_documents(HaulmerClient("same-key"), docs, max_workers=8))
+
+    assert len(results) == 8 and not any(r["success"] for _, r in results)
+    assert peak[0] == 2
+
+
+def test_job_resumes_interrupted_emission_with_the_same_key(app, make_user, haulmer_url, monkeypatch):
+    monkeypatch.setenv("ENCRYPTION_KEY", Fernet.generate_key().decode())
+    monkeypatch.setenv("HAULMER_API_BASE", haulmer_url)
+    user = make_user(haulmer_api_key_enc=encrypt_value("fake-haulmer-key"))
+
+    # Primera emisión llegó a Haulmer pero el worker cayó antes de guardar el resultado
+    key = emission_key(user.id, "R-1", "Boleta")
+    emitted = HaulmerClient("fake-haulmer-key", base_url=haulmer_url).emit_document(
+        "Boleta", "R-1", 500, idempotency_key=key,
+    )
+    db.session.add(Sale(user_id=user.id, id_venta="R-1", monto=500, tipo_doc="Boleta",
+                        status="Emitiendo", emission_key=key))
+    db.session.commit()
+
+    enqueue_job(user.id, "process", {"orders": [{"id_venta": "R-1", "monto": 500}]})
+    run_pending_jobs()
+
+    sale = Sale.query.filter_by(id_venta="R-1").one()
+    assert sale.status == "Éxito" and sale.emission_key == key
+    assert Document.query.filter_by(sale_id=sale.id).one().pdf_url == emitted["pdf_url"]
@@ -0,0 +1,245 @@
+"""
+Tests de la cola de jobs: POST /auto/process encola (202), el worker procesa y
+GET /auto/jobs/<id> reporta el avance por orden. Haulmer se simula con fake_upstreams.
+Ejecutar desde backend/: pytest tests/ -v
+"""
+import time
+from datetime import datetime, timedelta
+
+import pytest
+from cryptography.fernet import Fernet
+from sqlalchemy import select
+
+from app.crypto_utils import encrypt_value
+from app.models import ProcessingJob, Sale
+from app import db
+from app.services.locks import user_lock
+from app.tasks.jobs import claim_next_job, enqueue_job, run_job, run_pending_jobs
+from fake_upstreams import FakeConfig, create_haulmer_app, serve_in_thread
+
+
+@pytest.fixture
+def haulmer_user(app, make_user, monkeypatch):
+    monkeypatch.setenv("ENCRYPTION_KEY", Fernet.generate_key().decode())
+    url, server = serve_in_thread(create_haulmer_app(FakeConfig()))
+    monkeypatch.setenv("HAULMER_API_BASE", url)
+    yield make_user(haulmer_api_key_enc=encrypt_value("fake-haulmer-key"))
+    server.shutdown()
+
+
+def test_process_enqueues_and_worker_reports_per_order_progress(app, haulmer_user, auth_headers):
+    client = app.test_client()
+    orders = [
+        {"id_venta": "A-1", "monto": 1000},
+        {"id_venta": "A-2", "monto": 2500, "tipo_documento": "Factura"},
+        {"id_venta": "A-3", "monto": 0},
+    ]
+    resp = client.post("/auto/process", json={"orders": orders}, headers=auth_headers(haulmer_user))
+    assert resp.status_code == 202
+    job_id = resp.get_json()["job_id"]
+    assert client.get(f"/auto/jobs/{job_id}", headers=auth_headers(haulmer_user)).get_json()["status"] == "queued"
+
+    assert run_pending_jobs() == 1
+
+    job = client.get(f"/auto/jobs/{job_id}", headers=auth_headers(haulmer_user)).get_json()
+    assert job["status"] == "done"
+    assert (job["total"], job["processed"], job["skipped"], job["failed"]) == (3, 2, 0, 1)
+    assert {it["id_venta"]: it["status"] for it in job["items"]} == {"A-1": "Éxito", "A-2": "Éxito", "A-3": "Error"}
+    assert Sale.query.filter_by(status="Éxito").count() == 2
+
+    # Reenviar las mismas órdenes no reemite (idempotencia por id_venta)
+    resp = client.post("/auto/process", json={"orders": orders[:2]}, headers=auth_headers(haulmer_user))
+    run_pending_jobs()
+    job = client.get(resp.get_json()["status_url"], headers=auth_headers(haulmer_user)).get_json()
+    assert job["skipped"] == 2 and job["processed"] == 0
+
+
+def test_job_without_haulmer_ends_in_error_and_is_private(app, make_user, auth_headers):
+    user = make_user()
+    other = make_user("other@example.com")
+    job = enqueue_job(user.id, "process", {"orders": []})
+
+    assert claim_next_job("w1").id == job.id
+    assert claim_next_job("w2") is None  # ya tomado
+
+    run_job(job)
+    assert db.session.get(ProcessingJob, job.id).status == "error"
+
+    client = app.test_client()
+    assert client.get(f"/auto/jobs/{job.id}", headers=auth_headers(other)).status_code == 404
+    data = client.get(f"/auto/jobs/{job.id}", headers=auth_headers(user)).get_json()
+    assert "Haulmer" in data["error_message"]
+
+
+def test_each_order_transition_commits_before_returning_to_the_pipeline(app, haulmer_user, monkeypatch):
+    from app.tasks import process_orders
+
+    session = db.session()
+    open_after_route = []
+    route = process_orders._OrderProcessor.route
+
+    def spy(self, *args):
+        nxt = route(self, *args)
+        open_after_route.append(session.in_transaction())
+        return nxt
+
+    monkeypatch.setattr(process_orders._OrderProcessor, "route", spy)
+    orders = [{"id_venta": f"T-{i}", "monto": 100 + i} for i in range(6)]
+    enqueue_job(haulmer_user.id, "process", {"orders": orders})
+    run_pending_jobs()
+
+    # Mientras las etapas hacen red el coordinador no retiene transacción (ni conexión)
+    assert open_after_route and not any(open_after_route)
+    assert Sale.query.filter_by(status="Éxito").count() == 6
+
+
+def test_idempotency_key_replays_the_same_job(app, haulmer_user, auth_headers):
+    client  = app.test_client()
+    headers = {**auth_headers(haulmer_user), "Idempotency-Key": "click-1"}
+    body    = {"orders": [{"id_venta": "K-1", "monto": 1000}]}
+
+    first = client.post("/auto/process", json=body, headers=headers)
+    again = client.post("/auto/process", json=body, headers=headers)
+    assert (first.status_code, again.status_code) == (202, 202)
+    assert again.get_json()["job_id"] == first.get_json()["job_id"] and again.get_json()["replayed"]
+
+    run_pending_jobs()
+    done = client.post("/auto/process", json=body, headers=headers)
+    assert done.status_code == 200
+    assert done.get_json()["result"]["processed"] == 1
+    assert ProcessingJob.query.count() == 1
+
+    other = client.post("/auto/process", json={"orders": [{"id_venta": "K-2", "monto": 5}]}, headers=headers)
+    assert other.status_code == 422
+
+
+def test_duplicate_body_without_key_reuses_the_queued_job(app, haulmer_user, auth_headers):
+    client = app.test_client()
+    body   = {"orders": [{"id_venta": "D-1", "monto": 1000}]}
+    a = client.post("/auto/process", json=body, headers=auth_headers(haulmer_user)).get_json()
+    b = client.post("/auto/process", json=body, headers=auth_headers(haulmer_user)).get_json()
+    assert a["job_id"] == b["job_id"] and b["replayed"]
+
+
+def test_new_idempotency_key_with_same_body_reuses_the_active_job(app, haulmer_user, auth_headers):
+    # Dos pestañas con la misma selección: cada envío trae su key, pero el job en cola es uno
+    client = app.test_client()
+    body   = {"orders": [{"id_venta": "T-1", "monto": 1000}]}
+    a = client.post("/auto/process", json=body, headers={**auth_headers(haulmer_user), "Idempotency-Key": "tab-1"})
+    b = client.post("/auto/process", json=body, headers={**auth_headers(haulmer_user), "Idempotency-Key": "tab-2"})
+    assert a.get_json()["job_id"] == b.get_json()["job_id"] and b.get_json()["replayed"]
+    assert ProcessingJob.query.count() == 1
+
+    run_pending_jobs()
+    c = client.post("/auto/process", json=body, headers={**auth_headers(haulmer_user), "Idempotency-Key": "tab-3"})
+    assert c.status_code == 202 and c.get_json()["job_id"] != a.get_json()["job_id"]
+
+
+def test_one_running_job_per_user(app, make_user):
+    user, other = make_user(), make_user("other@example.com")
+    first  = enqueue_job(user.id, "process", {"orders": [{"id_venta": "1"}]})
+    second = enqueue_job(user.id, "process", {"orders": [{"id_venta": "2"}]})
+    third  = enqueue_job(other.id, "process", {"orders": []})
+
+    assert claim_next_job("w1").id == first.id
+    # El segundo job del mismo usuario espera; el de otro usuario sí se toma
+    assert claim_next_job("w2").id == third.id
+    assert claim_next_job("w3") is None
+    assert db.session.get(ProcessingJob, second.id).status == "queued"
+
+
+def test_worker_skips_users_whose_lock_is_held(app, make_user):
+    user = make_user()
+    job  = enqueue_job(user.id, "process", {"orders": []})
+
+    with user_lock(user.id) as acquired:
+        assert acquired
+        assert run_pending_jobs() == 0
+        job = db.session.get(ProcessingJob, job.id)
+        assert (job.status, job.attempts, job.worker_id) == ("queued", 0, None)
+
+    assert run_pending_jobs() == 1
+
+
+def test_selected_sales_skip_marketplace_discovery(app, haulmer_user, auth_headers, monkeypatch):
+    from fake_upstreams import create_ml_app
+
+    ml_url, ml = serve_in_thread(create_ml_app(FakeConfig(orders=5)))
+    monkeypatch.setenv("ML_API_BASE", ml_url)
+    haulmer_user.ml_access_token_enc = encrypt_value("APP_USR-fake")
+    haulmer_user.ml_user_id = "123456789"
+    picked = [
+        Sale(user_id=haulmer_user.id, id_venta=f"S-{i}", monto=1000 * (i + 1), tipo_doc="Boleta",
+             status="Pendiente", platform="Manual")
+        for i in range(3)
+    ]
+    db.session.add_all(picked)
+    db.session.commit()
+    client = app.test_client()
+    try:
+        plan = client.post("/auto/process", json={"sale_ids": [picked[0].id], "id_ventas": ["x"], "plan": True},
+                           headers=auth_headers(haulmer_user)).get_json()
+        assert (plan["source"], plan["summary"]["emit"]) == ("selection", 1)
+
+        resp = client.post("/auto/process", json={"id_ventas": ["S-0", "S-2"]}, headers=auth_headers(haulmer_user))
+        assert resp.status_code == 202
+        assert run_pending_jobs() == 1
+        job = client.get(resp.get_json()["status_url"], headers=auth_headers(haulmer_user)).get_json()
+    finally:
+        ml.shutdown()
+
+    # Solo las dos ventas pedidas: ninguna de las 5 órdenes del falso ML
+    assert (job["total"], job["processed"]) == (2, 2)
+    assert {it["id_venta"] for it in job["items"]} == {"S-0", "S-2"}
+    assert Sale.query.count() == 3
+    assert db.session.get(Sale, picked[1].id).status == "Pendiente"
+
+    bad = client.post("/auto/process", json={"sale_ids": "1"}, headers=auth_headers(haulmer_user))
+    assert bad.status_code == 400
+    jobs_before = ProcessingJob.query.count()
+    for orders in ("S-0", {"id_venta": "S-0"}, ["S-0"], [{"id_venta": "S-0", "monto": "mil"}]):
+        bad = client.post("/auto/process", json={"orders": orders}, headers=auth_headers(haulmer_user))
+        assert bad.status_code == 400, orders
+    assert ProcessingJob.query.count() == jobs_before
+
+
+def test_cors_preflight_allows_idempotency_key(app):
+    # El dashboard (otro origen en desarrollo: :3000 → :5000) envía Idempotency-Key en cada POST
+    resp = app.test_client().options("/auto/process", headers={
+        "Origin": "http://localhost:3000",
+        "Access-Control-Request-Method": "POST",
+        "Access-Control-Request-Headers": "authorization, content-type, idempotency-key",
+    })
+    assert resp.status_code == 200
+    assert resp.headers["Access-Control-Allow-Origin"] == "http://localhost:3000"
+    allowed = resp.headers["Access-Control-Allow-Headers"].lower()
+    assert "idempotency-key" in allowed
+
+
+def test_heartbeat_is_refreshed_while_collecting_orders(app, haulmer_user, monkeypatch):
+    from app.services import heartbeat
+    from app.tasks import jobs, process_orders
+
+    monkeypatch.setattr(heartbeat, "HEARTBEAT_SECONDS", 0.05)
+    monkeypatch.setattr(jobs, "STALE_AFTER", timedelta(seconds=0.2))
+    table = ProcessingJob.__table__
+    seen = {}
+
+    def slow_collect(payload, falabella, ml_client, ml_user_id):
+        # Recolección más larga que STALE_AFTER: el job no debe parecer caído
+        job_id = seen["job_id"] = ProcessingJob.query.one().id
+        time.sleep(0.5)
+        with db.engine.connect() as conn:
+            seen["heartbeat_at"] = conn.execute(
+                select(table.c.heartbeat_at).where(table.c.id == job_id)
+            ).scalar_one()
+        seen["requeued"] = jobs.requeue_stale_jobs()
+        return []
+
+    monkeypatch.setattr(process_orders, "collect_orders", slow_collect)
+    enqueue_job(haulmer_user.id, "process", {})
+    assert run_pending_jobs() == 1
+
+    assert seen["requeued"] == 0
+    assert datetime.utcnow() - seen["heartbeat_at"] < timedelta(seconds=0.2)
+    assert db.session.get(ProcessingJob, seen["job_id"]).status == "done"
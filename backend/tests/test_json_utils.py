@@ -0,0 +1,49 @@
+"""
+Tests del proveedor JSON (orjson o fallback stdlib).
+Ejecutar desde backend/: pytest tests/ -v
+"""
+from datetime import date, datetime
+from decimal import Decimal
+
+import pytest
+from flask import Flask, jsonify
+
+from app import json_utils
+from app.json_utils import FastJSONProvider
+
+
+@pytest.fixture(params=["orjson", "stdlib"])
+def backend(request, monkeypatch):
+    if request.param == "orjson" and json_utils.orjson is None:
+        pytest.skip("orjson no instalado")
+    monkeypatch.setattr(json_utils, "BACKEND", request.param)
+    return request.param
+
+
+def test_native_types_roundtrip(backend):
+    payload = {
+        "monto": Decimal("19990.50"),
+        "document_date": date(2026, 2, 24),
+        "created_at": datetime(2026, 2, 24, 12, 30, 15),
+        "platform": "Mercado Libre",
+    }
+    assert json_utils.loads(json_utils.dumps_bytes(payload)) == {
+        "monto": 19990.5,
+        "document_date": "2026-02-24",
+        "created_at": "2026-02-24T12:30:15",
+        "platform": "Mercado Libre",
+    }
+
+
+def test_flask_provider_serializes_sale_fields(backend):
+    app = Flask(__name__)
+    app.json = FastJSONProvider(app)
+    with app.app_context():
+        resp = jsonify({"monto": Decimal("10.00"), "document_date": date(2026, 1, 2), "id_venta": "ñ-1"})
+    assert resp.mimetype == "application/json"
+    assert resp.get_json() == {"monto": 10.0, "document_date": "2026-01-02", "id_venta": "ñ-1"}
+
+
+def test_loads_rejects_invalid_json(backend):
+    with pytest.raises(ValueError):
+        json_utils.loads(b"{not json")
@@ -0,0 +1,79 @@
+"""
+Tests de timeouts adaptativos y hedging (sin red: send() simulado).
+Ejecutar desde backend/: pytest tests/ -v
+"""
+import threading
+import time
+
+import pytest
+import requests
+
+from app.services import latency
+from app.services.latency import LatencyTracker
+
+
+class _Resp:
+    def __init__(self, name):
+        self.name = name
+        self.closed = False
+
+    def close(self):
+        self.closed = True
+
+
+def test_timeout_uses_ceiling_until_enough_samples():
+    t = LatencyTracker()
+    for _ in range(latency.MIN_SAMPLES - 1):
+        t.record("op", 0.1)
+    assert t.timeout_for("op", ceiling=30) == 30
+
+
+def test_timeout_follows_p99_within_floor_and_ceiling():
+    t = LatencyTracker()
+    for i in range(100):
+        t.record("op", 3.0 if i == 99 else 0.2)
+    assert t.timeout_for("op", ceiling=30, floor=1) == pytest.approx(3.0 * latency.TIMEOUT_FACTOR)
+    assert t.timeout_for("op", ceiling=4, floor=1) == 4
+
+    fast = LatencyTracker()
+    for _ in range(100):
+        fast.record("op", 0.01)
+    assert fast.timeout_for("op", ceiling=30, floor=1.5) == 1.5
+
+
+def test_timeout_is_recorded_as_censored_sample(monkeypatch):
+    t = LatencyTracker()
+    monkeypatch.setattr(latency, "tracker", t)
+
+    def send(timeout):
+        raise requests.Timeout()
+
+    with pytest.raises(requests.Timeout):
+        latency.upstream_call("slow", send, ceiling=7)
+    assert t._samples["slow"][-1] == 7
+
+
+def test_hedged_request_returns_first_answer(monkeypatch):
+    t = LatencyTracker()
+    for _ in range(50):
+        t.record("get", 0.01)
+    monkeypatch.setattr(latency, "tracker", t)
+    monkeypatch.setattr(latency, "HEDGING_ENABLED", True)
+
+    calls = []
+    lock = threading.Lock()
+
+    def send(timeout):
+        with lock:
+            n = len(calls)
+            calls.append(n)
+        if n == 0:
+            time.sleep(0.5)  # la primera queda "pegada"
+            return _Resp("lenta")
+        return _Resp("hedge")
+
+    start = time.monotonic()
+    resp = latency.upstream_call("get", send, ceiling=5, hedge=True)
+    assert resp.name == "hedge"
+    assert time.monotonic() - start < 0.4
+    assert len(calls) == 2
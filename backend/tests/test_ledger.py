@@ -0,0 +1,66 @@
+"""
+Tests del ledger de llamadas externas por tenant y del ranking GET /admin/usage.
+Ejecutar desde backend/: pytest tests/ -v
+"""
+from app.models import UpstreamUsage
+from app.services.ledger import flush_ledger, ledger
+
+
+def test_flush_aggregates_per_tenant_and_operation(app, make_user):
+    user = make_user()
+    ledger.drain()
+    for _ in range(3):
+        ledger.record(user.id, "ml.get_order", 0.2, bytes_in=1000, bytes_out=0)
+    ledger.record(user.id, "ml.get_order", 1.0, error=True)
+    ledger.record(None, "ml.get_order", 5.0)  # sin tenant: no se contabiliza
+
+    assert flush_ledger() == 1
+    ledger.record(user.id, "ml.get_order", 0.5, bytes_in=10)
+    assert flush_ledger() == 1
+
+    row = UpstreamUsage.query.one()
+    assert (row.service, row.operation) == ("ml", "get_order")
+    assert row.calls == 5 and row.errors == 1
+    assert row.latency_ms == 2100
+    assert row.bytes_in == 3010
+
+
+def test_admin_usage_ranks_tenants_by_latency(app, make_user, auth_headers):
+    admin = make_user("admin@example.com", is_admin=True)
+    small = make_user("small@example.com")
+    big = make_user("big@example.com")
+    ledger.drain()
+    ledger.record(small.id, "haulmer.emit_document", 0.5)
+    for _ in range(10):
+        ledger.record(big.id, "falabella.GetOrders", 2.0, bytes_in=50_000)
+
+    client = app.test_client()
+    assert client.get("/admin/usage", headers=auth_headers(small)).status_code == 403
+
+    resp = client.get("/admin/usage?sort_by=latency", headers=auth_headers(admin))
+    assert resp.status_code == 200
+    tenants = resp.get_json()["tenants"]
+    assert [t["email"] for t in tenants] == ["big@example.com", "small@example.com"]
+    assert tenants[0]["calls"] == 10
+    assert tenants[0]["operations"][0]["operation"] == "falabella.GetOrders"
+
+
+def test_dedicated_worker_flushes_ledger_periodically_and_on_exit(app, make_user, monkeypatch):
+    from app.tasks import jobs
+
+    user = make_user()
+    ledger.drain()
+    monkeypatch.setattr(jobs, "MIN_IDLE_SECONDS", 0.01)
+    monkeypatch.setattr(jobs, "FALLBACK_POLL_SECONDS", 0.01)
+
+    # Vencido el intervalo, la vuelta del worker vuelca el buffer aunque no haya trabajo
+    monkeypatch.setattr(jobs, "FLUSH_INTERVAL_SECONDS", 0)
+    ledger.record(user.id, "haulmer.emit_document", 0.3)
+    jobs.run_worker(poll_seconds=0.01, max_loops=1)
+    assert UpstreamUsage.query.one().calls == 1
+
+    # Al salir también se vuelca lo pendiente, aunque el intervalo no haya vencido
+    monkeypatch.setattr(jobs, "FLUSH_INTERVAL_SECONDS", 3600)
+    ledger.record(user.id, "haulmer.emit_document", 0.3)
+    jobs.run_worker(poll_seconds=0.01, max_loops=1)
+    assert UpstreamUsage.query.one().calls == 2
@@ -0,0 +1,53 @@
+"""
+Tests del cliente Mercado Libre (sin red: requests.get parcheado).
+Ejecutar desde backend/: pytest tests/ -v
+"""
+import json
+
+from app.services import mercadolibre_client as ml
+from app.services.mercadolibre_client import ORDER_SUMMARY_FIELDS, MercadoLibreClient, order_total
+
+
+class _Resp:
+    status_code = 200
+
+    def __init__(self, payload):
+        self.content = json.dumps(payload).encode()
+        self.text = self.content.decode()
+
+    def raise_for_status(self):
+        pass
+
+
+def test_get_orders_sends_attributes_projection(monkeypatch):
+    seen = {}
+
+    def fake_get(url, headers=None, params=None, timeout=None):
+        seen.update(params or {})
+        return _Resp({"results": [{"id": 1, "total_amount": 990}], "paging": {"total": 1}})
+
+    monkeypatch.setattr(ml.requests, "get", fake_get)
+    result = MercadoLibreClient("tok").get_orders(seller_id="42", attributes=ORDER_SUMMARY_FIELDS)
+
+    assert result["success"]
+    assert seen["attributes"].split(",")[0] == "paging"
+    assert "results.pack_id" in seen["attributes"]
+    assert "results.date_created" in seen["attributes"]
+
+
+def test_get_orders_without_attributes_keeps_full_documents(monkeypatch):
+    seen = {}
+
+    def fake_get(url, headers=None, params=None, timeout=None):
+        seen.update(params or {})
+        return _Resp({"results": []})
+
+    monkeypatch.setattr(ml.requests, "get", fake_get)
+    MercadoLibreClient("tok").get_orders()
+    assert "attributes" not in seen
+
+
+def test_order_total_accepts_both_field_names():
+    assert order_total({"total": 1500}) == 1500.0
+    assert order_total({"total_amount": "990.5"}) == 990.5
+    assert order_total({}) == 0.0
@@ -0,0 +1,65 @@
+"""
+Tests del despertar de workers (app.services.notify): quién avisa al dejar trabajo listo y
+cuánto duerme el worker sin trabajo. Con SQLite no hay LISTEN/NOTIFY: se prueba el respaldo.
+Ejecutar desde backend/: pytest tests/ -v
+"""
+from datetime import datetime, timedelta
+
+import pytest
+
+from app import db
+from app.models import Sale, UploadTask
+from app.routes import dashboard
+from app.services import notify
+from app.tasks import jobs
+from app.tasks.jobs import enqueue_job, idle_timeout, seconds_until_due
+
+
+@pytest.fixture
+def notified(monkeypatch):
+    kinds = []
+    for module in (jobs, dashboard):
+        monkeypatch.setattr(module, "notify_work", kinds.append)
+    return kinds
+
+
+def test_writers_notify_when_work_is_ready(app, make_user, auth_headers, notified):
+    user = make_user()
+    enqueue_job(user.id, "process", {"orders": []})
+    assert notified == [notify.JOBS]
+
+    sale = Sale(user_id=user.id, id_venta="N-1", monto=500, tipo_doc="Boleta", status="Error")
+    db.session.add(sale)
+    db.session.commit()
+    resp = app.test_client().post(f"/dashboard/sales/{sale.id}/retry", headers=auth_headers(user))
+    assert resp.status_code == 200
+    assert notified == [notify.JOBS, notify.RETRIES]
+
+
+def test_idle_worker_sleeps_until_the_next_scheduled_item(app, make_user, monkeypatch):
+    monkeypatch.setattr(jobs, "FALLBACK_POLL_SECONDS", 60.0)
+    assert seconds_until_due() is None
+    assert idle_timeout(listening=True) == 60.0
+    assert idle_timeout(listening=False, poll_seconds=2) == 2
+
+    user = make_user()
+    sale = Sale(user_id=user.id, id_venta="N-2", monto=500, tipo_doc="Boleta", status="Éxito")
+    db.session.add(sale)
+    db.session.flush()
+    db.session.add(UploadTask(user_id=user.id, sale_id=sale.id, platform="Falabella", pdf_url="http://pdf",
+                              next_attempt_at=datetime.utcnow() + timedelta(seconds=20)))
+    db.session.commit()
+    assert 15 < idle_timeout(listening=True) <= 20
+
+    # Trabajo ya vencido (tomado por otro worker): espera mínima, no un bucle sin pausa
+    db.session.add(Sale(user_id=user.id, id_venta="N-3", monto=500, tipo_doc="Boleta", status="Error",
+                        next_attempt_at=datetime.utcnow() - timedelta(seconds=5)))
+    db.session.commit()
+    assert idle_timeout(listening=True) == jobs.MIN_IDLE_SECONDS
+
+
+def test_listener_without_postgres_falls_back_to_sleeping(app):
+    listener = notify.WorkListener()
+    assert not listener.active
+    assert listener.wait(0.01) == []
+    notify.notify_work(notify.JOBS)  # sin PostgreSQL no hace nada
@@ -0,0 +1,91 @@
+"""
+Tests de la reducción de PDFs (app.services.pdf_optimizer) y de su etapa en el outbox: un PDF
+de más de 1 MB termina subido a Mercado Libre en vez de quedar rechazado.
+Ejecutar desde backend/: pytest tests/ -v
+"""
+import io
+import os
+import random
+
+import pytest
+from cryptography.fernet import Fernet
+
+from app.crypto_utils import encrypt_value
+from app.models import Sale
+from app.services import pdf_optimizer
+from app.services.blob_store import blob_store
+from app.services.mercadolibre_client import MAX_FISCAL_DOCUMENT_BYTES
+from app.services.upload_checks import upload_checks
+from app.tasks.jobs import run_pending_jobs
+from app.tasks.uploads import drain_upload_tasks
+from fake_upstreams import FakeConfig, create_haulmer_app, serve_in_thread
+from fake_upstreams.common import fake_pdf
+from fake_upstreams.mercadolibre import create_ml_app
+
+
+def test_strip_trailing_drops_bytes_after_last_eof():
+    data = fake_pdf(2048)
+    stripped = pdf_optimizer.strip_trailing(data)
+    assert len(stripped) < 1024 and stripped.endswith(b"%%EOF\n")
+    assert pdf_optimizer.strip_trailing(stripped) == stripped
+
+
+def test_optimize_pdf_runs_once_per_content_and_limit(app, monkeypatch):
+    digest, _ = blob_store().put(fake_pdf(2048))
+    result, size = pdf_optimizer.optimize_pdf(digest, MAX_FISCAL_DOCUMENT_BYTES)
+    assert result != digest and size < MAX_FISCAL_DOCUMENT_BYTES
+    assert blob_store().read(result).startswith(b"%PDF")
+
+    def no_pool():
+        raise AssertionError("el resultado debería venir del índice en disco")
+
+    monkeypatch.setattr(pdf_optimizer, "_executor", no_pool)
+    assert pdf_optimizer.optimize_pdf(digest, MAX_FISCAL_DOCUMENT_BYTES) == (result, size)
+
+
+def test_lossy_step_downsamples_images_until_it_fits():
+    pytest.importorskip("pypdf")
+    Image = pytest.importorskip("PIL.Image")
+    rnd = random.Random(1)
+    img = Image.frombytes("RGB", (1500, 1500), bytes(rnd.getrandbits(8) for _ in range(1500 * 1500 * 3)))
+    buf = io.BytesIO()
+    img.save(buf, "PDF", resolution=150)
+    data = buf.getvalue()
+    assert len(data) > 1024 * 1024
+
+    reduced = pdf_optimizer.reduce_pdf(data, 400 * 1024)
+    assert len(reduced) <= 400 * 1024 and reduced.startswith(b"%PDF")
+    # Sin límite solo hay pasos sin pérdida: la imagen no se toca
+    assert len(pdf_optimizer.reduce_pdf(data, None)) > 400 * 1024
+
+
+@pytest.fixture
+def ml_big_pdf(app, make_user, monkeypatch):
+    monkeypatch.setenv("ENCRYPTION_KEY", Fernet.generate_key().decode())
+    haulmer_url, haulmer = serve_in_thread(create_haulmer_app(FakeConfig(pdf_kb=1500)))
+    ml_url, ml = serve_in_thread(create_ml_app(FakeConfig(orders=1)))
+    monkeypatch.setenv("HAULMER_API_BASE", haulmer_url)
+    monkeypatch.setenv("ML_API_BASE", ml_url)
+    upload_checks.clear()
+    yield make_user(
+        haulmer_api_key_enc=encrypt_value("fake-haulmer-key"),
+        ml_access_token_enc=encrypt_value("APP_USR-fake"),
+        ml_user_id="123456789",
+    )
+    upload_checks.clear()
+    haulmer.shutdown()
+    ml.shutdown()
+
+
+def test_oversized_pdf_is_reduced_before_ml_upload(app, ml_big_pdf, auth_headers):
+    resp = app.test_client().post("/auto/process", json={}, headers=auth_headers(ml_big_pdf))
+    assert resp.status_code == 202
+    assert run_pending_jobs() == 1
+    assert drain_upload_tasks() == 1
+
+    sale = Sale.query.filter_by(user_id=ml_big_pdf.id).one()
+    assert sale.upload_status == "Cargado"
+    # El original (> 1 MB) sigue en el almacén para descargas; se subió la versión reducida
+    doc = sale.documents.one()
+    assert doc.pdf_size > MAX_FISCAL_DOCUMENT_BYTES
+    assert os.path.getsize(blob_store().path(doc.pdf_sha256)) == doc.pdf_size
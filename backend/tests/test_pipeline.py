@@ -0,0 +1,72 @@
+"""
+Tests del pipeline por etapas: límite de concurrencia por etapa, solapamiento entre etapas
+y ruteo de errores al thread coordinador.
+Ejecutar desde backend/: pytest tests/ -v
+"""
+import threading
+import time
+
+from app.services.pipeline import Stage, StagedPipeline
+
+
+def _tracked(delay, peaks, name):
+    lock = threading.Lock()
+    active = [0]
+
+    def fn(item):
+        with lock:
+            active[0] += 1
+            peaks[name] = max(peaks.get(name, 0), active[0])
+        time.sleep(delay)
+        with lock:
+            active[0] -= 1
+        return item * 10
+
+    return fn
+
+
+def test_stages_overlap_and_respect_their_concurrency_limit():
+    peaks = {}
+    pipeline = StagedPipeline([
+        Stage("emit", _tracked(0.05, peaks, "emit"), workers=2),
+        Stage("upload", _tracked(0.05, peaks, "upload"), workers=3),
+    ])
+    results = {}
+    coordinator = threading.get_ident()
+
+    def route(stage, item, result, error):
+        assert threading.get_ident() == coordinator
+        if stage is None:
+            return "emit"
+        if stage == "emit":
+            return "upload"
+        results[item] = result
+        return None
+
+    start = time.monotonic()
+    assert pipeline.run(range(12), route) == 12
+    elapsed = time.monotonic() - start
+
+    assert results == {i: i * 10 for i in range(12)}
+    assert peaks["emit"] == 2 and peaks["upload"] <= 3
+    # Secuencial: 12 × 0.1 s. En pipeline lo limita la etapa más lenta (12 / 2 × 0.05 s)
+    assert elapsed < 0.6
+
+
+def test_stage_errors_are_routed_and_items_can_skip_stages():
+    def boom(item):
+        raise RuntimeError(f"falló {item}")
+
+    pipeline = StagedPipeline([Stage("check", lambda i: i % 2 == 0), Stage("emit", boom)])
+    outcome = {}
+
+    def route(stage, item, result, error):
+        if stage is None:
+            return "check" if item < 4 else None  # 4 y 5 terminan al admitirse
+        if stage == "check":
+            return "emit" if result else None
+        outcome[item] = str(error)
+        return None
+
+    assert pipeline.run(range(6), route) == 6
+    assert outcome == {0: "falló 0", 2: "falló 2"}
@@ -0,0 +1,77 @@
+"""
+Tests del modo plan (dry-run) de POST /auto/process.
+Ejecutar desde backend/: pytest tests/ -v
+"""
+import time
+from datetime import date, datetime
+
+from cryptography.fernet import Fernet
+
+from app import db
+from app.crypto_utils import encrypt_value
+from app.models import ProcessingJob, Sale
+from app.services.latency import tracker
+
+
+def _user(make_user, monkeypatch, **fields):
+    monkeypatch.setenv("ENCRYPTION_KEY", Fernet.generate_key().decode())
+    return make_user(haulmer_api_key_enc=encrypt_value("k"), **fields)
+
+
+def test_plan_tags_every_order_with_action_and_reason(app, make_user, auth_headers, monkeypatch):
+    user = _user(make_user, monkeypatch)
+    db.session.add_all([
+        Sale(user_id=user.id, id_venta="UP", monto=1, tipo_doc="Boleta", status="Éxito",
+             document_uploaded_at=datetime.utcnow()),
+        Sale(user_id=user.id, id_venta="OK", monto=1, tipo_doc="Boleta", status="Éxito"),
+        Sale(user_id=user.id, id_venta="ERR", monto=1, tipo_doc="Boleta", status="Error"),
+        Sale(user_id=user.id, id_venta="HALF", monto=1, tipo_doc="Boleta", status="Emitiendo"),
+    ])
+    db.session.commit()
+
+    orders = [{"id_venta": i, "monto": 10} for i in ("NEW", "UP", "OK", "ERR", "HALF", "NEW")]
+    orders.append({"id_venta": "BAD", "monto": 0})
+    resp = app.test_client().post(
+        "/auto/process", json={"orders": orders, "plan": True}, headers=auth_headers(user),
+    )
+
+    assert resp.status_code == 200
+    plan = resp.get_json()
+    assert plan["source"] == "request"
+    assert [(a["id_venta"], a["action"], a["reason"]) for a in plan["actions"]] == [
+        ("NEW", "emit", "nueva"),
+        ("UP", "skip", "ya_cargada"),
+        ("OK", "skip", "ya_emitida"),
+        ("ERR", "emit", "reintento_error"),
+        ("HALF", "emit", "emision_interrumpida"),
+        ("NEW", "skip", "duplicada"),
+        ("BAD", "reject", "invalida"),
+    ]
+    assert plan["summary"] == {"total": 7, "emit": 3, "skip": 3, "reject": 1}
+    assert plan["estimate"]["seconds"] > 0
+    assert ProcessingJob.query.count() == 0  # no encola nada
+
+
+def test_plan_uses_synced_sales_and_observed_latency(app, make_user, monkeypatch):
+    from app.services.planner import plan_process
+
+    user = _user(make_user, monkeypatch, falabella_user_id="seller", falabella_api_key_enc=b"x")
+    db.session.add_all([
+        Sale(user_id=user.id, id_venta=f"F-{i}", monto=100, tipo_doc="Boleta", status="Pendiente",
+             platform="Falabella", document_date=date.today())
+        for i in range(3000)
+    ])
+    db.session.commit()
+    for _ in range(30):
+        tracker.record("haulmer.emit_document", 4.0)
+
+    start = time.monotonic()
+    plan = plan_process(user, {})
+    assert time.monotonic() - start < 2
+
+    assert plan["source"] == "local"
+    assert plan["summary"]["emit"] == 3000
+    assert plan["actions"][0]["platform_check"] and plan["actions"][0]["upload"]
+    assert plan["estimate"]["latency"]["haulmer.emit_document"] == {"seconds": 4.0, "basis": "tracker"}
+    # Haulmer (4 s × 3000 / 4 en paralelo) domina el pipeline
+    assert plan["estimate"]["seconds"] >= 3000
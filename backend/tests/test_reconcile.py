@@ -0,0 +1,124 @@
+"""
+Tests de la reconciliación (job "reconcile") contra el falso Mercado Libre: corrige ventas
+que dicen estar cargadas sin documento, marca las que sí lo tienen y crea las externas.
+Ejecutar desde backend/: pytest tests/ -v
+"""
+import time
+from datetime import datetime
+
+import pytest
+import requests
+from cryptography.fernet import Fernet
+
+from app import db
+from app.crypto_utils import encrypt_value
+from app.models import Document, ProcessingJob, Sale, UploadTask
+from app.services.falabella_client import FalabellaClient
+from app.services.rate_limit import TokenBucket
+from app.services.upload_checks import upload_checks
+from app.tasks.jobs import run_pending_jobs
+from fake_upstreams import FakeConfig, serve_in_thread
+from fake_upstreams.common import fake_pdf
+from fake_upstreams.mercadolibre import ORDER_ID_BASE, create_ml_app
+
+
+def test_token_bucket_spaces_calls_after_the_burst():
+    bucket = TokenBucket(rate=50, burst=2)
+    assert bucket.try_acquire() and bucket.try_acquire()
+    assert not bucket.try_acquire()
+    start = time.monotonic()
+    bucket.acquire()
+    assert time.monotonic() - start >= 0.01
+
+
+@pytest.fixture
+def ml(app, make_user, monkeypatch):
+    monkeypatch.setenv("ENCRYPTION_KEY", Fernet.generate_key().decode())
+    url, server = serve_in_thread(create_ml_app(FakeConfig(orders=4)))
+    monkeypatch.setenv("ML_API_BASE", url)
+    upload_checks.clear()
+    user = make_user(
+        haulmer_api_key_enc=encrypt_value("fake-haulmer-key"),
+        ml_access_token_enc=encrypt_value("APP_USR-fake"),
+        ml_user_id="123456789",
+    )
+    yield url, user
+    upload_checks.clear()
+    server.shutdown()
+
+
+def _upload_doc(url, pack_id):
+    resp = requests.post(
+        f"{url}/packs/{pack_id}/fiscal_documents",
+        headers={"Authorization": "Bearer x"},
+        files={"fiscal_document": ("f.pdf", fake_pdf(1), "application/pdf")},
+    )
+    assert resp.status_code == 201
+
+
+def test_reconcile_diffs_platform_documents_against_sales(app, ml, auth_headers):
+    url, user = ml
+    ids = [str(ORDER_ID_BASE + n) for n in range(4)]
+    # 0: dice Cargado pero ML no tiene documento; 1: Pendiente con documento en ML
+    lost = Sale(user_id=user.id, id_venta=ids[0], monto=1000, tipo_doc="Boleta", status="Éxito",
+                platform="Mercado Libre", document_uploaded_at=datetime.utcnow(), upload_status="Cargado")
+    unseen = Sale(user_id=user.id, id_venta=ids[1], monto=1000, tipo_doc="Boleta", status="Pendiente",
+                  platform="Mercado Libre")
+    db.session.add_all([lost, unseen])
+    db.session.flush()
+    db.session.add(Document(user_id=user.id, sale_id=lost.id, pdf_url="http://haulmer/1.pdf"))
+    db.session.commit()
+    _upload_doc(url, ids[1])
+    # Externas: todas las órdenes del falso ML que no están en sales, con documento en su pack
+    for order_id in ids[2:]:
+        order = requests.get(f"{url}/orders/{order_id}", headers={"Authorization": "Bearer x"}).json()
+        if requests.get(f"{url}/packs/{order['pack_id'] or order_id}/fiscal_documents",
+                        headers={"Authorization": "Bearer x"}).status_code == 404:
+            _upload_doc(url, order["pack_id"] or order_id)
+
+    client = app.test_client()
+    resp = client.post("/auto/reconcile", json={}, headers=auth_headers(user))
+    assert resp.status_code == 202
+    assert run_pending_jobs() == 1
+
+    job = client.get(resp.get_json()["status_url"], headers=auth_headers(user)).get_json()
+    assert job["status"] == "done"
+    result = job["result"]
+    assert (result["checked"], result["cleared"], result["marked_uploaded"], result["external_created"]) == (4, 1, 1, 2)
+    assert result["uploads_requeued"] == 1
+
+    lost = db.session.get(Sale, lost.id)
+    assert (lost.document_uploaded_at, lost.upload_status) == (None, "Pendiente")
+    assert UploadTask.query.filter_by(sale_id=lost.id, status="pending").count() == 1
+    assert db.session.get(Sale, unseen.id).upload_status == "Cargado"
+    assert Sale.query.filter(Sale.id_venta.in_(ids[2:]), Sale.upload_status == "Cargado").count() == 2
+    assert ProcessingJob.query.filter_by(kind="reconcile").one().total == 4
+
+
+def test_ambiguous_not_found_error_does_not_demote_uploaded_sales(app, make_user, auth_headers, monkeypatch):
+    monkeypatch.setenv("ENCRYPTION_KEY", Fernet.generate_key().decode())
+    upload_checks.clear()
+    errors = {
+        "F-1": {"success": False, "error": "E009: Order not found", "error_code": "E009"},
+        "F-2": {"success": False, "error": "Invoice not found", "error_code": "E035"},
+    }
+    monkeypatch.setattr(FalabellaClient, "_request", lambda self, params, *a, **k: errors[params["OrderId"]])
+    user = make_user(falabella_user_id="seller@example.com", falabella_api_key_enc=encrypt_value("fake-key"))
+    sales = [
+        Sale(user_id=user.id, id_venta=id_venta, monto=1000, tipo_doc="Boleta", status="Éxito",
+             platform="Falabella", document_uploaded_at=datetime.utcnow(), upload_status="Cargado")
+        for id_venta in errors
+    ]
+    db.session.add_all(sales)
+    db.session.commit()
+
+    client = app.test_client()
+    resp = client.post("/auto/reconcile", json={"external": False}, headers=auth_headers(user))
+    assert run_pending_jobs() == 1
+    result = client.get(resp.get_json()["status_url"], headers=auth_headers(user)).get_json()["result"]
+    upload_checks.clear()
+
+    # Solo E035 es un "no hay documento" definitivo; el otro "not found" queda como desconocido
+    assert (result["cleared"], result["unknown"]) == (1, 1)
+    assert db.session.get(Sale, sales[0].id).upload_status == "Cargado"
+    assert db.session.get(Sale, sales[1].id).document_uploaded_at is None
@@ -0,0 +1,129 @@
+"""
+Tests de sale_items: sync_sales guarda los OrderItemId de Falabella con GetMultipleOrderItems
+y la subida y las etiquetas los leen de la BD sin volver a llamar a GetOrderItems.
+Ejecutar desde backend/: pytest tests/ -v
+"""
+import pytest
+from cryptography.fernet import Fernet
+
+from app import db
+from app.crypto_utils import encrypt_value
+from app.models import Sale, SaleItem
+from app.services.falabella_client import FalabellaClient
+from app.services.upload_checks import upload_checks
+from app.tasks import process_orders
+from app.tasks.jobs import run_pending_jobs
+from app.tasks.sync_sales import run_sync_sales
+from app.tasks.uploads import drain_upload_tasks
+from fake_upstreams import FakeConfig, create_haulmer_app, serve_in_thread
+from fake_upstreams.falabella import DEFAULT_API_KEY, ORDER_ID_BASE, create_falabella_app
+
+
+@pytest.fixture
+def falabella(app, make_user, monkeypatch):
+    monkeypatch.setenv("ENCRYPTION_KEY", Fernet.generate_key().decode())
+    config = FakeConfig(orders=3, days=5)
+    haulmer_url, haulmer = serve_in_thread(create_haulmer_app(FakeConfig()))
+    falabella_url, server = serve_in_thread(create_falabella_app(config))
+    monkeypatch.setenv("HAULMER_API_BASE", haulmer_url)
+    monkeypatch.setenv("FALABELLA_BASE_URL_OVERRIDE", falabella_url)
+    upload_checks.clear()
+    user = make_user(
+        haulmer_api_key_enc=encrypt_value("fake-haulmer-key"),
+        falabella_user_id="seller@example.com",
+        falabella_api_key_enc=encrypt_value(DEFAULT_API_KEY),
+    )
+    yield user, config
+    haulmer.shutdown()
+    server.shutdown()
+
+
+@pytest.fixture
+def calls(monkeypatch):
+    """Cuenta las llamadas a GetMultipleOrderItems y hace fallar cualquier GetOrderItems."""
+    counter = {"multiple": 0}
+    original = FalabellaClient.get_multiple_order_items
+
+    def multiple(self, order_ids):
+        counter["multiple"] += 1
+        return original(self, order_ids)
+
+    def single(self, order_id):
+        raise AssertionError(f"GetOrderItems no debería llamarse ({order_id})")
+
+    monkeypatch.setattr(FalabellaClient, "get_multiple_order_items", multiple)
+    monkeypatch.setattr(FalabellaClient, "get_order_items", single)
+    return counter
+
+
+def test_sync_stores_items_in_batches_of_fifty(falabella, calls):
+    user, config = falabella
+    config.orders = 60
+
+    assert run_sync_sales()["falabella"] == 60
+    assert calls["multiple"] == 2
+
+    sale = Sale.query.filter_by(user_id=user.id, id_venta=str(ORDER_ID_BASE)).one()
+    items = sale.items.order_by(SaleItem.id).all()
+    assert items and all(int(it.item_id) // 10 == ORDER_ID_BASE for it in items)
+    assert db.session.query(SaleItem.sale_id).distinct().count() == 60
+
+    # Una segunda sincronización no vuelve a pedir ítems que ya están guardados
+    run_sync_sales()
+    assert calls["multiple"] == 2
+
+
+def test_upload_reads_item_ids_from_db(app, falabella, calls, auth_headers):
+    user, _ = falabella
+    run_sync_sales()
+
+    resp = app.test_client().post("/auto/process", json={}, headers=auth_headers(user))
+    assert resp.status_code == 202
+    assert run_pending_jobs() == 1
+    assert drain_upload_tasks() == 3
+    assert Sale.query.filter_by(upload_status="Cargado").count() == 3
+
+
+def test_process_job_fills_missing_items_before_emitting(app, falabella, calls, auth_headers):
+    user, _ = falabella
+
+    resp = app.test_client().post("/auto/process", json={}, headers=auth_headers(user))
+    assert resp.status_code == 202
+    assert run_pending_jobs() == 1
+    assert calls["multiple"] == 1
+    assert db.session.query(SaleItem.sale_id).distinct().count() == 3
+    assert drain_upload_tasks() == 3
+
+
+def test_concurrent_item_sync_does_not_fail_the_job(app, falabella, calls, auth_headers, monkeypatch):
+    user, _ = falabella
+    fill = process_orders.fill_falabella_items
+
+    def racing_fill(client, sale_ids):
+        # sync_sales guarda los mismos ítems entre la consulta y el commit del job
+        n = fill(client, sale_ids)
+        rows = [{"sale_id": it.sale_id, "platform": it.platform, "item_id": it.item_id}
+                for it in db.session.new if isinstance(it, SaleItem)]
+        with db.engine.begin() as conn:
+            conn.execute(SaleItem.__table__.insert(), rows)
+        return n
+
+    monkeypatch.setattr(process_orders, "fill_falabella_items", racing_fill)
+    resp = app.test_client().post("/auto/process", json={}, headers=auth_headers(user))
+    assert resp.status_code == 202
+    assert run_pending_jobs() == 1
+
+    job = app.test_client().get(resp.get_json()["status_url"], headers=auth_headers(user)).get_json()
+    assert (job["status"], job["processed"]) == ("done", 3)
+    assert db.session.query(SaleItem.sale_id).distinct().count() == 3
+
+
+def test_labels_by_order_id_use_stored_items(app, falabella, calls, auth_headers):
+    user, _ = falabella
+    run_sync_sales()
+
+    resp = app.test_client().post(
+        "/falabella/labels", json={"order_id": ORDER_ID_BASE}, headers=auth_headers(user),
+    )
+    assert resp.status_code == 200
+    assert resp.get_json()["file_base64"]
@@ -0,0 +1,76 @@
+"""
+Tests de los bodies de subida en streaming: mismo contenido que el body armado en memoria,
+Content-Length exacto y bloques acotados; y subidas reales contra los servidores falsos.
+Ejecutar desde backend/: pytest tests/ -v
+"""
+import base64
+import json
+
+import pytest
+
+from app.services.falabella_client import FalabellaClient, parse_order_items_response
+from app.services.mercadolibre_client import MercadoLibreClient
+from app.services.stream_bodies import Base64JSONBody, MultipartFileBody
+from fake_upstreams import FakeConfig, create_falabella_app, create_ml_app, serve_in_thread
+from fake_upstreams.common import fake_pdf
+from fake_upstreams.falabella import DEFAULT_API_KEY, ORDER_ID_BASE
+
+
+@pytest.mark.parametrize("size", [0, 1, 2, 3, 7, 100])
+def test_base64_json_body_matches_in_memory_encoding(tmp_path, size):
+    path = tmp_path / "doc.pdf"
+    path.write_bytes(bytes(range(256)) * (size // 256) + bytes(range(size % 256)))
+    body = Base64JSONBody({"invoiceNumber": "1", "ids": ["9"]}, "invoiceDocument", str(path), chunk_size=6)
+
+    chunks = list(body)
+    raw = b"".join(chunks)
+    assert len(raw) == len(body)
+    assert max(len(c) for c in chunks[1:-1] or [b""]) <= 8
+    assert json.loads(raw) == {
+        "invoiceNumber": "1", "ids": ["9"],
+        "invoiceDocument": base64.b64encode(path.read_bytes()).decode(),
+    }
+    # Se puede volver a iterar (p. ej. si la petición se reintenta)
+    assert b"".join(body) == raw
+
+
+def test_multipart_body_length_and_boundary(tmp_path):
+    path = tmp_path / "doc.pdf"
+    path.write_bytes(b"%PDF-1.4 boleta")
+    body = MultipartFileBody("fiscal_document", "factura.pdf", "application/pdf", str(path))
+    raw = b"".join(body)
+    assert len(raw) == len(body)
+    assert body.boundary in body.content_type
+    assert b"%PDF-1.4 boleta" in raw and raw.endswith(f"--{body.boundary}--\r\n".encode())
+
+
+@pytest.fixture
+def pdf_path(tmp_path):
+    path = tmp_path / "boleta.pdf"
+    path.write_bytes(fake_pdf(40, "boleta"))
+    return str(path)
+
+
+def test_streamed_uploads_accepted_by_fake_platforms(pdf_path):
+    falabella_url, falabella = serve_in_thread(create_falabella_app(FakeConfig(orders=1)))
+    ml_url, ml = serve_in_thread(create_ml_app(FakeConfig(orders=1)))
+    try:
+        client = FalabellaClient("seller@example.com", DEFAULT_API_KEY, base_url=falabella_url)
+        order_id = str(ORDER_ID_BASE)
+        items = parse_order_items_response(client.get_order_items(order_id))
+        upload = client.set_invoice_pdf(
+            order_item_ids=[it["OrderItemId"] for it in items],
+            invoice_number="1", invoice_date="2026-01-01", invoice_type="BOLETA",
+            operator_code="FACL", pdf_path=pdf_path,
+        )
+        assert upload["success"], upload
+        assert client.invoice_uploaded(order_id) is True
+
+        ml_client = MercadoLibreClient("APP_USR-test", base_url=ml_url)
+        first = ml_client.get_orders(limit=1)["data"]["results"][0]
+        pack_id = str(first.get("pack_id") or first["id"])
+        assert ml_client.upload_fiscal_document(pack_id, pdf_path=pdf_path)["success"]
+        assert ml_client.fiscal_document_uploaded(pack_id) is True
+    finally:
+        falabella.shutdown()
+        ml.shutdown()
@@ -0,0 +1,80 @@
+"""
+Tests de la caché de comprobaciones "ya cargado": TTL separados para positivos y negativos,
+escritura del positivo en la Sale y una sola consulta a la plataforma entre corridas.
+Ejecutar desde backend/: pytest tests/ -v
+"""
+import pytest
+from cryptography.fernet import Fernet
+
+from app.crypto_utils import encrypt_value
+from app.models import Sale
+from app.services import upload_checks as uc
+from app.services.upload_checks import UploadCheckCache, upload_checks
+from app.tasks import process_orders
+from app.tasks.jobs import enqueue_job, run_pending_jobs
+from fake_upstreams import FakeConfig, create_haulmer_app, serve_in_thread
+
+
+def test_positive_and_negative_answers_expire_separately(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(uc.time, "monotonic", lambda: now[0])
+    cache = UploadCheckCache(positive_ttl=100, negative_ttl=10)
+
+    cache.put("Falabella", "S1", "A", True)
+    cache.put("Falabella", "S1", "B", False)
+    cache.put("Falabella", "S1", "C", None)  # sin respuesta: no se guarda
+    assert (cache.get("Falabella", "S1", "A"), cache.get("Falabella", "S1", "B")) == (True, False)
+    assert cache.get("Falabella", "S1", "C") is None
+    assert cache.get("Falabella", "S2", "A") is None  # por seller
+
+    now[0] += 11
+    assert (cache.get("Falabella", "S1", "A"), cache.get("Falabella", "S1", "B")) == (True, None)
+    now[0] += 100
+    assert cache.get("Falabella", "S1", "A") is None
+
+
+class _StubFalabella:
+    def __init__(self, uploaded):
+        self.uploaded = uploaded
+        self.calls = []
+
+    def invoice_uploaded(self, order_id):
+        self.calls.append(order_id)
+        return order_id in self.uploaded
+
+
+@pytest.fixture
+def falabella_user(app, make_user, monkeypatch):
+    monkeypatch.setenv("ENCRYPTION_KEY", Fernet.generate_key().decode())
+    # Haulmer siempre falla: las órdenes no cargadas siguen siendo candidatas en cada corrida
+    url, server = serve_in_thread(create_haulmer_app(FakeConfig(error_rate=1.0)))
+    monkeypatch.setenv("HAULMER_API_BASE", url)
+    upload_checks.clear()
+    yield make_user(
+        haulmer_api_key_enc=encrypt_value("fake-haulmer-key"),
+        falabella_user_id="seller-1",
+        falabella_api_key_enc=encrypt_value("fake-falabella-key"),
+    )
+    upload_checks.clear()
+    server.shutdown()
+
+
+def test_repeated_runs_check_each_order_once(app, falabella_user, monkeypatch):
+    stub   = _StubFalabella(uploaded={"F-2"})
+    orders = [{"id_venta": f"F-{i}", "monto": 1000, "platform": "Falabella"} for i in (1, 2)]
+    monkeypatch.setattr(process_orders, "falabella_client", lambda user: stub)
+    monkeypatch.setattr(process_orders, "collect_orders", lambda *args: [dict(o) for o in orders])
+
+    for _ in range(2):
+        enqueue_job(falabella_user.id, "process", {})
+        run_pending_jobs()
+
+    assert sorted(stub.calls) == ["F-1", "F-2"]
+    # Positivo escrito en la venta; el negativo sigue emitiendo (y fallando) sin reconsultar
+    assert Sale.query.filter_by(id_venta="F-2").one().upload_status == "Cargado"
+    assert Sale.query.filter_by(id_venta="F-1").one().status == "Error"
+
+    upload_checks.invalidate("Falabella", "seller-1", "F-1")
+    enqueue_job(falabella_user.id, "process", {})
+    run_pending_jobs()
+    assert stub.calls.count("F-1") == 2
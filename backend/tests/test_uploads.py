@@ -0,0 +1,111 @@
+"""
+Tests del outbox de subidas: una emisión exitosa encola la subida y drain_upload_tasks la
+carga en la plataforma (fake_upstreams); los fallos se reprograman con backoff.
+Ejecutar desde backend/: pytest tests/ -v
+"""
+import time
+from datetime import datetime, timedelta
+
+import pytest
+from cryptography.fernet import Fernet
+
+from app import db
+from app.crypto_utils import encrypt_value
+from app.models import Sale, UploadTask
+from app.services.upload_checks import upload_checks
+from app.tasks import uploads
+from app.tasks.jobs import run_pending_jobs
+from app.tasks.uploads import drain_upload_tasks
+from fake_upstreams import FakeConfig, create_haulmer_app, serve_in_thread
+from fake_upstreams.mercadolibre import ORDER_ID_BASE, create_ml_app
+
+
+@pytest.fixture
+def ml_user(app, make_user, monkeypatch):
+    monkeypatch.setenv("ENCRYPTION_KEY", Fernet.generate_key().decode())
+    haulmer_url, haulmer = serve_in_thread(create_haulmer_app(FakeConfig()))
+    ml_url, ml = serve_in_thread(create_ml_app(FakeConfig(orders=1)))
+    monkeypatch.setenv("HAULMER_API_BASE", haulmer_url)
+    monkeypatch.setenv("ML_API_BASE", ml_url)
+    upload_checks.clear()
+    yield make_user(
+        haulmer_api_key_enc=encrypt_value("fake-haulmer-key"),
+        ml_access_token_enc=encrypt_value("APP_USR-fake"),
+        ml_user_id="123456789",
+    )
+    upload_checks.clear()
+    haulmer.shutdown()
+    ml.shutdown()
+
+
+def _process(app, user, auth_headers, orders=None):
+    resp = app.test_client().post("/auto/process", json={"orders": orders or []}, headers=auth_headers(user))
+    assert resp.status_code == 202
+    assert run_pending_jobs() == 1
+
+
+def test_emission_enqueues_upload_and_drain_marks_sale_uploaded(app, ml_user, auth_headers):
+    # La única orden del falso ML se recolecta, se emite y queda con la subida en cola
+    _process(app, ml_user, auth_headers)
+    id_venta = str(ORDER_ID_BASE)
+
+    sale = Sale.query.filter_by(id_venta=id_venta).one()
+    assert (sale.status, sale.upload_status, sale.document_uploaded_at) == ("Éxito", "Pendiente", None)
+    task = UploadTask.query.filter_by(sale_id=sale.id).one()
+    assert task.status == "pending" and task.pdf_url
+
+    assert drain_upload_tasks() == 1
+
+    sale = db.session.get(Sale, sale.id)
+    assert sale.upload_status == "Cargado" and sale.document_uploaded_at is not None
+    assert db.session.get(UploadTask, task.id).status == "done"
+    assert drain_upload_tasks() == 0
+
+
+def test_failed_upload_backs_off_without_touching_emission_status(app, ml_user, auth_headers, monkeypatch):
+    # Sin ml_user_id no se recolecta de ML: se emite la orden del body, desconocida para el
+    # falso ML, y la subida responde 404
+    ml_user.ml_user_id = None
+    db.session.commit()
+    _process(app, ml_user, auth_headers, [{"id_venta": "999", "monto": 1000, "platform": "Mercado Libre"}])
+    sale = Sale.query.filter_by(id_venta="999").one()
+
+    assert drain_upload_tasks() == 0
+    task = UploadTask.query.filter_by(sale_id=sale.id).one()
+    assert (task.status, task.attempts) == ("pending", 1)
+    assert task.next_attempt_at > datetime.utcnow() + timedelta(seconds=30)
+    assert task.last_error
+
+    # No vencida: no se vuelve a intentar
+    assert drain_upload_tasks() == 0
+    assert db.session.get(UploadTask, task.id).attempts == 1
+
+    monkeypatch.setattr(uploads, "MAX_ATTEMPTS", 2)
+    db.session.get(UploadTask, task.id).next_attempt_at = datetime.utcnow()
+    db.session.commit()
+    drain_upload_tasks()
+
+    task = db.session.get(UploadTask, task.id)
+    sale = db.session.get(Sale, sale.id)
+    assert (task.status, task.attempts) == ("error", 2)
+    assert (sale.status, sale.upload_status) == ("Éxito", "Error")
+
+
+def test_slow_batch_is_not_requeued_by_another_drain(app, ml_user, auth_headers, monkeypatch):
+    from app.services import heartbeat
+
+    _process(app, ml_user, auth_headers)
+    monkeypatch.setattr(heartbeat, "HEARTBEAT_SECONDS", 0.05)
+    monkeypatch.setattr(uploads, "STALE_AFTER", timedelta(seconds=0.2))
+    run, requeued = uploads._UploadBatch.run, []
+
+    def slow_run(self):
+        # Lote más largo que STALE_AFTER: otro drenaje no debe devolver sus tareas a pending
+        time.sleep(0.5)
+        requeued.append(uploads.requeue_stale_uploads())
+        return run(self)
+
+    monkeypatch.setattr(uploads._UploadBatch, "run", slow_run)
+    assert drain_upload_tasks() == 1
+    assert requeued == [0]
+    assert UploadTask.query.one().status == "done"
@@ -0,0 +1,31 @@
+"""
+Tests de helpers compartidos (app.utils).
+Ejecutar desde backend/: pytest tests/ -v
+"""
+from sqlalchemy import event
+
+from app import db
+from app.models import Sale
+from app.utils import load_sales_map
+
+
+def test_load_sales_map_uses_one_in_query_per_chunk(app, make_user):
+    user = make_user()
+    other = make_user("other@example.com")
+    db.session.add_all([Sale(user_id=user.id, id_venta=f"V-{i}", monto=10, tipo_doc="Boleta") for i in range(25)])
+    db.session.add(Sale(user_id=other.id, id_venta="V-1", monto=10, tipo_doc="Boleta"))
+    db.session.commit()
+    user_id = user.id
+
+    statements = []
+    listener = lambda *args: statements.append(args[2])  # noqa: E731
+    event.listen(db.engine, "before_cursor_execute", listener)
+    try:
+        wanted = [f"V-{i}" for i in range(30)] + ["V-1", ""]
+        sales = load_sales_map(user_id, wanted, chunk_size=10)
+    finally:
+        event.remove(db.engine, "before_cursor_execute", listener)
+
+    assert len(statements) == 3  # 30 id_venta distintos en chunks de 10
+    assert sorted(sales) == sorted(f"V-{i}" for i in range(25))
+    assert all(s.user_id == user_id for s in sales.values())
@@ -1,8 +1,9 @@
-import React, { useState, useEffect, useCallback } from 'react';
+import React, { useState, useEffect, useCallback, useRef } from 'react';
 import api from '../api/client';
 import './Dashboard.css';
 
 const PER_PAGE = 30;
+const JOB_POLL_MS = 1500;
 
 export default function Dashboard() {
   const [sales, setSales] = useState([]);
@@ -20,6 +21,8 @@ export default function Dashboard() {
   const [processing, setProcessing] = useState(false);
   const [processResult, setProcessResult] = useState(null);
   const [selectedIds, setSelectedIds] = useState(new Set());
+  // Evita un segundo envío mientras el primero sigue en curso (doble clic)
+  const submitting = useRef(false);
 
   const fetchSales = useCallback(async () => {
     setLoading(true);
@@ -86,26 +89,48 @@ export default function Dashboard() {
     }
   };
 
+  // POST /auto/process responde 202 con job_id; se consulta el avance hasta que termina
+  const waitForJob = async (jobId, onProgress) => {
+    for (;;) {
+      const { data } = await api.get(`/auto/jobs/${jobId}?item_status=Error`);
+      if (data.status === 'done' || data.status === 'error') return data;
+      if (onProgress) onProgress(data);
+      await new Promise((resolve) => setTimeout(resolve, JOB_POLL_MS));
+    }
+  };
+
+  // Cada envío lleva su Idempotency-Key: si la petición se reintenta, el backend devuelve el mismo job
+  // (y con otra key pero el mismo body, el job que sigue en cola o en curso)
+  const postProcess = (body) => api.post('/auto/process', body, {
+    headers: { 'Idempotency-Key': window.crypto?.randomUUID?.() || `${Date.now()}-${Math.random()}` },
+  });
+
+  const jobResult = (job) => {
+    const errors = (job.items || []).map((it) => ({ id_venta: it.id_venta, error: it.error }));
+    if (job.status === 'error') return { ok: false, message: job.error_message || 'Error al procesar', errors };
+    return {
+      ok: job.processed > 0 || (job.failed === 0 && job.total > 0),
+      message: `Procesadas ${job.processed} ventas` + (job.skipped ? ` (${job.skipped} omitidas)` : ''),
+      processed: job.processed,
+      errors,
+    };
+  };
+
   const runProcessSelected = async () => {
     const selected = sales.filter((s) => selectedIds.has(s.id));
-    if (selected.length === 0) return;
+    if (selected.length === 0 || submitting.current) return;
+    submitting.current = true;
     setProcessing(true);
     setProcessResult(null);
     setError('');
     try {
-      const orders = selected.map((s) => ({
-        id_venta: s.id_venta,
-        monto: Number(s.monto),
-        tipo_documento: s.tipo_doc,
-        platform: s.platform || 'Manual',
+      // Solo las ventas elegidas, con sus datos guardados: el backend no consulta Falabella/ML
+      const { data } = await postProcess({ sale_ids: selected.map((s) => s.id) });
+      const job = await waitForJob(data.job_id, (j) => setProcessResult({
+        ok: true,
+        message: `Procesando… ${j.processed + j.skipped + j.failed}/${j.total || '?'}`,
       }));
-      const { data } = await api.post('/auto/process', { orders });
-      setProcessResult({
-        ok: data.processed > 0,
-        message: data.message,
-        processed: data.processed,
-        errors: data.errors,
-      });
+      setProcessResult(jobResult(job));
       setSelectedIds(new Set());
       fetchSales();
     } catch (err) {
@@ -114,28 +139,40 @@ export default function Dashboard() {
         message: err.response?.data?.error || 'Error al procesar',
       });
     } finally {
+      submitting.current = false;
       setProcessing(false);
     }
   };
 
-  const retrySale = async (sale) => {
+  // POST /dashboard/sales/retry reemite con los datos guardados (sin volver a consultar las plataformas)
+  const runRetry = async (body) => {
+    if (submitting.current) return;
+    submitting.current = true;
+    setProcessing(true);
+    setProcessResult(null);
     try {
-      const { data } = await api.post('/auto/process', {
-        orders: [{
-          id_venta: sale.id_venta,
-          monto: Number(sale.monto),
-          tipo_documento: sale.tipo_doc,
-          platform: sale.platform || 'Manual',
-        }],
-        retry: true,
-      });
-      setProcessResult(data.processed > 0 ? { ok: true, message: data.message } : { ok: false, message: data.message, errors: data.errors });
+      const { data } = await api.post('/dashboard/sales/retry', body);
+      const job = await waitForJob(data.job_id, (j) => setProcessResult({
+        ok: true,
+        message: `Reintentando… ${j.processed + j.skipped + j.failed}/${j.total || '?'}`,
+      }));
+      const result = jobResult(job);
+      if (data.remaining > 0) result.message += ` (quedan ${data.remaining} por reintentar)`;
+      setProcessResult(result);
       fetchSales();
     } catch (err) {
       setProcessResult({ ok: false, message: err.response?.data?.error || 'Error al reintentar' });
+    } finally {
+      submitting.current = false;
+      setProcessing(false);
     }
   };
 
+  const retrySale = (sale) => runRetry({ sale_ids: [sale.id] });
+
+  // Todas las ventas en Error que coinciden con la plataforma y la búsqueda actuales
+  const retryAllErrors = () => runRetry({ platform: platformFilter, search: searchSent });
+
   const statusClass = (s) => {
     if (s === 'Éxito') return 'status-ok';
     if (s === 'Error') return 'status-error';
@@ -181,6 +218,9 @@ export default function Dashboard() {
           <option value="Cargado">Cargado</option>
         </select>
         <button type="button" onClick={fetchSales}>Actualizar</button>
+        <button type="button" onClick={retryAllErrors} disabled={loading || processing}>
+          Reintentar errores
+        </button>
         {selectedIds.size > 0 && (
           <button
             type="button"